@@ -0,0 +1,183 @@
+"""Online backups of the live database: copies, timestamped snapshots with retention, compaction and checks.
+
+Nothing here stops the other stations. The backup API copies a bounded number
+of pages per step, sleeping between steps so writers get the database in
+between; in WAL mode a step is a read transaction and never blocks a writer.
+A write by another connection between steps restarts the copy, so after
+BACKUP_MAX_RESTARTS restarts the rest is copied in one step (still only a
+read transaction). Every copy is written beside its target, checked, and
+renamed into place, so a failed or cancelled backup leaves nothing behind.
+"""
+import datetime
+import glob
+import os
+import sqlite3 as sql
+import time
+
+
+BACKUP_PAGES_PER_STEP = 1024  # 4 MiB with 4 KiB pages
+BACKUP_STEP_SLEEP_S = 0.005
+BACKUP_MAX_RESTARTS = 3
+SNAPSHOT_DIR = "backups"      # beside the database unless a path is given
+SNAPSHOT_KEEP = 24
+SNAPSHOT_INTERVAL_S = 3600
+SNAPSHOT_TIME_FORMAT = "%Y%m%d-%H%M%S"
+
+
+class BackupCancelled(Exception):
+    pass
+
+
+class _Restarting(Exception):
+    pass
+
+
+class BackupResult:
+    def __init__(self, path, operation="backup"):
+        self.path = path
+        self.operation = operation
+        self.pages = 0
+        self.bytes = 0
+        self.steps = 0
+        self.restarts = 0
+        self.problems = []  # from check_database; empty when the copy is sound
+        self.pruned = []    # snapshots removed by retention
+        self.cancelled = False
+        self.elapsed = 0.0
+
+    def summary(self):
+        if self.cancelled: return f"{self.operation.capitalize()} cancelled; nothing was written."
+        rate = f", {self.bytes / 2**20 / self.elapsed:.0f} MiB/s" if self.elapsed else ""
+        text = f"{self.operation.capitalize()} of {self.bytes / 2**20:,.1f} MiB to {self.path} in {self.elapsed:.2f} s{rate}"
+        if self.steps: text += f" ({self.steps:,} steps, {self.restarts} restart(s))"
+        text += "; integrity check passed" if not self.problems else f"; {len(self.problems)} integrity problem(s): {self.problems[0]}"
+        if self.pruned: text += f"; {len(self.pruned)} old snapshot(s) removed"
+        return text
+
+
+def check_database(path):
+    """Checks a database file (never the live one while in use): returns a list of problems, empty if sound."""
+    conn = sql.connect(path)
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check") if row[0] != "ok"]
+        problems += [f"foreign key: {table} row {rowid} -> {parent}" for table, rowid, parent, _ in conn.execute("PRAGMA foreign_key_check")]
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'StudentsFTS'").fetchone():
+            # rank 1 also compares the index with Students, so it catches an index that drifted from its rows.
+            try: conn.execute("INSERT INTO StudentsFTS(StudentsFTS, rank) VALUES ('integrity-check', 1)"); conn.commit()
+            except sql.DatabaseError as e: problems.append(f"search index: {e}")
+        return problems
+    finally: conn.close()
+
+
+def _finish(result, part_path, check, start):
+    if check: result.problems = check_database(part_path)
+    result.bytes = os.path.getsize(part_path)
+    os.replace(part_path, result.path)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def _discard(part_path):
+    for path in (part_path, part_path + "-wal", part_path + "-shm", part_path + "-journal"):
+        if os.path.exists(path): os.remove(path)
+
+
+def backup_database(conn, path, pages_per_step=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP_S, check=True,
+                    progress=None, cancelled=None, result=None):
+    """Copies the database conn is open on to path with the backup API and returns a BackupResult.
+
+    progress(result, fraction) is called after each step; cancelled() is
+    checked there and abandons the copy.
+    """
+    result = result or BackupResult(path)
+    start, part_path = time.perf_counter(), path + ".part"
+    _discard(part_path)
+    remaining_before = None
+
+    def step(status, remaining, total):
+        nonlocal remaining_before
+        result.steps += 1; result.pages = total
+        if remaining_before is not None and remaining >= remaining_before:
+            result.restarts += 1  # no headway: another connection wrote between steps and the copy began again
+            if result.restarts >= BACKUP_MAX_RESTARTS: raise _Restarting()
+        remaining_before = remaining
+        if progress: progress(result, 1 - remaining / total if total else 1.0)
+        if cancelled and cancelled(): raise BackupCancelled()
+
+    target = sql.connect(part_path)
+    try:
+        try: conn.backup(target, pages=pages_per_step, progress=step, sleep=sleep)
+        except _Restarting: conn.backup(target, pages=-1)  # the rest in one read transaction
+        target.close()
+    except BaseException as e:
+        target.close(); _discard(part_path)
+        if not isinstance(e, BackupCancelled): raise
+        result.cancelled = True
+        return result
+    return _finish(result, part_path, check, start)
+
+
+def compact_database(conn, path, check=True, progress=None, cancelled=None):
+    """Writes a compacted copy with VACUUM INTO, its search index merged, and returns a BackupResult.
+
+    The copy has no free pages and every table and index rebuilt in order;
+    it can be restored from, or swapped in while no station is running.
+    """
+    result, start, part_path = BackupResult(path, "compaction"), time.perf_counter(), path + ".part"
+    _discard(part_path)
+    try:
+        conn.execute("VACUUM INTO ?", (part_path,))  # one read transaction; writers carry on
+        if progress: progress(result, 0.6)
+        if cancelled and cancelled(): raise BackupCancelled()
+        copy = sql.connect(part_path)
+        try:
+            if copy.execute("SELECT 1 FROM sqlite_master WHERE name = 'StudentsFTS'").fetchone():
+                copy.execute("INSERT INTO StudentsFTS(StudentsFTS) VALUES ('optimize')"); copy.commit()
+                copy.execute("VACUUM")  # drop the pages the merge freed
+        finally: copy.close()
+        if progress: progress(result, 0.8)
+    except BaseException as e:
+        _discard(part_path)
+        if not isinstance(e, BackupCancelled): raise
+        result.cancelled = True
+        return result
+    return _finish(result, part_path, check, start)
+
+
+# --- Snapshots ---
+# students_ssis_pure_sqlite_v3-20250101-120000.db etc. in the snapshot directory,
+# the newest SNAPSHOT_KEEP kept. Stations sharing the directory take turns: a
+# snapshot is only due once the newest one is SNAPSHOT_INTERVAL_S old.
+
+def snapshot_directory(database, directory=None):
+    return directory or os.path.join(os.path.dirname(os.path.abspath(database)), SNAPSHOT_DIR)
+
+
+def snapshot_paths(database, directory=None):
+    """Existing snapshots of database, oldest first."""
+    stem = os.path.splitext(os.path.basename(database))[0]
+    return sorted(glob.glob(os.path.join(glob.escape(snapshot_directory(database, directory)), f"{glob.escape(stem)}-*.db")))
+
+
+def snapshot_due(database, directory=None, interval=SNAPSHOT_INTERVAL_S):
+    paths = snapshot_paths(database, directory)
+    return not paths or time.time() - os.path.getmtime(paths[-1]) >= interval
+
+
+def prune_snapshots(database, directory=None, keep=SNAPSHOT_KEEP):
+    """Removes all but the newest keep snapshots; returns the paths removed."""
+    paths = snapshot_paths(database, directory)
+    removed = paths[:max(len(paths) - keep, 0)]
+    for path in removed: os.remove(path)
+    return removed
+
+
+def take_snapshot(conn, database, directory=None, keep=SNAPSHOT_KEEP, progress=None, cancelled=None):
+    """Backs the database up to a new timestamped snapshot, then applies retention; returns a BackupResult."""
+    directory = snapshot_directory(database, directory)
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(database))[0]
+    path = os.path.join(directory, f"{stem}-{datetime.datetime.now().strftime(SNAPSHOT_TIME_FORMAT)}.db")
+    result = backup_database(conn, path, progress=progress, cancelled=cancelled, result=BackupResult(path, "snapshot"))
+    if not result.cancelled and not result.problems: result.pruned = prune_snapshots(database, directory, keep)
+    return result
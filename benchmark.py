@@ -0,0 +1,765 @@
+"""Micro-benchmarks for the SSIS database hot paths.
+
+    python benchmark.py keystroke --students 100000
+    python benchmark.py search --students 500000
+    python benchmark.py paging --students 1000000
+    python benchmark.py edits --sizes 10000 100000 500000
+    python benchmark.py startup --students 1000000
+    python benchmark.py cache --students 500000 --sort "Last Name"
+    python benchmark.py memory --students 500000
+    python benchmark.py stats --students 1000000
+    python benchmark.py bulk --students 200000 --affected 100000
+    python benchmark.py fuzzy --students 1000000 --words "dela crus" santso "maria santos"
+    python benchmark.py concurrency --writers 1 2 4 8 --seconds 5 --hot 100
+    python benchmark.py backup --students 2200000 --pages 256 1024 4096
+    python benchmark.py changes --students 1000000 --churn 0.01
+    python benchmark.py entry --students 1000000 --entries 500 --every 1 25 100
+    python benchmark.py suite --students 100000 --output results.json --baseline benchmark_baseline.json
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3 as sql
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import datagen
+from db import (ConnectionManager, open_tuned_connection, initialize_database, add_program, is_busy_error, compact_change_log,
+                close_trigger_gates)
+from repository import STUDENT_INSERT_SQL, StudentRepository, CollegeRepository, EnrollmentStatsRepository
+from search import DB_COLUMN_MAP, PAGE_SIZE, STUDENT_COLUMNS, build_student_query
+from search_cache import SearchCache, DEFAULT_MAX_ENTRIES, DEFAULT_MAX_ROWS, PREFETCH_ROWS
+from student_store import StudentStore
+from bulk import promote_students, transfer_students, delete_students
+from fuzzy import find_duplicates
+from backup import backup_database, compact_database
+from exporter import export_changes, export_students
+from importer import import_students
+from staging import IdIndex, StagingQueue
+from catalog import CatalogCache
+from student_view import StudentListView
+
+
+FIRST_NAMES = ["Linda", "Jennifer", "Maria", "Jose", "John", "Mark", "Angel", "Christian", "Joy", "Grace",
+               "Vandyke", "Michael", "Anna", "Paolo", "Kristine", "Ramon", "Liza", "Carlo", "Rhea", "Noel"]
+LAST_NAMES = ["Sanchez", "Clark", "Santos", "Reyes", "Cruz", "Dela Cruz", "Bautista", "Garcia", "Mendoza",
+              "Santiago", "Daminar", "Villanueva", "Ramos", "Aquino", "Castillo", "Flores", "Torres", "Lopez"]
+COLLEGES = [("College of Computer Studies", "CCS", "BS IN COMPUTER SCIENCE"),
+            ("College of Engineering and Technology", "COET", "BS IN CIVIL ENGINEERING"),
+            ("College of Nursing", "CHS", "BS IN NURSING")]
+
+
+def build_fixture_db(path, students, seed=42):
+    rng = random.Random(seed)
+    conn = open_tuned_connection(path)
+    initialize_database(conn)
+    conn.executemany("INSERT INTO Colleges (CollegeName, CollegeCode) VALUES (?, ?)", [(c[0], c[1]) for c in COLLEGES])
+    colleges = [(cname, ccode, add_program(conn, ccode, prog)) for cname, ccode, prog in COLLEGES]
+    rows = []
+    for i in range(students):
+        cname, ccode, pcode = rng.choice(colleges)
+        rows.append((f"{2015 + i // 10000:04d}-{i % 10000:04d}", rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                     rng.choice("FM"), pcode, rng.randint(1, 5), cname, ccode))
+    conn.executemany(STUDENT_INSERT_SQL, rows)
+    conn.commit()
+    conn.close()
+
+
+def keystrokes(word):
+    return [word[:i] for i in range(1, len(word) + 1)]
+
+
+def time_calls(fn, inputs, repeat):
+    samples = []
+    for _ in range(repeat):
+        for value in inputs:
+            start = time.perf_counter()
+            fn(value)
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {"median_ms": statistics.median(samples), "p95_ms": samples[int(len(samples) * 0.95) - 1], "calls": len(samples)}
+
+
+def bench_keystroke(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        build_fixture_db(path, args.students)
+        inputs = keystrokes(args.word)
+
+        def legacy_search(text):
+            # What refresh_student_treeview did before the connection manager.
+            conn = sql.connect(path)
+            conn.row_factory = sql.Row
+            conn.execute("PRAGMA foreign_keys = ON;")
+            query, params = build_student_query(text)
+            conn.execute(query, params).fetchall()
+            conn.close()
+
+        shared = open_tuned_connection(path)
+        def managed_search(text):
+            query, params = build_student_query(text)
+            shared.execute(query, params).fetchall()
+
+        results = {"legacy": time_calls(legacy_search, inputs, args.repeat),
+                   "managed": time_calls(managed_search, inputs, args.repeat)}
+        shared.close()
+
+    print(f"Per-keystroke search latency, {args.students} students, typing {args.word!r}:")
+    for name, r in results.items():
+        print(f"  {name:<8} median {r['median_ms']:8.2f} ms   p95 {r['p95_ms']:8.2f} ms   ({r['calls']} calls)")
+
+
+def bench_search(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        start = time.perf_counter()
+        build_fixture_db(path, args.students)
+        print(f"Built {args.students} students (with FTS triggers) in {time.perf_counter() - start:.1f} s")
+        conn = open_tuned_connection(path)
+        inputs = keystrokes(args.word) + keystrokes("2016-01")
+
+        def run(use_fts):
+            def search(text):
+                query, params = build_student_query(text, use_fts=use_fts)
+                conn.execute(query, params).fetchmany(args.limit) if args.limit else conn.execute(query, params).fetchall()
+            return search
+
+        results = {"like": time_calls(run(False), inputs, args.repeat),
+                   "fts5": time_calls(run(True), inputs, args.repeat)}
+        conn.close()
+
+    shown = f"first {args.limit} rows" if args.limit else "all rows"
+    print(f"Per-keystroke search latency ({shown}), {args.students} students:")
+    for name, r in results.items():
+        print(f"  {name:<8} median {r['median_ms']:8.2f} ms   p95 {r['p95_ms']:8.2f} ms   ({r['calls']} calls)")
+
+
+def try_treeview():
+    """Returns a Treeview to render into, or None when there is no display."""
+    try:
+        from tkinter import Tk, ttk
+        root = Tk(); root.withdraw()
+    except Exception:
+        return None
+    return ttk.Treeview(root, columns=tuple(range(8)), show='headings')
+
+
+def bench_paging(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        build_fixture_db(path, args.students)
+        conn = open_tuned_connection(path)
+        tree = try_treeview()
+
+        def render(rows):
+            if tree is None: return
+            tree.delete(*tree.get_children())
+            for row in rows: tree.insert('', 'end', values=row)
+            tree.update_idletasks()
+
+        def legacy(sort_col):
+            query, params = build_student_query(None, sort_col)
+            render([tuple(r) for r in conn.execute(query, params).fetchall()])
+
+        def first_page(sort_col):
+            view = StudentListView(None, sort_col, use_fts=True)
+            render(view.accept_page(conn.execute(*view.first_page_query()).fetchall()))
+
+        def deep_page(sort_col):
+            view = StudentListView(None, sort_col, use_fts=True)
+            view.accept_page(conn.execute(*view.first_page_query()).fetchall())
+            for _ in range(args.depth): view.accept_page(conn.execute(*view.next_page_query()).fetchall())
+
+        sorts = [None, "Last Name", "Program Code"]
+        results = {"legacy fetchall": time_calls(legacy, sorts, 1),
+                   "first page": time_calls(first_page, sorts, args.repeat),
+                   f"first + {args.depth} pages": time_calls(deep_page, sorts, args.repeat)}
+        conn.close()
+
+    shown = "query + Treeview render" if tree is not None else "query only, no display for Treeview"
+    print(f"First paint, {args.students} students ({shown}):")
+    for name, r in results.items():
+        print(f"  {name:<18} median {r['median_ms']:9.2f} ms   p95 {r['p95_ms']:9.2f} ms   ({r['calls']} calls)")
+
+
+def bench_edits(args):
+    tree = try_treeview()
+    print(f"Per-edit UI cost ({'write + Treeview patch' if tree is not None else 'write + view patch, no display for Treeview'}):")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            build_fixture_db(path, size)
+            conn = open_tuned_connection(path)
+            view = StudentListView(None, "Last Name", use_fts=True)
+            rows = view.accept_page(conn.execute(*view.first_page_query()).fetchall())
+            if tree is not None:
+                tree.delete(*tree.get_children())
+                for row in rows: tree.insert('', 'end', iid=row[0], values=row)
+            rng = random.Random(size)
+            visible = list(view.ids)
+            counter = iter(range(10 ** 6))
+
+            def edit(kind):
+                if kind == "insert":
+                    idnum = f"9999-{next(counter):04d}"
+                    conn.execute(STUDENT_INSERT_SQL,
+                                 (idnum, "Aaron", "Aaberg", "F", "BSN", 1, "College of Nursing", "CHS"))
+                elif kind == "update":
+                    idnum = rng.choice(view.ids)
+                    conn.execute("UPDATE Students SET fname = ? WHERE idnum = ?", (rng.choice(FIRST_NAMES), idnum))
+                else:
+                    idnum = visible.pop()
+                    conn.execute("DELETE FROM Students WHERE idnum = ?", (idnum,))
+                conn.commit()
+                for op in view.apply_rows([idnum], conn.execute(*view.rows_query([idnum])).fetchall()):
+                    if tree is None: continue
+                    if op[0] == "delete": tree.delete(op[1])
+                    elif op[0] == "update": tree.item(op[1], values=op[2])
+                    else: tree.insert('', op[1], iid=op[2][0], values=op[2])
+
+            def legacy(kind):
+                # Before: the same write followed by a full clear-and-reload.
+                conn.execute("UPDATE Students SET yrlvl = yrlvl WHERE idnum = ?", (rng.choice(view.ids),)); conn.commit()
+                query, params = build_student_query(None, "Last Name")
+                rows = [tuple(r) for r in conn.execute(query, params).fetchall()]
+                if tree is not None:
+                    tree.delete(*tree.get_children())
+                    for row in rows: tree.insert('', 'end', values=row)
+
+            patched = time_calls(edit, ["insert", "update", "delete"] * args.edits, 1)
+            reload = time_calls(legacy, ["update"], 1) if size <= args.legacy_max else None
+            conn.close()
+        line = f"  {size:>9} students: patch median {patched['median_ms']:7.2f} ms  p95 {patched['p95_ms']:7.2f} ms"
+        if reload: line += f"   | full reload {reload['median_ms']:9.2f} ms"
+        print(line)
+
+
+def bench_cache(args):
+    """Per-keystroke first page while typing words: always querying vs. the search cache."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.db")
+        datagen.populate(path, args.students, args.seed)
+        connections = ConnectionManager(path)
+        students = StudentRepository(connections)
+        cache = SearchCache(lambda: (connections.write_generation, students.data_version()), args.entries, args.rows)
+        inputs = [text for word in args.words for text in keystrokes(word)]
+
+        def cached(text):
+            view = StudentListView(text, args.sort, use_fts=students.use_fts)
+            if cache.first_page(view) is None:
+                cache.store(view, 0, students.first_page(view, PREFETCH_ROWS), PREFETCH_ROWS)
+
+        results = {"query": time_calls(lambda text: students.first_page(StudentListView(text, args.sort, use_fts=students.use_fts)), inputs, 1),
+                   "cache": time_calls(cached, inputs, 1)}
+        connections.close_all()
+    print(f"Typing {', '.join(args.words)} ({len(inputs)} keystrokes), {args.students} students, sort {args.sort or 'none'}:")
+    for name, r in results.items(): print(f"  {name:<6} median {r['median_ms']:8.2f} ms   p95 {r['p95_ms']:8.2f} ms")
+    print(f"  {cache.stats_text()}")
+    return 0
+
+
+def traced_bytes(load):
+    """Returns what load() returns and the bytes still allocated for it."""
+    tracemalloc.start()
+    try: result = load(); return result, tracemalloc.get_traced_memory()[0]
+    finally: tracemalloc.stop()
+
+
+def bench_memory(args):
+    """Bytes per student as the grid reads them today (sqlite3.Row, tuples) vs. a StudentStore, and its sort times."""
+    orders = {"Last Name": [("Last Name", False)], "Year Level desc": [("Year Level", True)],
+              "Sex, First Name": [("Sex", False), ("First Name", False)],
+              "College, Year, Last": [("College Code", False), ("Year Level", True), ("Last Name", False)]}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "memory.db")
+        datagen.populate(path, args.students, args.seed)
+        conn = open_tuned_connection(path)
+        conn.row_factory = sql.Row
+        query, params = build_student_query(None, None, False)
+        sizes = {"sqlite3.Row": traced_bytes(lambda: conn.execute(query, params).fetchall())[1]}
+        conn.row_factory = None
+        sizes["tuple"] = traced_bytes(lambda: conn.execute(query, params).fetchall())[1]
+        store, sizes["StudentStore"] = traced_bytes(lambda: StudentStore.load(conn))
+        load_ms = time_calls(lambda _: StudentStore.load(conn), [None], 1)["median_ms"]
+        memory = store.memory()
+        sql_ms, store_ms = {}, {}
+        for name, keys in orders.items():
+            columns = [(DB_COLUMN_MAP[heading], descending) for heading, descending in keys]
+            order_by = ", ".join(f"{column} COLLATE NOCASE{' DESC' if descending else ''}" for column, descending in columns)
+            sql_ms[name] = time_calls(lambda _: conn.execute(f"SELECT * FROM Students ORDER BY {order_by}, rowid LIMIT ?",
+                                                            (PAGE_SIZE,)).fetchall(), [None], args.repeat)["median_ms"]
+            store_ms[name] = time_calls(lambda _: store.order(columns)[:PAGE_SIZE], [None], 1)["median_ms"]
+        conn.close()
+    print(f"{args.students} students, bytes per student:")
+    for name, size in sizes.items(): print(f"  {name:<13} {size / args.students:8.1f}")
+    print(f"  (store: {memory['columns'] / args.students:.1f} columns + {memory['permutations'] / args.students:.1f} sort permutations;"
+          f" loads in {load_ms / 1000:.1f} s)")
+    print("First page sorted by (SQL vs. store, first sort; repeats of a multi-key sort are cached):")
+    for name in orders: print(f"  {name:<20} sql {sql_ms[name]:8.2f} ms   store {store_ms[name]:8.2f} ms")
+    return 0
+
+
+def bench_stats(args):
+    """Headcounts grouped by college and year level: GROUP BY over Students vs. the EnrollmentStats table."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stats.db")
+        datagen.populate(path, args.students, args.seed)
+        connections = ConnectionManager(path)
+        students, stats = StudentRepository(connections), EnrollmentStatsRepository(connections)
+        scan = "SELECT ccode, yrlvl, COUNT(*) FROM Students GROUP BY ccode, yrlvl ORDER BY ccode, yrlvl"
+        results = {"scan": time_calls(lambda _: students._read(scan), [None], args.repeat),
+                   "stats": time_calls(lambda _: stats.totals(("ccode", "yrlvl")), [None], args.repeat),
+                   "verify": time_calls(lambda _: stats.verify(), [None], 1)}
+        connections.close_all()
+    print(f"Headcounts by college and year level, {args.students} students:")
+    for name, r in results.items(): print(f"  {name:<6} median {r['median_ms']:8.2f} ms")
+    return 0
+
+
+def bench_fuzzy(args):
+    """Misspelled names: substring LIKE (what the search box did) vs. the trigram fuzzy search, plus the duplicate report."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fuzzy.db")
+        datagen.populate(path, args.students, args.seed)
+        connections = ConnectionManager(path)
+        students = StudentRepository(connections)
+        like_sql = "SELECT idnum, fname, lname FROM Students WHERE fname || ' ' || lname LIKE ? LIMIT ?"
+        results = {}
+        for word in args.words:
+            like = time_calls(lambda w: students._read(like_sql, (f"%{w}%", args.limit)), [word], args.repeat)
+            fuzzy = time_calls(lambda w: students.fuzzy_search("~" + w, args.limit), [word], args.repeat)
+            best = students.fuzzy_search("~" + word, 1)
+            results[word] = (like, len(students._read(like_sql, (f"%{word}%", args.limit))), fuzzy,
+                             f"{best[0][1]} {best[0][2]} ({best[0][-1]:.0%})" if best else "-")
+        start = time.perf_counter()
+        report = find_duplicates(connections.get())
+        duplicates_s = time.perf_counter() - start
+        connections.close_all()
+    print(f"Top {args.limit} matches among {args.students:,} students:")
+    for word, (like, like_hits, fuzzy, best) in results.items():
+        print(f"  {word!r:<18} LIKE {like['median_ms']:8.1f} ms, {like_hits:>4} hit(s)   fuzzy {fuzzy['median_ms']:7.1f} ms, best {best}")
+    print(f"Duplicate report {duplicates_s:.2f} s: {report.summary()}")
+    return 0
+
+
+def bench_bulk(args):
+    """Bulk promote, transfer and delete of --affected students: one edit at a time (sampled) vs. set-based."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bulk.db")
+        datagen.populate(path, args.students, args.seed)
+        connections = ConnectionManager(path)
+        students = StudentRepository(connections)
+        conn = connections.get()
+        idnums = [row[0] for row in conn.execute("SELECT idnum FROM Students WHERE graduated = 0")]
+        idnums = random.Random(args.seed).sample(idnums, min(args.affected, len(idnums)))
+        sample = idnums[:args.sample]
+        program = conn.execute("SELECT CollegeCode, ProgramCode FROM Programs ORDER BY rowid LIMIT 1").fetchone()
+
+        def one_at_a_time(student):
+            # What the edit dialog does per student: read it, write it back changed, commit.
+            row = students.get_many([student])[0]
+            students.update_many([row[:5] + (min(row[5] + 1, 5),) + row[6:]])
+
+        per_student = time_calls(one_at_a_time, sample, 1)["median_ms"] if sample else 0.0
+        results = {name: op(conn, idnums=idnums) for name, op in (
+            ("promote", promote_students), ("transfer", lambda conn, **kw: transfer_students(conn, *program, **kw)),
+            ("delete", delete_students))}
+        connections.close_all()
+    print(f"{len(idnums):,} of {args.students:,} students:")
+    print(f"  one at a time   ~{per_student * len(idnums) / 1000:8.1f} s  ({per_student:.2f} ms per student over {len(sample):,})")
+    for name, result in results.items(): print(f"  {name:<15} {result.elapsed:9.2f} s  ({result.summary()})")
+    return 0
+
+
+def _concurrent_writer(path, idnums, seconds, wait, seed):
+    """One station editing students for the given time: read with version, write back if unchanged."""
+    connections = ConnectionManager(path)
+    students = StudentRepository(connections)
+    if not wait:
+        connections.get().execute("PRAGMA busy_timeout = 0"); students.write_retries = 0
+    rng = random.Random(seed)
+    commits = conflicts = lock_errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            student, version = students.get_versioned(rng.choice(idnums))
+            if students.update_if_unchanged(student[:5] + (student[5] % 5 + 1,) + student[6:], version): commits += 1
+            else: conflicts += 1
+        except sql.OperationalError as e:
+            if not is_busy_error(e): raise
+            lock_errors += 1
+    retries = connections.busy_retries
+    connections.close_all()
+    return commits, conflicts, retries, lock_errors
+
+
+def bench_concurrency(args):
+    """Several processes editing the same students at once, waiting on locks (busy_timeout and retries) vs. not."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "concurrency.db")
+        datagen.populate(path, args.students, args.seed)
+        conn = open_tuned_connection(path)
+        idnums = [row[0] for row in conn.execute("SELECT idnum FROM Students ORDER BY rowid LIMIT ?", (args.hot,))]
+        conn.close()
+        print(f"{len(idnums):,} students edited by each writer for {args.seconds:g} s:")
+        print(f"  {'writers':>7} {'mode':<8} {'commits/s':>10} {'conflicts':>10} {'retries':>8} {'lock errors':>12}")
+        with multiprocessing.Pool(max(args.writers)) as pool:
+            for writers in args.writers:
+                for wait in (True, False):
+                    totals = [sum(column) for column in zip(*pool.starmap(_concurrent_writer, [
+                        (path, idnums, args.seconds, wait, args.seed + i) for i in range(writers)]))]
+                    print(f"  {writers:>7} {'wait' if wait else 'no wait':<8} {totals[0] / args.seconds:>10,.0f}"
+                          f" {totals[1]:>10,} {totals[2]:>8,} {totals[3]:>12,}")
+    return 0
+
+
+def bench_backup(args):
+    """Online backup while a writer commits every few ms: copy throughput and the writer's longest commit."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "backup.db")
+        datagen.populate(path, args.students, args.seed)
+        size = os.path.getsize(path)
+        stop, commits = threading.Event(), []
+
+        def writer():
+            conn = open_tuned_connection(path)
+            rng = random.Random(args.seed)
+            while not stop.is_set():
+                start = time.perf_counter()
+                conn.execute("UPDATE Students SET yrlvl = yrlvl WHERE rowid = ?", (rng.randint(1, args.students),)); conn.commit()
+                commits.append((time.perf_counter() - start) * 1000)
+                time.sleep(args.interval / 1000)
+            conn.close()
+
+        def during(label, copy):
+            del commits[:]
+            start = time.perf_counter()
+            result = copy()
+            elapsed = time.perf_counter() - start
+            samples = sorted(commits) or [0.0]
+            restarts = f"{result.restarts} restart(s)" if result and result.steps else ""
+            print(f"  {label:<16} {elapsed:7.2f} s {size / 2**20 / elapsed if result else 0:7.0f} MiB/s {len(samples):>8,}"
+                  f" {samples[len(samples) // 2]:8.2f} {samples[int(len(samples) * 0.99) - 1]:8.2f} {samples[-1]:9.2f}  {restarts}")
+
+        print(f"{size / 2**20:,.0f} MiB database ({args.students:,} students), a commit every {args.interval} ms:")
+        print(f"  {'copy':<16} {'time':>9} {'rate':>11} {'commits':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>9}")
+        thread = threading.Thread(target=writer, daemon=True); thread.start()
+        source = open_tuned_connection(path)
+        during("none", lambda: time.sleep(args.idle) or None)
+        for pages in args.pages:
+            during(f"{pages} pages/step", lambda: backup_database(source, os.path.join(tmp, f"copy{pages}.db"), pages, check=False))
+        during("one step", lambda: backup_database(source, os.path.join(tmp, "copy.db"), -1, check=False))
+        during("VACUUM INTO", lambda: compact_database(source, os.path.join(tmp, "compact.db"), check=False))
+        stop.set(); thread.join()
+        source.close()
+    return 0
+
+
+# Run in a fresh interpreter per sample so nothing is warm but the OS page cache.
+# It goes through the same steps as the GUI before its first page, minus Tk.
+COLD_START_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import main
+from db import ConnectionManager, initialize_database
+from repository import StudentRepository, CollegeRepository
+from student_view import StudentListView
+marks = {"imports": time.perf_counter()}
+connections = ConnectionManager(sys.argv[1])
+initialize_database(connections.get())
+marks["schema"] = time.perf_counter()
+colleges = CollegeRepository(connections)
+colleges.seed_defaults(); colleges.mapping(); colleges.programs()
+marks["catalog"] = time.perf_counter()
+students = StudentRepository(connections)
+students.first_page(StudentListView(None, None, use_fts=students.use_fts))
+marks["first page"] = time.perf_counter()
+print(json.dumps({phase: (t - start) * 1000 for phase, t in marks.items()}))
+"""
+
+
+def bench_changes(args):
+    """Nightly hand-off to a downstream system: full export vs. the delta since its watermark after --churn of the students changed."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "changes.db")
+        datagen.populate(path, args.students, args.seed)
+        conn = open_tuned_connection(path)
+        initial = export_changes(conn, os.path.join(tmp, "initial.jsonl"), consumer="bench")
+        compact_change_log(conn, prune_consumed=True)
+        rng = random.Random(args.seed)
+        churned = rng.sample([row[0] for row in conn.execute("SELECT idnum FROM Students")], int(args.students * args.churn))
+        deleted, edited = churned[:len(churned) // 10], churned[len(churned) // 10:]
+        added = [(f"9{i:03d}-{i % 10000:04d}",) + row[1:] for i, row in enumerate(conn.execute(
+            "SELECT * FROM (SELECT idnum, fname, lname, sex, pcode, yrlvl, cname, ccode FROM Students LIMIT ?)", (len(deleted),)))]
+
+        def edit(yrlvl):
+            start = time.perf_counter()
+            conn.executemany("UPDATE Students SET yrlvl = ? WHERE idnum = ?", [(yrlvl, idnum) for idnum in edited])
+            return time.perf_counter() - start
+
+        conn.execute("BEGIN")
+        close_trigger_gates(conn, ["Students_changes_update"])
+        unlogged = edit(0)
+        conn.rollback()  # the gate and the students as they were
+        logged = edit(0)
+        for n in range(1, args.edits): edit(n)
+        conn.commit()
+        conn.executemany("DELETE FROM Students WHERE idnum = ?", [(idnum,) for idnum in deleted])
+        conn.executemany("INSERT INTO Students (idnum, fname, lname, sex, pcode, yrlvl, cname, ccode) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", added)
+        conn.commit()
+        entries = conn.execute("SELECT COUNT(*) FROM ChangeLog").fetchone()[0]
+        full = export_students(conn, os.path.join(tmp, "full.jsonl"))
+        delta = export_changes(conn, os.path.join(tmp, "delta.jsonl"), since=initial.watermark)
+        compact_start = time.perf_counter()
+        removed = compact_change_log(conn)
+        compact_s = time.perf_counter() - compact_start
+        compacted = export_changes(conn, os.path.join(tmp, "compacted.jsonl"), consumer="bench")
+        sizes = {name: os.path.getsize(os.path.join(tmp, f"{name}.jsonl")) for name in ("full", "delta", "compacted")}
+        conn.close()
+    print(f"{args.students:,} students; {len(edited):,} edited {args.edits}x, {len(deleted):,} deleted, {len(added):,} added")
+    print(f"  {len(edited):,} edits, one transaction: {unlogged * 1000:.0f} ms unlogged, {logged * 1000:.0f} ms logged")
+    print(f"  change log: {entries:,} entries, compacted to {entries - removed:,} in {compact_s * 1000:.0f} ms")
+    print(f"  full export     {full.elapsed:7.2f} s  {full.rows:>10,} rows  {sizes['full'] / 2**20:8.1f} MiB")
+    print(f"  delta export    {delta.elapsed:7.2f} s  {delta.rows:>10,} rows  {sizes['delta'] / 2**20:8.1f} MiB  ({full.elapsed / delta.elapsed:,.0f}x faster)")
+    print(f"  after compact   {compacted.elapsed:7.2f} s  {compacted.rows:>10,} rows  {sizes['compacted'] / 2**20:8.1f} MiB")
+    return 0
+
+
+def bench_entry(args):
+    """Keying in --entries new students: checked locally against the ID index and saved in batches of each --every."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "entry.db")
+        datagen.populate(path, args.students, args.seed)
+        connections = ConnectionManager(path)
+        students = StudentRepository(connections)
+        catalog = CatalogCache(CollegeRepository(connections)); catalog.reload()
+        start = time.perf_counter()
+        ids = IdIndex.load(students)
+        load_s = time.perf_counter() - start
+        name, code = next(iter(catalog.mapping.items()))
+        program = catalog.program_list(code)[0]
+        print(f"{args.students:,} students; ID index loaded in {load_s:.2f} s ({len(ids):,} IDs)")
+        print(f"  {'saved every':<12} {'check ms':>9} {'save ms':>9} {'per student ms':>15}")
+        for batch, every in enumerate(args.every):
+            queue = StagingQueue(ids, every)
+            check_s = save_s = 0.0
+            for i in range(args.entries):
+                record = {"idnum": f"{9000 + batch}-{i:04d}", "fname": "Ana", "lname": "Reyes", "sex": "F", "pcode": program,
+                          "yrlvl": "1", "cname": name, "ccode": code}
+                start = time.perf_counter(); queue.stage(record, catalog.validation_catalog()); check_s += time.perf_counter() - start
+                if queue.due() or i == args.entries - 1:
+                    start = time.perf_counter(); queue.flush(students); save_s += time.perf_counter() - start
+            print(f"  {every:<12,} {check_s * 1000 / args.entries:9.3f} {save_s * 1000 / args.entries:9.3f} {(check_s + save_s) * 1000 / args.entries:15.3f}")
+        connections.close_all()
+    return 0
+
+
+def bench_startup(args):
+    """Cold start on a generated database: each phase's time since the script began, plus the whole process."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "startup.db")
+        datagen.populate(path, args.students, args.seed)
+        samples = {}
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT, path], capture_output=True, text=True,
+                                 check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+            for phase, ms in json.loads(out).items(): samples.setdefault(phase, []).append(ms)
+            samples.setdefault("process", []).append((time.perf_counter() - start) * 1000)
+    print(f"Cold start, {args.students} students (median of {args.repeat}, ms since start):")
+    for phase, values in samples.items(): print(f"  {phase:<12} {statistics.median(values):8.1f} ms")
+    return 0
+
+
+def bench_suite(args):
+    """Times the app's hot paths through the repositories on a generated database.
+
+    Results are written as JSON; with --baseline, medians are compared against
+    a stored run and the exit status is 1 if any got slower than the tolerance.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "suite.db")
+        start = time.perf_counter()
+        datagen.populate(path, args.students, args.seed)
+        results["generate"] = {"median_ms": (time.perf_counter() - start) * 1000, "p95_ms": None, "calls": 1}
+
+        def startup(_):
+            connections = ConnectionManager(path)
+            initialize_database(connections.get())
+            colleges = CollegeRepository(connections)
+            colleges.seed_defaults(); colleges.mapping(); colleges.programs()
+            students = StudentRepository(connections)
+            students.first_page(StudentListView(None, None, use_fts=students.use_fts))
+            connections.close_all()
+        results["startup"] = time_calls(startup, [None], args.repeat)
+
+        connections = ConnectionManager(path)
+        students, colleges = StudentRepository(connections), CollegeRepository(connections)
+        views = {"refresh": (None, None), "refresh search": ("santos", None), "refresh sort": (None, "Last Name"),
+                 "refresh search+sort": ("ccode:CCS mar", "Last Name"), "refresh filter": ("yr:3 sex:F", "ID Number")}
+        for name, (query, sort_col) in views.items():
+            results[name] = time_calls(lambda _: students.first_page(StudentListView(query, sort_col, use_fts=students.use_fts)), [None], args.repeat * 5)
+        # The total shown under the grid, counted on its own worker.
+        for name, query in {"count": None, "count search": "santos", "count search+filter": "ccode:CCS mar", "count filter": "yr:3 sex:F"}.items():
+            results[name] = time_calls(lambda _: students.count(query), [None], args.repeat)
+
+        # New students get IDs from year 9000 on, which the generated ones never reach.
+        extra = datagen.generate_students(10 ** 6, datagen.load_catalog(connections.get()), args.seed + 1)
+        extra_ids = (f"{9000 + i // datagen.IDS_PER_YEAR}-{i % datagen.IDS_PER_YEAR:04d}" for i in range(10 ** 6))
+        def new_rows(count): return [(next(extra_ids),) + next(extra)[1:] for _ in range(count)]
+        results["insert single"] = time_calls(lambda _: students.add(new_rows(1)[0]), [None], args.repeat * 40)
+        bulk_ids = []
+        def bulk_insert(_):
+            rows = new_rows(args.bulk); bulk_ids.append([row[0] for row in rows]); students.add_many(rows)
+        results["insert bulk"] = time_calls(bulk_insert, [None], args.repeat)
+        results["delete selection"] = time_calls(lambda _: students.delete_many(bulk_ids.pop()), [None], args.repeat)
+        # A file of --bulk new students imported, then imported again with every row changed.
+        import_path = os.path.join(tmp, "import.csv")
+        rows = new_rows(args.bulk)
+        def write_import(rows):
+            with open(import_path, "w", newline="") as f: csv.writer(f).writerows([STUDENT_COLUMNS] + rows)
+        write_import(rows)
+        results["import insert"] = time_calls(lambda _: import_students(connections.get(), import_path), [None], 1)
+        write_import([(row[0],) + next(extra)[1:] for row in rows])
+        results["import upsert"] = time_calls(lambda _: import_students(connections.get(), import_path, "upsert"), [None], 1)
+        students.delete_many([row[0] for row in rows])
+        # Destructive, so measured once at the end: deleting a college blanks its students.
+        results["delete college"] = time_calls(lambda code: colleges.delete(code), ["CCS"], 1)
+        connections.close_all()
+
+    for r in results.values(): r.update({k: round(v, 3) for k, v in r.items() if isinstance(v, float)})
+    report = {"meta": {"students": args.students, "seed": args.seed, "repeat": args.repeat, "bulk": args.bulk,
+                       "python": platform.python_version(), "sqlite": sql.sqlite_version, "platform": platform.platform(),
+                       "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+              "results": results}
+    print(f"Suite, {args.students} students:")
+    for name, r in results.items(): print(f"  {name:<22} median {r['median_ms']:10.2f} ms   ({r['calls']} calls)")
+    if args.output:
+        with open(args.output, "w") as f: json.dump(report, f, indent=2)
+    if not args.baseline: return 0
+    with open(args.baseline) as f: baseline = json.load(f)
+    if baseline["meta"]["students"] != args.students:
+        print(f"Baseline was taken with {baseline['meta']['students']} students; comparison skipped."); return 0
+    regressions = []
+    print(f"Against {args.baseline} (tolerance {args.tolerance:.0%}, ignoring changes under {args.min_ms} ms):")
+    for name, old in baseline["results"].items():
+        if name not in results: continue
+        new_ms, old_ms = results[name]["median_ms"], old["median_ms"]
+        slower = new_ms > old_ms * (1 + args.tolerance) and new_ms - old_ms > args.min_ms
+        if slower: regressions.append(name)
+        print(f"  {name:<22} {old_ms:10.2f} -> {new_ms:10.2f} ms  {'REGRESSION' if slower else ''}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SSIS benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("keystroke", help="per-keystroke search latency: new connection per call vs. managed connection")
+    p.add_argument("--students", type=int, default=100000)
+    p.add_argument("--word", default="Santiago")
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_keystroke)
+    p = sub.add_parser("search", help="per-keystroke search latency: seven-way LIKE scan vs. FTS5 index")
+    p.add_argument("--students", type=int, default=500000)
+    p.add_argument("--word", default="Santiago")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--limit", type=int, default=0, help="only fetch the first N rows of each result")
+    p.set_defaults(func=bench_search)
+    p = sub.add_parser("paging", help="first paint: full fetchall vs. first keyset page")
+    p.add_argument("--students", type=int, default=1000000)
+    p.add_argument("--depth", type=int, default=50, help="extra pages to read for the deep-scroll case")
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_paging)
+    p = sub.add_parser("edits", help="per-edit UI cost: patching rows by idnum vs. full reload, across table sizes")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 500000])
+    p.add_argument("--edits", type=int, default=30, help="inserts, updates and deletes each")
+    p.add_argument("--legacy-max", type=int, default=500000, help="skip the full-reload comparison above this size")
+    p.set_defaults(func=bench_edits)
+    p = sub.add_parser("cache", help="per-keystroke first page while typing: always querying vs. the search cache")
+    p.add_argument("--students", type=int, default=500000)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--words", nargs="+", default=["santiago", "dela cruz", "maria", "jose"])
+    p.add_argument("--sort", choices=sorted(DB_COLUMN_MAP), help="column heading to sort by; unsorted searches are ranked and only hit on repeats")
+    p.add_argument("--entries", type=int, default=DEFAULT_MAX_ENTRIES)
+    p.add_argument("--rows", type=int, default=DEFAULT_MAX_ROWS)
+    p.set_defaults(func=bench_cache)
+    p = sub.add_parser("memory", help="bytes per student as sqlite3.Row, tuples and a StudentStore, and sorting in the store")
+    p.add_argument("--students", type=int, default=500000)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_memory)
+    p = sub.add_parser("stats", help="headcounts: GROUP BY over Students vs. the trigger-maintained EnrollmentStats")
+    p.add_argument("--students", type=int, default=1000000)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_stats)
+    p = sub.add_parser("fuzzy", help="misspelled name lookups: substring LIKE vs. the trigram fuzzy search, and the duplicate report")
+    p.add_argument("--students", type=int, default=1000000)
+    p.add_argument("--words", nargs="+", default=["dela crus", "delacruz", "santso", "maria santos", "vandyk"])
+    p.add_argument("--limit", type=int, default=100)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_fuzzy)
+    p = sub.add_parser("bulk", help="bulk promote/transfer/delete: per-student edits vs. set-based statements")
+    p.add_argument("--students", type=int, default=200000)
+    p.add_argument("--affected", type=int, default=100000)
+    p.add_argument("--sample", type=int, default=2000, help="per-student edits timed, then extrapolated")
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=bench_bulk)
+    p = sub.add_parser("concurrency", help="processes editing the same students: lost updates caught, lock waits and retries")
+    p.add_argument("--students", type=int, default=100000)
+    p.add_argument("--writers", type=int, nargs="+", default=[1, 2, 4, 8])
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--hot", type=int, default=100, help="students the writers pick from; fewer means more conflicts")
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=bench_concurrency)
+    p = sub.add_parser("backup", help="online backup, in page steps, in one step and with VACUUM INTO, while a writer commits")
+    p.add_argument("--students", type=int, default=2200000, help="about 1 GB")
+    p.add_argument("--pages", type=int, nargs="+", default=[256, 1024, 4096])
+    p.add_argument("--interval", type=float, default=5.0, help="ms the writer sleeps between commits")
+    p.add_argument("--idle", type=float, default=3.0, help="seconds of commits timed with no backup running")
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=bench_backup)
+    p = sub.add_parser("changes", help="full export vs. delta export since a watermark, and change log compaction")
+    p.add_argument("--students", type=int, default=1000000)
+    p.add_argument("--churn", type=float, default=0.01, help="fraction of students changed")
+    p.add_argument("--edits", type=int, default=3, help="times each changed student is edited")
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=bench_changes)
+    p = sub.add_parser("entry", help="rapid entry: local checks and batched saves of new students, by batch size")
+    p.add_argument("--students", type=int, default=1000000)
+    p.add_argument("--entries", type=int, default=500)
+    p.add_argument("--every", type=int, nargs="+", default=[1, 25, 100], help="entries per save")
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=bench_entry)
+    p = sub.add_parser("startup", help="cold start in a fresh process: imports, schema check, catalog, first page")
+    p.add_argument("--students", type=int, default=1000000)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_startup)
+    p = sub.add_parser("suite", help="hot paths on a generated database, as JSON, optionally checked against a baseline")
+    p.add_argument("--students", type=int, default=100000)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--bulk", type=int, default=10000, help="rows per bulk insert and per deleted selection")
+    p.add_argument("--output", help="write the results as JSON to this file")
+    p.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    p.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown of a median before it is a regression")
+    p.add_argument("--min-ms", type=float, default=2.0, help="ignore slowdowns smaller than this")
+    p.set_defaults(func=bench_suite)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import time
+
+from db import delete_students_bulk, change_students_bulk
+from search import build_student_target_query
+
+
+BULK_OPERATIONS = ("promote", "transfer", "delete")
+FINAL_YEAR = 5
+DEFAULT_CHUNK_SIZE = 10000
+
+# The students a change applies to are collected first, so the change sees one
+# fixed set however it alters the columns the selection was made by.
+TARGETS_DDL = "CREATE TEMP TABLE IF NOT EXISTS BulkTargets (id INTEGER PRIMARY KEY)"
+TARGETS_CHUNK = "SELECT id FROM temp.BulkTargets WHERE id > ? AND id <= ?"
+PROMOTE_SQL = (f"UPDATE Students SET yrlvl = MIN(yrlvl + 1, ?), graduated = (yrlvl >= ?), version = version + 1"
+               f" WHERE rowid IN ({TARGETS_CHUNK}) AND graduated = 0 AND yrlvl IS NOT NULL RETURNING idnum, graduated")
+TRANSFER_SQL = (f"UPDATE Students SET ccode = ?, cname = ?, pcode = ?, version = version + 1"
+                f" WHERE rowid IN ({TARGETS_CHUNK}) AND (ccode IS NOT ? OR pcode IS NOT ?) RETURNING idnum, 0")
+DELETE_WHERE = f"rowid IN ({TARGETS_CHUNK})"  # see delete_students_bulk
+
+
+class BulkCancelled(Exception):
+    pass
+
+
+class BulkResult:
+    def __init__(self, operation):
+        self.operation = operation
+        self.matched = 0
+        self.changed = 0
+        self.graduated = 0
+        self.idnums = []  # students changed, for patching the grid
+        self.cancelled = False
+        self.elapsed = 0.0
+
+    def summary(self):
+        if self.cancelled: return f"{self.operation.capitalize()} cancelled; no students were changed."
+        verb = {"promote": "promoted", "transfer": "transferred", "delete": "deleted"}[self.operation]
+        text = f"{self.changed:,} of {self.matched:,} student(s) {verb}"
+        if self.operation == "promote": text += f" ({self.graduated:,} flagged as graduated)"
+        if self.elapsed: text += f" in {self.elapsed:.2f} s"
+        return text
+
+
+def _run(conn, result, statement, set_params, where_params, search_query, use_fts, idnums, chunk_size, progress, cancelled):
+    """Applies statement to the targeted students in one transaction, a rowid range at a time.
+
+    Each range is one set-based statement; between them progress(result,
+    fraction) is called and cancelled() checked, which rolls everything back.
+    Changed students are logged once at the end (see change_students_bulk).
+    """
+    def apply(conn):
+        done, after = 0, 0
+        while after < last_id:
+            if cancelled and cancelled(): raise BulkCancelled()
+            count, upto = conn.execute("SELECT COUNT(*), MAX(id) FROM (SELECT id FROM temp.BulkTargets WHERE id > ? ORDER BY id LIMIT ?)",
+                                       (after, chunk_size)).fetchone()
+            if statement is DELETE_WHERE: result.idnums += delete_students_bulk(conn, DELETE_WHERE, (after, upto))
+            else:
+                for idnum, graduated in conn.execute(statement, set_params + [after, upto] + where_params).fetchall():
+                    result.idnums.append(idnum); result.graduated += graduated
+            done, after = done + count, upto
+            result.changed = len(result.idnums)
+            if progress: progress(result, done / result.matched)
+        return result.idnums
+
+    start = time.perf_counter()
+    conn.execute(TARGETS_DDL)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM temp.BulkTargets")
+        query, query_params = build_student_target_query(search_query, use_fts, idnums)
+        conn.execute(f"INSERT OR IGNORE INTO temp.BulkTargets (id) {query}", query_params)
+        result.matched, last_id = conn.execute("SELECT COUNT(*), IFNULL(MAX(id), 0) FROM temp.BulkTargets").fetchone()
+        if statement is DELETE_WHERE: apply(conn)
+        else: change_students_bulk(conn, apply)
+        conn.execute("DELETE FROM temp.BulkTargets")
+        conn.commit()
+    except BaseException as e:
+        conn.rollback()
+        if not isinstance(e, BulkCancelled): raise
+        result.cancelled, result.changed, result.graduated, result.idnums = True, 0, 0, []
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def promote_students(conn, search_query=None, use_fts=False, idnums=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                     progress=None, cancelled=None):
+    """Moves the students up a year level and returns a BulkResult.
+
+    idnums are the students to change; without them, every student matching
+    the search box text is. Year levels stop at FINAL_YEAR: a student promoted
+    from it is flagged as graduated instead, and graduated students are left
+    alone. The change is one transaction: all of it, or nothing if cancelled.
+    """
+    return _run(conn, BulkResult("promote"), PROMOTE_SQL, [FINAL_YEAR, FINAL_YEAR], [], search_query, use_fts, idnums,
+                chunk_size, progress, cancelled)
+
+
+def transfer_students(conn, college_code, program_code=None, search_query=None, use_fts=False, idnums=None,
+                      chunk_size=DEFAULT_CHUNK_SIZE, progress=None, cancelled=None):
+    """Moves the students to another college and program (None: no program); see promote_students."""
+    row = conn.execute("SELECT CollegeName FROM Colleges WHERE CollegeCode = ?", (college_code,)).fetchone()
+    if row is None: raise ValueError(f"unknown college {college_code!r}")
+    if program_code is not None and not conn.execute("SELECT 1 FROM Programs WHERE ProgramCode = ? AND CollegeCode = ?",
+                                                     (program_code, college_code)).fetchone():
+        raise ValueError(f"program {program_code!r} is not offered by {college_code}")
+    return _run(conn, BulkResult("transfer"), TRANSFER_SQL, [college_code, row[0], program_code], [college_code, program_code],
+                search_query, use_fts, idnums, chunk_size, progress, cancelled)
+
+
+def delete_students(conn, search_query=None, use_fts=False, idnums=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                    progress=None, cancelled=None):
+    """Deletes the students; see promote_students."""
+    return _run(conn, BulkResult("delete"), DELETE_WHERE, [], [], search_query, use_fts, idnums, chunk_size, progress, cancelled)
@@ -0,0 +1,70 @@
+from repository import CollegeRepository
+
+
+CATALOG_TABLES = ("Colleges", "Programs")
+
+
+def _changed_keys(old, new):
+    return {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+
+
+class CatalogCache:
+    """In-memory colleges and programs, so selection lookups never touch the database.
+
+    Local writes call reload() with the tables they touched; poll() picks up
+    writes from other connections and processes through PRAGMA data_version,
+    which only changes when someone else commits. generation[table] goes up
+    each time that table's contents actually change.
+    """
+
+    def __init__(self, colleges=None):
+        self.colleges = colleges or CollegeRepository()
+        self.mapping = {}  # {college name: college code}, by name
+        self.programs = {}  # {college code: {program name: program code}}
+        self.program_names = {}  # {program code: program name}
+        self.generation = dict.fromkeys(CATALOG_TABLES, 0)
+        self.loaded = False
+        self._data_version = None
+        self._validation = (None, None)  # (generation it was built at, validation catalog)
+
+    def reload(self, tables=CATALOG_TABLES):
+        """Rereads the given tables; returns the codes of the colleges whose name or programs changed."""
+        self._data_version = self.colleges.data_version()
+        changed = set()
+        if "Colleges" in tables:
+            mapping = self.colleges.mapping()
+            codes = _changed_keys({code: name for name, code in self.mapping.items()},
+                                  {code: name for name, code in mapping.items()})
+            if codes: self.mapping = mapping; self.generation["Colleges"] += 1; changed |= codes
+        if "Programs" in tables:
+            programs = self.colleges.programs()
+            codes = _changed_keys(self.programs, programs)
+            if codes:
+                self.programs = programs; self.generation["Programs"] += 1; changed |= codes
+                self.program_names = {code: name for progs in programs.values() for name, code in progs.items()}
+        self.loaded = True
+        return changed
+
+    def poll(self):
+        """Reloads everything if another connection has committed since the last reload."""
+        if self.loaded and self.colleges.data_version() == self._data_version: return set()
+        return self.reload()
+
+    def college_code(self, college_name):
+        return self.mapping.get(college_name)
+
+    def program_code(self, college_code, program_name):
+        return self.programs.get(college_code, {}).get(program_name)
+
+    def program_list(self, college_code):
+        return list(self.programs.get(college_code, {}))
+
+    def validation_catalog(self):
+        """The catalog as importer.validate_record takes it, rebuilt only when colleges or programs change."""
+        generation = tuple(self.generation.values())
+        if self._validation[0] != generation:
+            programs = {ccode: {**{pcode.upper(): pcode for pcode in progs.values()}, **{pname.upper(): pcode for pname, pcode in progs.items()}}
+                        for ccode, progs in self.programs.items()}
+            catalog = ({code: name for name, code in self.mapping.items()}, {name.lower(): code for name, code in self.mapping.items()}, programs)
+            self._validation = (generation, catalog)
+        return self._validation[1]
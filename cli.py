@@ -0,0 +1,333 @@
+"""Command-line tools for the SSIS database.
+
+    python cli.py import enrollees.csv --mode upsert --rejects rejected.csv
+    python cli.py export students.jsonl.gz --search "ccode:CCS yr:3" --sort lname
+    python cli.py changes billing-delta.jsonl --consumer billing
+    python cli.py changelog --compact --prune
+    python cli.py search "lname:santo*" --sort fname --limit 20
+    python cli.py search "~dela crus" --limit 20
+    python cli.py count "ccode:CCS yr:4"
+    python cli.py delete --from graduated.txt
+    python cli.py bulk promote --search "yr:1..5"
+    python cli.py bulk promote --all
+    python cli.py bulk transfer --college CCS --program BSCS --search "pcode:BSIT yr:1"
+    python cli.py colleges
+    python cli.py stats --by ccode yrlvl
+    python cli.py stats --verify
+    python cli.py duplicates --similarity 0.85
+    python cli.py backup copy.db
+    python cli.py snapshot --keep 48
+    python cli.py compact compacted.db
+    python cli.py check copy.db
+    python cli.py generate big.db --students 1000000 --seed 7
+
+Set SSIS_METRICS_FILE=metrics.json to time every statement and write the
+latencies (and the slow-query log, SSIS_SLOW_QUERY_MS) there on exit.
+"""
+import argparse
+import csv
+import sys
+
+from db import (DATABASE_NAME, ConnectionManager, open_tuned_connection, initialize_database, seed_default_data, student_fts_available,
+                change_consumers, change_log_head, compact_change_log)
+from repository import StudentRepository, CollegeRepository, EnrollmentStatsRepository, ENROLLMENT_STATS_DIMENSIONS
+from importer import DEFAULT_BATCH_SIZE, IMPORT_MODES, import_students
+from exporter import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, export_changes, export_students
+from bulk import BULK_OPERATIONS, promote_students, transfer_students, delete_students
+from search import DB_COLUMN_MAP, STUDENT_COLUMNS
+from fuzzy import DUPLICATE_MAX_GROUP, DUPLICATE_MIN_SIMILARITY, DUPLICATE_REPORT_LIMIT, FUZZY_LIMIT, find_duplicates, is_fuzzy
+from backup import BACKUP_PAGES_PER_STEP, SNAPSHOT_KEEP, backup_database, check_database, compact_database, take_snapshot
+from instrumentation import env_metrics
+import datagen
+
+SORT_CHOICES = {column: heading for heading, column in DB_COLUMN_MAP.items()}
+
+
+def prepare_database(conn):
+    """Brings the schema up to date and, as the GUI does, seeds the default colleges into an empty catalog."""
+    initialize_database(conn)
+    if seed_default_data(conn): print("Database was empty. Default college and program data seeded.", file=sys.stderr)
+
+
+def cmd_import(args):
+    conn = open_tuned_connection(args.database, env_metrics())
+    prepare_database(conn)
+
+    def progress(result, fraction):
+        print(f"\r{fraction:6.1%}  {result.read:,} rows read, {result.rejected + result.skipped:,} rejected or skipped",
+              end="", file=sys.stderr, flush=True)
+
+    try: result = import_students(conn, args.file, args.mode, args.batch_size, args.rejects, progress=progress)
+    except KeyboardInterrupt: print("\nInterrupted; batches already committed were kept.", file=sys.stderr); return 1
+    finally: conn.close()
+    print(file=sys.stderr)
+    print(result.summary())
+    if args.rejects and (result.rejected or result.skipped): print(f"Rejected rows written to {args.rejects}")
+    return 0
+
+
+def cmd_export(args):
+    conn = open_tuned_connection(args.database, env_metrics())
+    prepare_database(conn)
+
+    def progress(result, fraction):
+        print(f"\r{fraction:6.1%}  {result.rows:,} rows written", end="", file=sys.stderr, flush=True)
+
+    try:
+        result = export_students(conn, args.file, args.format, args.search, SORT_CHOICES.get(args.sort),
+                                 student_fts_available(conn), args.chunk_size, progress=progress)
+    except KeyboardInterrupt: print("\nInterrupted; nothing was written.", file=sys.stderr); return 1
+    except RuntimeError as e: print(e, file=sys.stderr); return 1
+    finally: conn.close()
+    print(file=sys.stderr)
+    print(result.summary())
+    return 0
+
+
+def cmd_changes(args):
+    conn = open_tuned_connection(args.database, env_metrics())
+    prepare_database(conn)
+
+    def progress(result, fraction):
+        print(f"\r{fraction:6.1%}  {result.rows:,} change(s) written", end="", file=sys.stderr, flush=True)
+
+    try: result = export_changes(conn, args.file, args.consumer, args.since, args.full, progress=None if args.file == "-" else progress)
+    except KeyboardInterrupt: print("\nInterrupted; nothing was written and no watermark moved.", file=sys.stderr); return 1
+    finally: conn.close()
+    print(file=sys.stderr)
+    print(result.summary(), file=sys.stderr if args.file == "-" else sys.stdout)
+    return 0
+
+
+def cmd_changelog(args):
+    conn = open_tuned_connection(args.database, env_metrics())
+    prepare_database(conn)
+    try:
+        if args.compact: print(f"{compact_change_log(conn, args.prune):,} entries removed")
+        entries, oldest = conn.execute("SELECT COUNT(*), MIN(seq) FROM ChangeLog").fetchone()
+        head = change_log_head(conn)
+        print(f"{entries:,} entries, changes {oldest:,} to {head:,}" if entries else f"No entries; last change {head:,}")
+        for name, seq in change_consumers(conn): print(f"  {name}\tat change {seq:,}")
+    finally: conn.close()
+    return 0
+
+
+def repositories(args):
+    connections = ConnectionManager(args.database, env_metrics())
+    prepare_database(connections.get())
+    return StudentRepository(connections), CollegeRepository(connections)
+
+
+def cmd_search(args):
+    students, _ = repositories(args)
+    writer = csv.writer(sys.stdout)
+    if is_fuzzy(args.text):
+        writer.writerow(STUDENT_COLUMNS + ("score",))
+        for row in students.fuzzy_search(args.text, args.limit or FUZZY_LIMIT): writer.writerow(tuple(row[:-1]) + (f"{row[-1]:.3f}",))
+        return 0
+    writer.writerow(STUDENT_COLUMNS)
+    rows = students.iter_search(args.text, SORT_CHOICES.get(args.sort))
+    for i, row in enumerate(rows):
+        if args.limit is not None and i >= args.limit: rows.close(); break
+        writer.writerow(row)
+    return 0
+
+
+def cmd_count(args):
+    students, _ = repositories(args)
+    print(students.count(args.text))
+    return 0
+
+
+def cmd_delete(args):
+    students, _ = repositories(args)
+    idnums = list(args.idnums)
+    if args.from_file:
+        with (sys.stdin if args.from_file == "-" else open(args.from_file, encoding="utf-8")) as f:
+            idnums.extend(line.strip() for line in f if line.strip())
+    print(f"{students.delete_many(idnums):,} of {len(idnums):,} student(s) deleted")
+    return 0
+
+
+def cmd_bulk(args):
+    # An empty selection means every student, which has to be asked for by name.
+    if not (args.all or args.from_file or (args.search or "").strip()):
+        print(f"bulk {args.operation} needs --search, --from or --all; without them it would change every student.", file=sys.stderr)
+        return 1
+    conn = open_tuned_connection(args.database, env_metrics())
+    prepare_database(conn)
+    idnums = None
+    if args.from_file:
+        with (sys.stdin if args.from_file == "-" else open(args.from_file, encoding="utf-8")) as f:
+            idnums = [line.strip() for line in f if line.strip()]
+
+    def progress(result, fraction):
+        print(f"\r{fraction:6.1%}  {result.changed:,} student(s) changed", end="", file=sys.stderr, flush=True)
+
+    target = dict(search_query=args.search, use_fts=student_fts_available(conn), idnums=idnums, progress=progress)
+    try:
+        if args.operation == "promote": result = promote_students(conn, **target)
+        elif args.operation == "transfer": result = transfer_students(conn, args.college, args.program, **target)
+        else: result = delete_students(conn, **target)
+    except KeyboardInterrupt: print("\nInterrupted; no students were changed.", file=sys.stderr); return 1
+    except ValueError as e: print(e, file=sys.stderr); return 1
+    finally: conn.close()
+    print(file=sys.stderr)
+    print(result.summary())
+    return 0
+
+
+def cmd_colleges(args):
+    _, colleges = repositories(args)
+    programs = colleges.programs()
+    for name, code in colleges.mapping().items():
+        print(f"{code}\t{name}")
+        for program_name, program_code in programs.get(code, {}).items(): print(f"  {program_code}\t{program_name}")
+    return 0
+
+
+def cmd_stats(args):
+    students, _ = repositories(args)
+    stats = EnrollmentStatsRepository(students.connections)
+    if args.verify:
+        differences = stats.verify()
+        for group, maintained, counted in differences: print(f"{'/'.join(map(str, group))}\tmaintained {maintained}\tcounted {counted}")
+        print(f"{len(differences):,} group(s) differ")
+        if differences and args.repair: stats.rebuild(); print("Statistics rebuilt from Students")
+        return 1 if differences and not args.repair else 0
+    writer = csv.writer(sys.stdout, delimiter="\t")
+    for row in stats.totals(args.by): writer.writerow(row)
+    return 0
+
+
+def cmd_duplicates(args):
+    conn = open_tuned_connection(args.database, env_metrics())
+    prepare_database(conn)
+    try: report = find_duplicates(conn, args.similarity, args.max_group, args.limit)
+    finally: conn.close()
+    writer = csv.writer(sys.stdout, delimiter="\t")
+    for number, members in enumerate(report.groups, 1):
+        for member in members: writer.writerow((number,) + member)
+    print(report.summary(), file=sys.stderr)
+    return 0
+
+
+def _copy_progress(result, fraction):
+    print(f"\r{fraction:6.1%}  {result.steps:,} step(s), {result.restarts} restart(s)", end="", file=sys.stderr, flush=True)
+
+
+def cmd_backup(args):
+    conn = open_tuned_connection(args.database, env_metrics())
+    try:
+        if args.command == "backup": result = backup_database(conn, args.target, args.pages, progress=_copy_progress)
+        elif args.command == "snapshot": result = take_snapshot(conn, args.database, args.dir, args.keep, progress=_copy_progress)
+        else: result = compact_database(conn, args.target, progress=_copy_progress)
+    except KeyboardInterrupt: print("\nInterrupted; nothing was written.", file=sys.stderr); return 1
+    finally: conn.close()
+    print(file=sys.stderr)
+    print(result.summary())
+    return 1 if result.problems else 0
+
+
+def cmd_check(args):
+    problems = check_database(args.file or args.database)
+    for problem in problems: print(problem)
+    print(f"{len(problems):,} problem(s)", file=sys.stderr)
+    return 1 if problems else 0
+
+
+def cmd_generate(args):
+    def progress(written, count):
+        print(f"\r{written / count:6.1%}  {written:,} students written", end="", file=sys.stderr, flush=True)
+
+    try: datagen.populate(args.target, args.students, args.seed, progress)
+    except ValueError as e: print(e, file=sys.stderr); return 1
+    print(file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SSIS command-line tools")
+    parser.add_argument("--database", default=DATABASE_NAME)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("import", help="bulk-load students from a CSV or JSONL file (optionally .gz)")
+    p.add_argument("file")
+    p.add_argument("--mode", choices=IMPORT_MODES, default="skip", help="what to do with an ID already in the database")
+    p.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows per transaction")
+    p.add_argument("--rejects", help="write rejected and skipped rows, with the reason, to this CSV file")
+    p.set_defaults(func=cmd_import)
+    p = sub.add_parser("export", help="write students to CSV, JSONL or Parquet (add .gz to compress)")
+    p.add_argument("file")
+    p.add_argument("--format", choices=EXPORT_FORMATS, help="default: from the file extension")
+    p.add_argument("--search", help="search box text to filter by, e.g. \"ccode:CCS yr:3\"")
+    p.add_argument("--sort", choices=sorted(SORT_CHOICES), help="column to sort by")
+    p.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows fetched per round trip")
+    p.set_defaults(func=cmd_export)
+    p = sub.add_parser("changes", help="write the students and colleges changed since a watermark as JSONL ('-' for stdout)")
+    p.add_argument("file")
+    p.add_argument("--consumer", help="downstream system whose stored watermark to start from and move on")
+    p.add_argument("--since", type=int, help="start after this change instead (not safe once the log is pruned)")
+    p.add_argument("--full", action="store_true", help="every student and college, as a consumer's first export gets")
+    p.set_defaults(func=cmd_changes)
+    p = sub.add_parser("changelog", help="change log size and consumer watermarks")
+    p.add_argument("--compact", action="store_true", help="keep only the newest change per student or college")
+    p.add_argument("--prune", action="store_true", help="with --compact, also drop changes every consumer has taken")
+    p.set_defaults(func=cmd_changelog)
+    p = sub.add_parser("search", help="print students matching search box text as CSV")
+    p.add_argument("text", nargs="?", help="search box text, e.g. \"lname:santo* yr:3\"; \"~name\" for a typo-tolerant name search")
+    p.add_argument("--sort", choices=sorted(SORT_CHOICES))
+    p.add_argument("--limit", type=int)
+    p.set_defaults(func=cmd_search)
+    p = sub.add_parser("count", help="count students matching search box text")
+    p.add_argument("text", nargs="?")
+    p.set_defaults(func=cmd_count)
+    p = sub.add_parser("delete", help="delete students by ID")
+    p.add_argument("idnums", nargs="*")
+    p.add_argument("--from", dest="from_file", help="file with one ID per line ('-' for stdin)")
+    p.set_defaults(func=cmd_delete)
+    p = sub.add_parser("bulk", help="promote, transfer or delete many students in one transaction")
+    p.add_argument("operation", choices=BULK_OPERATIONS)
+    target = p.add_mutually_exclusive_group()
+    target.add_argument("--search", help="search box text selecting the students")
+    target.add_argument("--from", dest="from_file", help="file with one ID per line ('-' for stdin) instead of --search")
+    target.add_argument("--all", action="store_true", help="every student; a bulk change of them all must ask for it")
+    p.add_argument("--college", help="college code to transfer to")
+    p.add_argument("--program", help="program code to transfer to (default: none)")
+    p.set_defaults(func=cmd_bulk)
+    p = sub.add_parser("colleges", help="list colleges and their programs")
+    p.set_defaults(func=cmd_colleges)
+    p = sub.add_parser("stats", help="student headcounts by college, program, year level and sex")
+    p.add_argument("--by", nargs="*", choices=ENROLLMENT_STATS_DIMENSIONS, default=list(ENROLLMENT_STATS_DIMENSIONS))
+    p.add_argument("--verify", action="store_true", help="recount from Students and list groups that differ (exit status 1 if any)")
+    p.add_argument("--repair", action="store_true", help="with --verify, rebuild the statistics if any group differs")
+    p.set_defaults(func=cmd_stats)
+    p = sub.add_parser("duplicates", help="list groups of students who may be registered twice, as tab-separated rows")
+    p.add_argument("--similarity", type=float, default=DUPLICATE_MIN_SIMILARITY, help="how alike two names must be (0-1)")
+    p.add_argument("--max-group", type=int, default=DUPLICATE_MAX_GROUP, help="skip names shared by more students than this")
+    p.add_argument("--limit", type=int, default=DUPLICATE_REPORT_LIMIT, help="groups listed")
+    p.set_defaults(func=cmd_duplicates)
+    p = sub.add_parser("backup", help="copy the database while it is in use, then check the copy")
+    p.add_argument("target")
+    p.add_argument("--pages", type=int, default=BACKUP_PAGES_PER_STEP, help="pages copied per step (-1: all at once)")
+    p.set_defaults(func=cmd_backup)
+    p = sub.add_parser("snapshot", help="back up to a new timestamped file and remove the oldest beyond --keep")
+    p.add_argument("--dir", help="snapshot directory (default: backups/ beside the database)")
+    p.add_argument("--keep", type=int, default=SNAPSHOT_KEEP)
+    p.set_defaults(func=cmd_backup)
+    p = sub.add_parser("compact", help="write a compacted copy (VACUUM INTO), search index merged, and check it")
+    p.add_argument("target")
+    p.set_defaults(func=cmd_backup)
+    p = sub.add_parser("check", help="integrity, foreign key and search index checks of a database file")
+    p.add_argument("file", nargs="?", help="default: --database")
+    p.set_defaults(func=cmd_check)
+    p = sub.add_parser("generate", help="fill a new database with seeded synthetic students for load testing")
+    p.add_argument("target", help="database file to create")
+    p.add_argument("--students", type=int, default=100000)
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=cmd_generate)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""Seeded synthetic student data for load testing.
+
+    python cli.py generate big.db --students 1000000 --seed 7
+"""
+import functools
+import itertools
+import random
+
+from db import open_tuned_connection, initialize_database, seed_default_data, write_students_bulk
+from importer import INSERT_SQL
+
+
+# Common Filipino given names and surnames, most frequent first; picks follow a
+# Zipf-like curve so a few names are very common and most are rare.
+FEMALE_NAMES = ["Maria", "Mary Grace", "Jennifer", "Kristine", "Angelica", "Michelle", "Joy", "Grace", "Rhea", "Liza",
+                "Jasmine", "Princess", "Nicole", "Camille", "Andrea", "Patricia", "Christine", "Bea", "Janine", "Katrina",
+                "Aileen", "Sheila", "Rowena", "Marites", "Lovely", "Hazel", "Trisha", "Erika", "Clarissa", "Jocelyn"]
+MALE_NAMES = ["John Paul", "Mark", "Jose", "Juan", "Christian", "Angelo", "Michael", "John Carlo", "Joshua", "Paolo",
+              "Ramon", "Carlo", "Noel", "Jerome", "Kenneth", "Vincent", "Adrian", "Emmanuel", "Rafael", "Miguel",
+              "Jericho", "Ryan", "Dennis", "Reynaldo", "Eduardo", "Ariel", "Jayson", "Vandyke", "Francis", "Gabriel"]
+LAST_NAMES = ["Santos", "Reyes", "Cruz", "Bautista", "Ocampo", "Garcia", "Mendoza", "Torres", "Tomas", "Andrada",
+              "Castillo", "Flores", "Villanueva", "Ramos", "Castro", "Rivera", "Aquino", "Navarro", "Salazar", "Mercado",
+              "Dela Cruz", "Del Rosario", "Gonzales", "Lopez", "Hernandez", "Perez", "De Leon", "Fernandez", "Soriano", "Pascual",
+              "Daminar", "Sanchez", "Domingo", "Gutierrez", "Valdez", "Manalo", "Dizon", "Aguilar", "Santiago", "Marquez",
+              "Cabrera", "Tolentino", "Ignacio", "Lim", "Tan", "Sy", "Co", "Macaraeg", "Panganiban", "Magbanua",
+              "Sumalinog", "Dimaculangan", "Pacquiao", "Alonzo", "Evangelista", "Javier", "Robles", "Samonte", "Lagman", "Umali"]
+# The lists head a long tail of generated names, so a large roll has thousands of
+# distinct names, mostly rare, as a real one does; with only the lists, the name
+# index and the duplicate report would see a hundred-odd names however many students.
+NAME_SYLLABLES = ["a", "ba", "bi", "ca", "co", "da", "de", "di", "do", "el", "en", "fe", "ga", "gi", "go", "ha", "in", "ja",
+                  "jo", "ka", "la", "le", "li", "lo", "lu", "ma", "me", "mi", "mo", "na", "ne", "ni", "no", "pa", "pe", "quin",
+                  "ra", "re", "ri", "ro", "ru", "sa", "se", "si", "so", "ta", "te", "ti", "to", "va", "ve", "vi", "ya", "za"]
+GENERATED_FIRST_NAMES = 2000  # per sex
+GENERATED_LAST_NAMES = 8000
+NAME_VOCABULARY_SEED = 1  # the vocabulary is the same whatever the students' seed
+# Share of students per college code; the rest of the colleges split what is left evenly.
+COLLEGE_WEIGHTS = {"CCS": 0.22, "COET": 0.2, "CBAA": 0.16, "CED": 0.14, "CSM": 0.1, "CASS": 0.1}
+YEAR_LEVEL_WEIGHTS = (0.3, 0.25, 0.2, 0.2, 0.05)
+LAST_ENROLLMENT_YEAR = 2025
+IDS_PER_YEAR = 10000  # idnums are YYYY-NNNN
+BATCH_SIZE = 50000
+
+
+def _zipf_weights(count, s=0.9):
+    """Cumulative, so a pick from thousands of names is a bisect rather than a sum over them."""
+    return list(itertools.accumulate(1 / (rank ** s) for rank in range(1, count + 1)))
+
+
+@functools.lru_cache(maxsize=1)
+def name_vocabulary():
+    """Returns (female, male, last) name lists: the lists above, then generated names of two to four syllables."""
+    rng = random.Random(NAME_VOCABULARY_SEED)
+    taken = set(FEMALE_NAMES + MALE_NAMES + LAST_NAMES)
+
+    def generated(count):
+        names = []
+        while len(names) < count:
+            name = "".join(rng.choice(NAME_SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+            if len(name) > 2 and name not in taken: taken.add(name); names.append(name)
+        return names
+    return (FEMALE_NAMES + generated(GENERATED_FIRST_NAMES), MALE_NAMES + generated(GENERATED_FIRST_NAMES),
+            LAST_NAMES + generated(GENERATED_LAST_NAMES))
+
+
+def generate_students(count, catalog, seed=42):
+    """Yields count Students rows; the same seed and catalog always give the same rows.
+
+    catalog is [(college name, college code, [program codes])]. IDs run from the
+    oldest enrollment year needed up to LAST_ENROLLMENT_YEAR, in order.
+    """
+    rng = random.Random(seed)
+    weights = [COLLEGE_WEIGHTS.get(ccode, 0) for _, ccode, _ in catalog]
+    rest = [i for i, w in enumerate(weights) if not w]
+    left = max(1 - sum(weights), 0.01 * len(rest))
+    for i in rest: weights[i] = left / len(rest)
+    female_names, male_names, last_names = name_vocabulary()
+    female_weights, male_weights, last_weights = (_zipf_weights(len(names)) for names in (female_names, male_names, last_names))
+    first_year = LAST_ENROLLMENT_YEAR - (max(count, 1) - 1) // IDS_PER_YEAR
+    for i in range(count):
+        cname, ccode, program_codes = rng.choices(catalog, weights)[0]
+        sex = rng.choice("FM")
+        fname = rng.choices(female_names if sex == "F" else male_names, cum_weights=female_weights if sex == "F" else male_weights)[0]
+        lname = rng.choices(last_names, cum_weights=last_weights)[0]
+        yrlvl = rng.choices(range(1, 6), YEAR_LEVEL_WEIGHTS)[0]
+        yield (f"{first_year + i // IDS_PER_YEAR:04d}-{i % IDS_PER_YEAR:04d}", fname, lname, sex,
+               rng.choice(program_codes), yrlvl, cname, ccode)
+
+
+def load_catalog(conn):
+    programs = {}
+    for ccode, pcode in conn.execute("SELECT CollegeCode, ProgramCode FROM Programs ORDER BY rowid"):
+        programs.setdefault(ccode, []).append(pcode)
+    return [(cname, ccode, programs[ccode]) for cname, ccode in
+            conn.execute("SELECT CollegeName, CollegeCode FROM Colleges ORDER BY CollegeCode") if ccode in programs]
+
+
+def populate(path, count, seed=42, progress=None):
+    """Fills the database at path (new or without students) with count generated students.
+
+    The default colleges and programs are seeded first if the catalog is empty.
+    progress(written, count) is called after each batch.
+    """
+    conn = open_tuned_connection(path)
+    try:
+        initialize_database(conn)
+        seed_default_data(conn)
+        if conn.execute("SELECT 1 FROM Students LIMIT 1").fetchone():
+            raise ValueError(f"{path} already has students; generate into an empty database")
+        batch, written = [], 0
+        for row in generate_students(count, load_catalog(conn), seed):
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE or written + len(batch) == count:
+                write_students_bulk(conn, INSERT_SQL, batch); conn.commit()
+                written += len(batch); batch = []
+                if progress: progress(written, count)
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
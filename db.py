@@ -0,0 +1,712 @@
+import sqlite3 as sql
+import threading
+import json
+import re
+import random
+import atexit
+
+from instrumentation import InstrumentedConnection, instrument, metrics
+from fuzzy import name_similarity
+
+DATABASE_NAME = 'students_ssis_pure_sqlite_v3.db'
+
+DEFAULT_COLLEGES_DATA = [
+    ("College of Engineering and Technology", "COET"),
+    ("College of Education", "CED"),
+    ("College of Arts and Science", "CASS"),
+    ("College of Business Administration & Accountancy", "CBAA"),
+    ("College of Nursing", "CHS"), 
+    ("College of Science and Mathematics", "CSM"),
+    ("College of Computer Studies", "CCS")
+]
+
+DEFAULT_PROGRAM_LISTS_DATA = {
+    "COET": "DIPLOMA IN CHEMICAL ENGINEERING TECHNOLOGY,BS IN CIVIL ENGINEERING,BS IN CERAMICS ENGINEERING,BS IN CHEMICAL ENGINEERING,BS IN COMPUTER ENGINEERING,BS IN ELECTRONICS & COMMUNICATIONS ENGINEERING,BS IN ELECTRICAL ENGINEERING,BS IN MINING ENG'G.,BS IN ENVIRONMENTAL ENGINEERING TECHNOLOGY,BS IN MECHANICAL ENGINEERING,BS IN METALLURGICAL ENGINEERING",
+    "CED": "BACHELOR OF SECONDARY EDUCATION (BIOLOGY),BS IN INDUSTRIAL EDUCATION (DRAFTING),BACHELOR OF SECONDARY EDUCATION (CHEMISTRY),BACHELOR OF SECONDARY EDUCATION (PHYSICS),BACHELOR OF SECONDARY EDUCATION (MATHEMATICS),BACHELOR OF SECONDARY EDUCATION (MAPEH),Certificate Program for Teachers,BACHELOR OF SECONDARY EDUCATION (TLE),BACHELOR OF SECONDARY EDUCATION (GENERAL SCIENCE),BACHELOR OF ELEMENTARY EDUCATION (ENGLISH),BACHELOR OF ELEMENTARY EDUCATION (SCIENCE AND HEALTH),BS IN TECHNOLOGY TEACHER EDUCATION (INDUSTRIAL TECH),BS IN TECHNOLOGY TEACHER EDUCATION (DRAFTING TECH)",
+    "CASS": "GENERAL EDUCATION PROGRAM,BA IN ENGLISH,BS IN PSYCHOLOGY,BA IN FILIPINO,BA IN HISTORY,BA IN POLITICAL SCIENCE",
+    "CBAA": "BS IN BUSINESS ADMINISTRATION (BUSINESS ECONOMICS),BS IN BUSINESS ADMINISTRATION (ECONOMICS),BS IN BUSINESS ADMINISTRATION (ENTREPRENEURIAL MARKETING),BS IN HOTEL AND RESTAURANT MANAGEMENT,BS IN ACCOUNTANCY",
+    "CHS": "BS IN NURSING",
+    "CSM": "BS IN BIOLOGY (GENERAL),BS IN STATISTICS,BS IN BIOLOGY (BOTANY),BS IN BIOLOGY (ZOOLOGY),BS IN BIOLOGY (MARINE),BS IN CHEMISTRY,BS IN MATHEMATICS,BS IN PHYSICS",
+    "CCS": "BS IN COMPUTER SCIENCE,BS IN INFORMATION TECHNOLOGY,BS IN INFORMATION SYSTEMS,BS IN ELECTRONICS AND COMPUTER TECHNOLOGY (EMBEDDED SYSTEMS),BS IN ELECTRONICS AND COMPUTER TECHNOLOGY (COMMUNICATIONS SYSTEM),DIPLOMA IN ELECTRONICS TECHNOLOGY,DIPLOMA IN ELECTRONICS ENGINEERING TECH (Communication Electronics),DIPLOMA IN ELECTRONICS ENGINEERING TECH (Computer Electronics)"
+}
+
+# Several stations may share the database file. In WAL mode readers never block
+# the writer or each other; a writer waits up to BUSY_TIMEOUT_MS for another's
+# transaction to finish, and repository writes that still find the database
+# locked are retried WRITE_RETRIES times with jittered exponential backoff.
+BUSY_TIMEOUT_MS = 5000
+WRITE_RETRIES = 5
+RETRY_BACKOFF_S = 0.05
+
+# Applied once when a connection is opened; the connection is then kept for the
+# life of the process so the page cache stays warm between calls.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",      # 64 MiB
+    "PRAGMA mmap_size = 268435456",    # 256 MiB
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+STATEMENT_CACHE_SIZE = 256
+
+
+def open_tuned_connection(database=DATABASE_NAME, metrics=None):
+    """metrics, if given, records the connection's statements (see instrumentation)."""
+    conn = sql.connect(database, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False,
+                       factory=InstrumentedConnection if metrics else sql.Connection)
+    if metrics: instrument(conn, metrics, database)
+    conn.row_factory = sql.Row
+    conn.create_function("name_similarity", 2, name_similarity, deterministic=True)  # for fuzzy name search
+    for pragma in CONNECTION_PRAGMAS: conn.execute(pragma)
+    return conn
+
+
+class ConnectionManager:
+    """Keeps one long-lived tuned connection per thread for a database file."""
+
+    def __init__(self, database=DATABASE_NAME, metrics=None):
+        self.database = database
+        self.metrics = metrics
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self.write_generation = 0  # bumped by every write committed through a repository
+        self.busy_retries = 0      # writes retried because another connection held the lock
+
+    def get(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = open_tuned_connection(self.database, self.metrics)
+            self._local.conn = conn
+            with self._lock: self._connections.append(conn)
+        return conn
+
+    def release(self, conn):
+        # The connection stays open; only make sure a failed write does not leave
+        # a transaction hanging around for the next caller.
+        if conn.in_transaction: conn.rollback()
+
+    def close_current(self):
+        """Closes the calling thread's connection, for threads that end (see workers.BackgroundTask)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None: return
+        self._local.conn = None
+        with self._lock:
+            if conn in self._connections: self._connections.remove(conn)
+        try: conn.close()
+        except sql.Error: pass
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._connections:
+                try: conn.close()
+                except sql.Error: pass
+            self._connections.clear()
+        self._local = threading.local()
+
+
+connection_manager = ConnectionManager(metrics=metrics)  # the GUI's connections, instrumented
+atexit.register(connection_manager.close_all)
+
+
+def is_busy_error(error):
+    """True for SQLITE_BUSY/SQLITE_LOCKED (and their extended codes): another connection holds the lock."""
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None: return code & 0xFF in (sql.SQLITE_BUSY, sql.SQLITE_LOCKED)
+    return isinstance(error, sql.OperationalError) and ("locked" in str(error) or "busy" in str(error))
+
+def retry_backoff(attempt):
+    """Seconds to wait before retry number attempt (0-based): doubling, with jitter so writers spread out."""
+    return RETRY_BACKOFF_S * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+def get_db_connection():
+    return connection_manager.get()
+
+def release_db_connection(conn):
+    connection_manager.release(conn)
+
+STUDENTS_DDL = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        idnum TEXT PRIMARY KEY,
+        fname TEXT,
+        lname TEXT,
+        sex TEXT,
+        pcode TEXT,
+        yrlvl INTEGER,
+        cname TEXT,
+        ccode TEXT,
+        FOREIGN KEY (ccode) REFERENCES Colleges(CollegeCode) ON DELETE SET NULL ON UPDATE CASCADE,
+        FOREIGN KEY (pcode) REFERENCES Programs(ProgramCode) ON DELETE SET NULL ON UPDATE CASCADE
+    )
+'''
+
+def seed_default_data(conn):
+    """Fills an empty catalog with the default colleges and their programs; returns True if it did."""
+    if conn.execute("SELECT 1 FROM Colleges LIMIT 1").fetchone(): return False
+    conn.executemany("INSERT OR IGNORE INTO Colleges (CollegeName, CollegeCode) VALUES (?, ?)", DEFAULT_COLLEGES_DATA)
+    for ccode, programs_str in DEFAULT_PROGRAM_LISTS_DATA.items():
+        for program_name in split_program_names(programs_str): add_program(conn, ccode, program_name)
+    conn.commit()
+    return True
+
+def table_exists(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+# --- Programs ---
+# One row per program, keyed by a short generated code ("BS IN COMPUTER SCIENCE"
+# -> "BSCS") that Students.pcode references.
+PROGRAM_CODE_STOPWORDS = {"IN", "OF", "AND", "THE", "FOR"}
+PROGRAM_CODE_MAX_LEN = 12
+
+def split_program_names(program_names):
+    """Splits a comma-separated program list, dropping blanks and duplicates (order kept)."""
+    return list(dict.fromkeys(p.strip() for p in (program_names or "").split(',') if p.strip()))
+
+def make_program_code(program_name, taken):
+    words = [w for w in re.findall(r"[A-Za-z0-9]+", program_name.upper()) if w not in PROGRAM_CODE_STOPWORDS]
+    base = "".join(w if len(w) <= 2 else w[0] for w in words)[:PROGRAM_CODE_MAX_LEN] or "PROG"
+    code, n = base, 2
+    while code in taken: code, n = f"{base}{n}", n + 1
+    return code
+
+def add_program(conn, college_code, program_name):
+    """Adds one program to a college and returns its code (the existing one if already listed)."""
+    row = conn.execute("SELECT ProgramCode FROM Programs WHERE CollegeCode = ? AND ProgramName = ?",
+                       (college_code, program_name)).fetchone()
+    if row: return row[0]
+    base = make_program_code(program_name, ())
+    taken = {r[0] for r in conn.execute("SELECT ProgramCode FROM Programs WHERE ProgramCode >= ? AND ProgramCode < ?",
+                                        (base, base + "~"))}
+    code = make_program_code(program_name, taken)
+    conn.execute("INSERT INTO Programs (ProgramCode, ProgramName, CollegeCode) VALUES (?, ?, ?)",
+                 (code, program_name, college_code))
+    return code
+
+def remove_program(conn, program_code):
+    """Removes one program; students enrolled in it are left with a blank program."""
+    return conn.execute("DELETE FROM Programs WHERE ProgramCode = ?", (program_code,)).rowcount
+
+def migrate_program_lists(conn):
+    """One-time move from comma-joined CollegeProgramLists strings to Programs rows.
+
+    Students.pcode is rewritten from program names to program codes, and the
+    Students table is rebuilt so pcode gets its foreign key to Programs. Rowids
+    are kept, but the search index is rebuilt since pcode changed.
+    """
+    fk_tables = {row[2] for row in conn.execute("PRAGMA foreign_key_list(Students)")}
+    has_lists = table_exists(conn, "CollegeProgramLists")
+    if "Programs" in fk_tables and not has_lists: return
+    conn.commit()
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        if has_lists:
+            for college_code, program_names in conn.execute("SELECT CollegeCode, ProgramNames FROM CollegeProgramLists").fetchall():
+                for program_name in split_program_names(program_names): add_program(conn, college_code, program_name)
+        # Free-text program names on students that no college list mentions.
+        for college_code, program_name in conn.execute(
+                """SELECT DISTINCT s.ccode, s.pcode FROM Students s JOIN Colleges c ON c.CollegeCode = s.ccode
+                   WHERE s.pcode IS NOT NULL AND s.pcode NOT IN (SELECT ProgramCode FROM Programs)""").fetchall():
+            add_program(conn, college_code, program_name)
+        if "Programs" not in fk_tables:
+            conn.execute("DROP TABLE IF EXISTS Students_migrating")
+            conn.execute(STUDENTS_DDL.format(name="Students_migrating"))
+            conn.execute("""
+                INSERT INTO Students_migrating (rowid, idnum, fname, lname, sex, pcode, yrlvl, cname, ccode)
+                SELECT s.rowid, s.idnum, s.fname, s.lname, s.sex,
+                       COALESCE((SELECT p.ProgramCode FROM Programs p WHERE p.CollegeCode = s.ccode AND p.ProgramName = s.pcode),
+                                (SELECT p.ProgramCode FROM Programs p WHERE p.ProgramCode = s.pcode)),
+                       s.yrlvl, s.cname, s.ccode
+                FROM Students s""")
+            conn.execute("DROP TABLE Students")
+            conn.execute("ALTER TABLE Students_migrating RENAME TO Students")
+        conn.execute("DROP TABLE IF EXISTS CollegeProgramLists")
+        if student_fts_available(conn):
+            for trigger in STUDENT_FTS_TRIGGERS: conn.execute(trigger)
+            rebuild_student_fts(conn)
+        conn.commit()
+    except sql.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON")
+
+# Serve the field:value filters from the search box (see search.compile_filter);
+# name filters are case-insensitive, so that index is NOCASE.
+STUDENT_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_students_ccode_yrlvl ON Students(ccode, yrlvl)",
+    "CREATE INDEX IF NOT EXISTS idx_students_lname_fname ON Students(lname COLLATE NOCASE, fname COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS idx_students_pcode ON Students(pcode)",  # also serves the Programs foreign key
+)
+
+# --- Trigger gates ---
+# The bulk writers (write_students_bulk and the like) keep the search index,
+# statistics, name index and change log current with one set-based statement
+# each, so the per-row triggers doing the same must sit out their statements.
+# Dropping and recreating the triggers would be DDL, making every station
+# re-prepare its statements, so each such trigger is gated instead: it fires
+# only while TriggerGates has no row naming it. A bulk writer closes the gates
+# it needs inside its transaction and opens them again before the commit, so
+# no other connection ever sees a closed gate.
+TRIGGER_GATES_DDL = "CREATE TABLE IF NOT EXISTS TriggerGates (name TEXT PRIMARY KEY) WITHOUT ROWID"
+
+def _gate_open(trigger):
+    """The WHEN condition that lets a trigger skip statements run with its gate closed."""
+    return f"NOT EXISTS (SELECT 1 FROM TriggerGates WHERE name = '{trigger}')"
+
+def close_trigger_gates(conn, triggers):
+    conn.execute("INSERT OR IGNORE INTO TriggerGates (name) SELECT value FROM json_each(?)", (json.dumps(list(triggers)),))
+
+def open_trigger_gates(conn, triggers):
+    conn.execute("DELETE FROM TriggerGates WHERE name IN (SELECT value FROM json_each(?))", (json.dumps(list(triggers)),))
+
+# Full-text index over the searchable Students columns. It reads its content from
+# Students (external content, keyed by rowid) and the triggers below keep it in
+# sync. unicode61 splits the idnum on its hyphen, so "2023-03" is searched as the
+# phrase prefix "2023 03"*, and the prefix indexes keep short prefixes cheap.
+STUDENT_FTS_DDL = (
+    '''CREATE VIRTUAL TABLE StudentsFTS USING fts5(
+        idnum, fname, lname, sex, pcode, cname, ccode,
+        content='Students', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+    )''',
+    # Weight ID and name hits above program/college hits when ranking.
+    "INSERT INTO StudentsFTS(StudentsFTS, rank) VALUES ('rank', 'bm25(10.0, 5.0, 5.0, 0.5, 1.0, 1.0, 1.0)')",
+)
+STUDENT_FTS_TRIGGERS = (
+    f'''CREATE TRIGGER IF NOT EXISTS Students_fts_insert AFTER INSERT ON Students WHEN {_gate_open('Students_fts_insert')} BEGIN
+        INSERT INTO StudentsFTS(rowid, idnum, fname, lname, sex, pcode, cname, ccode)
+        VALUES (new.rowid, new.idnum, new.fname, new.lname, new.sex, new.pcode, new.cname, new.ccode);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS Students_fts_delete AFTER DELETE ON Students WHEN {_gate_open('Students_fts_delete')} BEGIN
+        INSERT INTO StudentsFTS(StudentsFTS, rowid, idnum, fname, lname, sex, pcode, cname, ccode)
+        VALUES ('delete', old.rowid, old.idnum, old.fname, old.lname, old.sex, old.pcode, old.cname, old.ccode);
+    END''',
+    # yrlvl and graduated aren't indexed, so promoting students doesn't touch the index.
+    f'''CREATE TRIGGER IF NOT EXISTS Students_fts_update AFTER UPDATE OF idnum, fname, lname, sex, pcode, cname, ccode ON Students
+    WHEN {_gate_open('Students_fts_update')} BEGIN
+        INSERT INTO StudentsFTS(StudentsFTS, rowid, idnum, fname, lname, sex, pcode, cname, ccode)
+        VALUES ('delete', old.rowid, old.idnum, old.fname, old.lname, old.sex, old.pcode, old.cname, old.ccode);
+        INSERT INTO StudentsFTS(rowid, idnum, fname, lname, sex, pcode, cname, ccode)
+        VALUES (new.rowid, new.idnum, new.fname, new.lname, new.sex, new.pcode, new.cname, new.ccode);
+    END''',
+)
+
+def create_student_fts(cursor):
+    """Creates the student search index, building it from Students on first run."""
+    cursor.execute(TRIGGER_GATES_DDL)
+    if student_fts_available(cursor.connection):
+        for trigger in STUDENT_FTS_TRIGGERS: cursor.execute(trigger)
+        return
+    try:
+        for statement in STUDENT_FTS_DDL: cursor.execute(statement)
+    except sql.OperationalError:
+        return  # SQLite built without FTS5; search falls back to LIKE
+    for trigger in STUDENT_FTS_TRIGGERS: cursor.execute(trigger)
+    rebuild_student_fts(cursor.connection)
+
+# Bulk counterparts of the triggers: unindex the given students before they are
+# overwritten, and index the rows added after a rowid or overwritten since.
+STUDENT_FTS_UNINDEX_IDNUMS = '''INSERT INTO StudentsFTS(StudentsFTS, rowid, idnum, fname, lname, sex, pcode, cname, ccode)
+    SELECT 'delete', rowid, idnum, fname, lname, sex, pcode, cname, ccode FROM Students
+    WHERE idnum IN (SELECT value FROM json_each(?))'''
+STUDENT_FTS_INDEX_WRITTEN = '''INSERT INTO StudentsFTS(rowid, idnum, fname, lname, sex, pcode, cname, ccode)
+    SELECT rowid, idnum, fname, lname, sex, pcode, cname, ccode FROM Students
+    WHERE rowid > ? OR idnum IN (SELECT value FROM json_each(?))'''
+
+# The triggers the bulk writers below stand in for.
+WRITE_BULK_GATES = ("Students_fts_insert", "Students_fts_update", "Students_stats_insert", "Students_stats_update",
+                    "Students_names_insert", "Students_names_update_fname", "Students_names_update_lname",
+                    "Students_changes_insert", "Students_changes_update")
+DELETE_BULK_GATES = ("Students_fts_delete", "Students_stats_delete", "Students_names_delete", "Students_changes_delete")
+
+def write_students_bulk(conn, statement, rows, updated_idnums=()):
+    """Runs an INSERT (or upsert) into Students for many rows, indexing and counting them in one pass.
+
+    Feeding StudentsFTS, EnrollmentStats, the name trigrams and the change log a row
+    at a time through the triggers is slower than one INSERT ... SELECT each, so the
+    insert and update triggers' gates are closed for the batch (see TriggerGates).
+    updated_idnums are the students the statement overwrites; new rows are
+    found by rowid, since they get rowids above the current maximum.
+    """
+    fts, stats, names = student_fts_available(conn), table_exists(conn, "EnrollmentStats"), name_trigrams_available(conn)
+    changes = change_log_available(conn)
+    if not (fts or stats or names or changes): conn.executemany(statement, rows); return
+    if not conn.in_transaction: conn.execute("BEGIN IMMEDIATE")
+    last_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM Students").fetchone()[0]
+    updated = json.dumps(list(updated_idnums))
+    if fts and updated_idnums: conn.execute(STUDENT_FTS_UNINDEX_IDNUMS, (updated,))
+    if stats and updated_idnums: conn.execute(ENROLLMENT_STATS_UNCOUNT_IDNUMS, (updated,))
+    if names and updated_idnums: conn.execute(NAME_UNCOUNT_IDNUMS, (updated,))
+    close_trigger_gates(conn, WRITE_BULK_GATES)
+    conn.executemany(statement, rows)
+    if fts: conn.execute(STUDENT_FTS_INDEX_WRITTEN, (last_rowid, updated))
+    if stats:
+        conn.execute(ENROLLMENT_STATS_COUNT_WRITTEN, (last_rowid, updated))
+        conn.execute("DELETE FROM EnrollmentStats WHERE students <= 0")
+    if names:
+        conn.execute(NAME_INDEX_WRITTEN, (last_rowid, updated))
+        conn.execute(NAME_COUNT_WRITTEN, (last_rowid, updated))
+        for statement in NAME_DROP_UNUSED: conn.execute(statement)
+    if changes: conn.execute(CHANGE_LOG_WRITTEN, (last_rowid, updated))
+    open_trigger_gates(conn, WRITE_BULK_GATES)
+
+def delete_students_bulk(conn, condition, params=()):
+    """Deletes the students matching condition (a WHERE clause on Students) and returns their idnums.
+
+    The bulk counterpart of the delete triggers, as write_students_bulk is of
+    the insert and update ones: the students are unindexed and uncounted
+    while still there, then deleted with those triggers' gates closed.
+    """
+    fts, stats, names = student_fts_available(conn), table_exists(conn, "EnrollmentStats"), name_trigrams_available(conn)
+    changes = change_log_available(conn)
+    if not conn.in_transaction: conn.execute("BEGIN IMMEDIATE")
+    idnums = json.dumps([row[0] for row in conn.execute(f"SELECT idnum FROM Students WHERE {condition}", params)])
+    if fts: conn.execute(STUDENT_FTS_UNINDEX_IDNUMS, (idnums,))
+    if stats: conn.execute(ENROLLMENT_STATS_UNCOUNT_IDNUMS, (idnums,))
+    if names: conn.execute(NAME_UNCOUNT_IDNUMS, (idnums,))
+    close_trigger_gates(conn, DELETE_BULK_GATES)
+    deleted = [row[0] for row in conn.execute("DELETE FROM Students WHERE idnum IN (SELECT value FROM json_each(?)) RETURNING idnum",
+                                              (idnums,)).fetchall()]
+    if stats: conn.execute("DELETE FROM EnrollmentStats WHERE students <= 0")
+    if names:
+        for statement in NAME_DROP_UNUSED: conn.execute(statement)
+    if changes: conn.execute(CHANGE_LOG_IDNUMS, ("D", json.dumps(deleted)))
+    open_trigger_gates(conn, DELETE_BULK_GATES)
+    return deleted
+
+# --- Enrollment statistics ---
+# Headcounts per (college, program, year level, sex), kept current by triggers so
+# the statistics window reads one row per group instead of scanning Students.
+# The key columns are NOT NULL (a blank college, program, year or sex is counted
+# under '') so a group can be upserted by its primary key.
+ENROLLMENT_STATS_DDL = '''
+    CREATE TABLE IF NOT EXISTS EnrollmentStats (
+        ccode TEXT NOT NULL,
+        pcode TEXT NOT NULL,
+        yrlvl NOT NULL,
+        sex TEXT NOT NULL,
+        students INTEGER NOT NULL,
+        PRIMARY KEY (ccode, pcode, yrlvl, sex)
+    ) WITHOUT ROWID
+'''
+ENROLLMENT_STATS_KEY = "IFNULL({0}.ccode, ''), IFNULL({0}.pcode, ''), IFNULL({0}.yrlvl, ''), IFNULL({0}.sex, '')"
+_STATS_GROUP = "ccode = IFNULL({0}.ccode, '') AND pcode = IFNULL({0}.pcode, '') AND yrlvl = IFNULL({0}.yrlvl, '') AND sex = IFNULL({0}.sex, '')"
+_STATS_COUNT = f"""INSERT INTO EnrollmentStats (ccode, pcode, yrlvl, sex, students) VALUES ({ENROLLMENT_STATS_KEY.format('new')}, 1)
+        ON CONFLICT (ccode, pcode, yrlvl, sex) DO UPDATE SET students = students + 1;"""
+_STATS_UNCOUNT = f"""UPDATE EnrollmentStats SET students = students - 1 WHERE {_STATS_GROUP.format('old')};
+        DELETE FROM EnrollmentStats WHERE {_STATS_GROUP.format('old')} AND students <= 0;"""
+# Foreign key actions (a college recoded, a program removed) fire these too.
+ENROLLMENT_STATS_TRIGGERS = (
+    f'''CREATE TRIGGER IF NOT EXISTS Students_stats_insert AFTER INSERT ON Students WHEN {_gate_open('Students_stats_insert')} BEGIN
+        {_STATS_COUNT}
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS Students_stats_delete AFTER DELETE ON Students WHEN {_gate_open('Students_stats_delete')} BEGIN
+        {_STATS_UNCOUNT}
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS Students_stats_update AFTER UPDATE OF ccode, pcode, yrlvl, sex ON Students
+    WHEN (old.ccode IS NOT new.ccode OR old.pcode IS NOT new.pcode OR old.yrlvl IS NOT new.yrlvl OR old.sex IS NOT new.sex)
+    AND {_gate_open('Students_stats_update')} BEGIN
+        {_STATS_UNCOUNT}
+        {_STATS_COUNT}
+    END''',
+)
+ENROLLMENT_STATS_FROM_STUDENTS = ("SELECT IFNULL(s.ccode, '') AS ccode, IFNULL(s.pcode, '') AS pcode, IFNULL(s.yrlvl, '') AS yrlvl, IFNULL(s.sex, '') AS sex, COUNT(*) AS students"
+                                  " FROM Students s {where} GROUP BY 1, 2, 3, 4")
+# Bulk counterparts of the triggers (see write_students_bulk).
+ENROLLMENT_STATS_UNCOUNT_IDNUMS = f"""UPDATE EnrollmentStats SET students = EnrollmentStats.students - g.students
+    FROM ({ENROLLMENT_STATS_FROM_STUDENTS.format(where="WHERE s.idnum IN (SELECT value FROM json_each(?))")}) AS g
+    WHERE EnrollmentStats.ccode = g.ccode AND EnrollmentStats.pcode = g.pcode AND EnrollmentStats.yrlvl = g.yrlvl AND EnrollmentStats.sex = g.sex"""
+ENROLLMENT_STATS_COUNT_WRITTEN = f"""INSERT INTO EnrollmentStats (ccode, pcode, yrlvl, sex, students)
+    {ENROLLMENT_STATS_FROM_STUDENTS.format(where="WHERE s.rowid > ? OR s.idnum IN (SELECT value FROM json_each(?))")}
+    ON CONFLICT (ccode, pcode, yrlvl, sex) DO UPDATE SET students = students + excluded.students"""
+
+def create_enrollment_stats(conn):
+    """Version 2: the enrollment statistics table and its triggers, counted from Students."""
+    conn.execute(TRIGGER_GATES_DDL)
+    conn.execute(ENROLLMENT_STATS_DDL)
+    for trigger in ENROLLMENT_STATS_TRIGGERS: conn.execute(trigger)
+    rebuild_enrollment_stats(conn)
+
+def rebuild_enrollment_stats(conn):
+    conn.execute("DELETE FROM EnrollmentStats")
+    conn.execute("INSERT INTO EnrollmentStats (ccode, pcode, yrlvl, sex, students) " + ENROLLMENT_STATS_FROM_STUDENTS.format(where=""))
+
+def enrollment_stats_differences(conn):
+    """Counts the groups from Students afresh; returns [(group, maintained, counted)] where they disagree."""
+    maintained = {tuple(row[:4]): row[4] for row in conn.execute("SELECT ccode, pcode, yrlvl, sex, students FROM EnrollmentStats")}
+    counted = {tuple(row[:4]): row[4] for row in conn.execute(ENROLLMENT_STATS_FROM_STUDENTS.format(where=""))}
+    return [(group, maintained.get(group, 0), counted.get(group, 0)) for group in sorted(maintained.keys() | counted.keys(), key=repr)
+            if maintained.get(group, 0) != counted.get(group, 0)]
+
+# --- Name trigrams ---
+# Typo-tolerant name search (see fuzzy.py) looks names up by their trigrams. Names
+# repeat across students, so each distinct first or last name is indexed once:
+# StudentNames counts the students using a name, and its trigrams are added when
+# the count leaves zero and removed when it returns. A name's key is lower-cased
+# with spaces, hyphens and periods dropped ("Dela Cruz" and "Delacruz" are both
+# "$delacruz$"); Numbers holds the positions its trigrams start at.
+NAME_KEY_MAX = 64
+NAME_TRIGRAM_DDL = (
+    "CREATE TABLE IF NOT EXISTS Numbers (n INTEGER PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS StudentNames (name TEXT PRIMARY KEY, students INTEGER NOT NULL) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS NameTrigrams (gram TEXT NOT NULL, name TEXT NOT NULL, PRIMARY KEY (gram, name)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS idx_students_fname_lname ON Students(fname COLLATE NOCASE, lname COLLATE NOCASE)",  # candidates by first name
+)
+NAME_KEY_SQL = "'$' || lower(replace(replace(replace({0}, ' ', ''), '-', ''), '.', '')) || '$'"
+
+def _name_trigrams(names):
+    """SELECT of (gram, name) for every trigram of the names the given SELECT returns (as name)."""
+    return (f"SELECT DISTINCT substr(k, n, 3), name FROM (SELECT name, {NAME_KEY_SQL.format('name')} AS k FROM ({names}))"
+            " JOIN Numbers ON n <= length(k) - 2")
+
+def _name_count(value):
+    return f"""INSERT INTO NameTrigrams (gram, name) {_name_trigrams(f"SELECT {value} AS name WHERE {value} IS NOT NULL AND NOT EXISTS (SELECT 1 FROM StudentNames WHERE name = {value})")};
+        INSERT INTO StudentNames (name, students) SELECT {value}, 1 WHERE {value} IS NOT NULL
+        ON CONFLICT (name) DO UPDATE SET students = students + 1;"""
+
+def _name_uncount(value):
+    return f"""UPDATE StudentNames SET students = students - 1 WHERE name = {value};
+        DELETE FROM NameTrigrams WHERE (gram, name) IN ({_name_trigrams(f"SELECT name FROM StudentNames WHERE name = {value} AND students <= 0")});
+        DELETE FROM StudentNames WHERE name = {value} AND students <= 0;"""
+
+NAME_TRIGRAM_TRIGGERS = (
+    f'''CREATE TRIGGER IF NOT EXISTS Students_names_insert AFTER INSERT ON Students WHEN {_gate_open('Students_names_insert')} BEGIN
+        {_name_count("new.fname")}
+        {_name_count("new.lname")}
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS Students_names_delete AFTER DELETE ON Students WHEN {_gate_open('Students_names_delete')} BEGIN
+        {_name_uncount("old.fname")}
+        {_name_uncount("old.lname")}
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS Students_names_update_fname AFTER UPDATE OF fname ON Students
+    WHEN old.fname IS NOT new.fname AND {_gate_open('Students_names_update_fname')} BEGIN
+        {_name_uncount("old.fname")}
+        {_name_count("new.fname")}
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS Students_names_update_lname AFTER UPDATE OF lname ON Students
+    WHEN old.lname IS NOT new.lname AND {_gate_open('Students_names_update_lname')} BEGIN
+        {_name_uncount("old.lname")}
+        {_name_count("new.lname")}
+    END''',
+)
+_NAMES_OF = "SELECT fname AS name FROM Students {where} UNION ALL SELECT lname FROM Students {where}"
+# Bulk counterparts of the triggers (see write_students_bulk).
+NAME_UNCOUNT_IDNUMS = f"""UPDATE StudentNames SET students = StudentNames.students - g.students
+    FROM (SELECT name, COUNT(*) AS students FROM ({_NAMES_OF.format(where="WHERE idnum IN (SELECT value FROM json_each(?1))")}) GROUP BY name) AS g
+    WHERE StudentNames.name = g.name"""
+_WRITTEN_NAMES = _NAMES_OF.format(where="WHERE rowid > ?1 OR idnum IN (SELECT value FROM json_each(?2))")
+NAME_INDEX_WRITTEN = f"""INSERT OR IGNORE INTO NameTrigrams (gram, name)
+    {_name_trigrams(f"SELECT DISTINCT name FROM ({_WRITTEN_NAMES}) WHERE name IS NOT NULL AND name NOT IN (SELECT name FROM StudentNames)")}"""
+NAME_COUNT_WRITTEN = f"""INSERT INTO StudentNames (name, students)
+    SELECT name, COUNT(*) FROM ({_WRITTEN_NAMES}) WHERE name IS NOT NULL GROUP BY name
+    ON CONFLICT (name) DO UPDATE SET students = students + excluded.students"""
+NAME_DROP_UNUSED = (f"DELETE FROM NameTrigrams WHERE (gram, name) IN ({_name_trigrams('SELECT name FROM StudentNames WHERE students <= 0')})",
+                    "DELETE FROM StudentNames WHERE students <= 0")
+
+def create_name_trigrams(conn):
+    """Version 5: the name trigram index and its triggers, built from Students."""
+    conn.execute(TRIGGER_GATES_DDL)
+    for statement in NAME_TRIGRAM_DDL: conn.execute(statement)
+    conn.execute(f"INSERT OR IGNORE INTO Numbers (n) SELECT value FROM generate_series(1, {NAME_KEY_MAX})"
+                 if _has_generate_series(conn) else "INSERT OR IGNORE INTO Numbers (n) VALUES " + ", ".join(f"({n})" for n in range(1, NAME_KEY_MAX + 1)))
+    for trigger in NAME_TRIGRAM_TRIGGERS: conn.execute(trigger)
+    rebuild_name_trigrams(conn)
+
+def _has_generate_series(conn):
+    try: conn.execute("SELECT value FROM generate_series(1, 1)").fetchall(); return True
+    except sql.OperationalError: return False
+
+def rebuild_name_trigrams(conn):
+    conn.execute("DELETE FROM NameTrigrams"); conn.execute("DELETE FROM StudentNames")
+    conn.execute(NAME_INDEX_WRITTEN, (0, "[]"))
+    conn.execute(NAME_COUNT_WRITTEN, (0, "[]"))
+
+def name_trigrams_available(conn):
+    return table_exists(conn, "NameTrigrams")
+
+def rebuild_student_fts(conn):
+    conn.execute("INSERT INTO StudentsFTS(StudentsFTS) VALUES ('rebuild')")
+
+def student_fts_available(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'StudentsFTS'").fetchone() is not None
+
+
+# --- Change log ---
+# Every insert, update and delete of a student or college, in commit order, for
+# downstream systems that take deltas instead of the whole roster (see
+# exporter.export_changes). Only the key is logged; an export reads the rows as
+# they are then. The triggers also fire for the foreign key cascades, so recoding
+# or deleting a college logs each student it touches. AUTOINCREMENT keeps seq
+# from ever being reused once compaction has deleted the newest entries.
+# ChangeConsumers holds each consumer's watermark: the last seq it has taken.
+CHANGE_LOG_DDL = (
+    '''CREATE TABLE IF NOT EXISTS ChangeLog (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        tbl TEXT NOT NULL,
+        op TEXT NOT NULL,
+        pk TEXT NOT NULL
+    )''',
+    "CREATE TABLE IF NOT EXISTS ChangeConsumers (name TEXT PRIMARY KEY, seq INTEGER NOT NULL)",
+)
+_LOG = "INSERT INTO ChangeLog (tbl, op, pk) VALUES ('{0}', '{1}', {2});"
+_LOG_RENAME = "INSERT INTO ChangeLog (tbl, op, pk) SELECT '{0}', 'D', old.{1} WHERE old.{1} IS NOT new.{1};"
+_STUDENT_CHANGED = " OR ".join(f"old.{c} IS NOT new.{c}" for c in ("idnum", "fname", "lname", "sex", "pcode", "yrlvl", "cname", "ccode", "graduated"))
+CHANGE_LOG_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS Students_changes_insert AFTER INSERT ON Students WHEN {_gate_open('Students_changes_insert')} BEGIN
+        {_LOG.format('Students', 'I', 'new.idnum')} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS Students_changes_delete AFTER DELETE ON Students WHEN {_gate_open('Students_changes_delete')} BEGIN
+        {_LOG.format('Students', 'D', 'old.idnum')} END""",
+    # Not OF version, so the version trigger's own UPDATE isn't logged twice; a changed idnum logs the old one as deleted.
+    f'''CREATE TRIGGER IF NOT EXISTS Students_changes_update AFTER UPDATE OF idnum, fname, lname, sex, pcode, yrlvl, cname, ccode, graduated
+        ON Students WHEN ({_STUDENT_CHANGED}) AND {_gate_open('Students_changes_update')} BEGIN
+        {_LOG_RENAME.format('Students', 'idnum')} {_LOG.format('Students', 'U', 'new.idnum')}
+    END''',
+    f"CREATE TRIGGER IF NOT EXISTS Colleges_changes_insert AFTER INSERT ON Colleges BEGIN {_LOG.format('Colleges', 'I', 'new.CollegeCode')} END",
+    f"CREATE TRIGGER IF NOT EXISTS Colleges_changes_delete AFTER DELETE ON Colleges BEGIN {_LOG.format('Colleges', 'D', 'old.CollegeCode')} END",
+    f'''CREATE TRIGGER IF NOT EXISTS Colleges_changes_update AFTER UPDATE ON Colleges
+        WHEN old.CollegeCode IS NOT new.CollegeCode OR old.CollegeName IS NOT new.CollegeName BEGIN
+        {_LOG_RENAME.format('Colleges', 'CollegeCode')} {_LOG.format('Colleges', 'U', 'new.CollegeCode')}
+    END''',
+)
+# Bulk counterpart of the Students insert and update triggers, in rowid order.
+CHANGE_LOG_WRITTEN = """INSERT INTO ChangeLog (tbl, op, pk)
+    SELECT 'Students', CASE WHEN rowid > ?1 THEN 'I' ELSE 'U' END, idnum FROM Students
+    WHERE rowid > ?1 OR idnum IN (SELECT value FROM json_each(?2)) ORDER BY rowid"""
+# Bulk counterpart of the Students delete and update triggers, for students a statement returned.
+CHANGE_LOG_IDNUMS = "INSERT INTO ChangeLog (tbl, op, pk) SELECT 'Students', ?, value FROM json_each(?)"
+# Only the newest entry per key matters to a consumer, since exports read the current row.
+CHANGE_LOG_COMPACT = "DELETE FROM ChangeLog WHERE seq NOT IN (SELECT MAX(seq) FROM ChangeLog GROUP BY tbl, pk)"
+
+def create_change_log(conn):
+    """Version 6: the change log, its triggers and the consumer watermarks. The log starts empty."""
+    conn.execute(TRIGGER_GATES_DDL)
+    for statement in CHANGE_LOG_DDL: conn.execute(statement)
+    for trigger in CHANGE_LOG_TRIGGERS: conn.execute(trigger)
+
+def change_students_bulk(conn, run):
+    """Runs run(conn), statements updating many students that return the idnums
+    they changed, and logs those in one INSERT; returns them.
+
+    As in write_students_bulk, the change log's update trigger sits out the
+    statements behind its closed gate. run must change only what it returns,
+    foreign key cascades included, and no idnum.
+    """
+    if not change_log_available(conn): return run(conn)
+    if not conn.in_transaction: conn.execute("BEGIN IMMEDIATE")
+    close_trigger_gates(conn, ["Students_changes_update"])
+    idnums = run(conn)
+    conn.execute(CHANGE_LOG_IDNUMS, ("U", json.dumps(idnums)))
+    open_trigger_gates(conn, ["Students_changes_update"])
+    return idnums
+
+def change_log_available(conn):
+    return table_exists(conn, "ChangeLog")
+
+def change_log_head(conn):
+    """The newest seq ever logged (0 for none), compacted away or not."""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'ChangeLog'").fetchone()
+    return row[0] if row else 0
+
+def change_consumers(conn):
+    """[(consumer, watermark)] by name."""
+    return [tuple(row) for row in conn.execute("SELECT name, seq FROM ChangeConsumers ORDER BY name")]
+
+def compact_change_log(conn, prune_consumed=False):
+    """Collapses the log to the newest entry per student or college; returns the entries removed.
+
+    With prune_consumed, entries every registered consumer has taken are removed
+    too (none if there are no consumers).
+    """
+    removed = conn.execute(CHANGE_LOG_COMPACT).rowcount
+    if prune_consumed:
+        removed += conn.execute("DELETE FROM ChangeLog WHERE seq <= (SELECT MIN(seq) FROM ChangeConsumers)").rowcount
+    conn.commit()
+    return removed
+
+
+# --- Schema migrations ---
+# Each migration brings the schema up one version and PRAGMA user_version records
+# the last one applied, so opening a current database runs no DDL at all.
+# Migrations must cope with databases that predate user_version (version 0).
+
+def _create_base_schema(conn):
+    """Version 1: colleges, programs, students, their indexes and the search index."""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Colleges (
+            CollegeCode TEXT PRIMARY KEY,
+            CollegeName TEXT NOT NULL UNIQUE
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Programs (
+            ProgramCode TEXT PRIMARY KEY,
+            ProgramName TEXT NOT NULL,
+            CollegeCode TEXT NOT NULL,
+            UNIQUE (CollegeCode, ProgramName),
+            FOREIGN KEY (CollegeCode) REFERENCES Colleges(CollegeCode) ON DELETE CASCADE ON UPDATE CASCADE
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_programs_name ON Programs(ProgramName COLLATE NOCASE)")
+    cursor.execute(STUDENTS_DDL.format(name="Students"))
+    conn.commit()
+    migrate_program_lists(conn)
+    for index in STUDENT_INDEXES: cursor.execute(index)
+    create_student_fts(cursor)
+
+def _add_graduated_flag(conn):
+    """Version 3: Students.graduated, set when a final-year student is promoted (see bulk.promote_students).
+
+    Version 7 recreates the search index update trigger, which then fires only for the columns it indexes.
+    """
+    if "graduated" not in {row[1] for row in conn.execute("PRAGMA table_info(Students)")}:
+        conn.execute("ALTER TABLE Students ADD COLUMN graduated INTEGER NOT NULL DEFAULT 0")
+
+# Optimistic concurrency: every update of a student bumps its version, so a station
+# saving an edit can tell (UPDATE ... WHERE version = ?) whether someone else saved
+# first. The app's own UPDATEs bump it themselves; the trigger catches the rest,
+# such as the foreign key cascades.
+STUDENT_VERSION_TRIGGER = '''CREATE TRIGGER IF NOT EXISTS Students_version AFTER UPDATE ON Students
+    WHEN new.version IS old.version BEGIN
+        UPDATE Students SET version = old.version + 1 WHERE rowid = new.rowid;
+    END'''
+
+def _add_row_versions(conn):
+    """Version 4: Students.version and the trigger that bumps it."""
+    if "version" not in {row[1] for row in conn.execute("PRAGMA table_info(Students)")}:
+        conn.execute("ALTER TABLE Students ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    conn.execute(STUDENT_VERSION_TRIGGER)
+
+def _gate_triggers(conn):
+    """Version 7: the Students triggers the bulk writers stand in for, recreated with their gates (see TriggerGates)."""
+    conn.execute(TRIGGER_GATES_DDL)
+    for available, triggers in ((student_fts_available(conn), STUDENT_FTS_TRIGGERS),
+                                (table_exists(conn, "EnrollmentStats"), ENROLLMENT_STATS_TRIGGERS),
+                                (name_trigrams_available(conn), NAME_TRIGRAM_TRIGGERS),
+                                (change_log_available(conn), CHANGE_LOG_TRIGGERS)):
+        if not available: continue
+        for name in WRITE_BULK_GATES + DELETE_BULK_GATES:
+            if any(f" {name} " in trigger for trigger in triggers): conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        for trigger in triggers: conn.execute(trigger)
+
+MIGRATIONS = (_create_base_schema, create_enrollment_stats, _add_graduated_flag, _add_row_versions, create_name_trigrams,
+              create_change_log, _gate_triggers)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def initialize_database(conn=None):
+    """Applies any migrations the database is missing; returns the versions applied."""
+    conn = conn or get_db_connection()
+    applied = []
+    try:
+        for version in range(schema_version(conn) + 1, SCHEMA_VERSION + 1):
+            MIGRATIONS[version - 1](conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+            applied.append(version)
+    finally: release_db_connection(conn)
+    return applied
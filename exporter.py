@@ -0,0 +1,237 @@
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import time
+
+from db import change_log_head
+from search import STUDENT_COLUMNS, build_student_query, build_student_count_query
+
+
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+DEFAULT_CHUNK_SIZE = 5000
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class ExportResult:
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.cancelled = False
+        self.elapsed = 0.0
+
+    def summary(self):
+        if self.cancelled: return f"Export cancelled after {self.rows:,} row(s); nothing was written."
+        text = f"{self.rows:,} student(s) exported to {self.path}"
+        if self.elapsed: text += f" in {self.elapsed:.1f} s ({self.rows / self.elapsed:,.0f} rows/s)"
+        return text
+
+
+def export_format(path):
+    name = (path[:-3] if path.endswith(".gz") else path).lower()
+    if name.endswith((".jsonl", ".ndjson")): return "jsonl"
+    if name.endswith(".parquet"): return "parquet"
+    return "csv"
+
+def _open_text(path, compress):
+    if compress: return io.TextIOWrapper(gzip.open(path, "wb", compresslevel=6), encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="", buffering=WRITE_BUFFER_SIZE)
+
+
+class _CsvWriter:
+    def __init__(self, path, compress):
+        self._file = _open_text(path, compress)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(STUDENT_COLUMNS)
+
+    def write(self, rows): self._writer.writerows(rows)
+    def close(self): self._file.close()
+
+
+class _JsonlWriter:
+    def __init__(self, path, compress):
+        self._file = _open_text(path, compress)
+
+    def write(self, rows):
+        self._file.write("".join(json.dumps(dict(zip(STUDENT_COLUMNS, row))) + "\n" for row in rows))
+
+    def close(self): self._file.close()
+
+
+class _ParquetWriter:
+    """Writes each chunk as its own row group, so only one chunk is ever held in memory."""
+
+    def __init__(self, path, compress):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs the pyarrow package (pip install pyarrow).") from None
+        self._pa = pa
+        fields = [(column, pa.int64() if column == "yrlvl" else pa.string()) for column in STUDENT_COLUMNS]
+        self._schema = pa.schema(fields)
+        self._writer = pq.ParquetWriter(path, self._schema, compression="gzip" if compress else "snappy")
+
+    def write(self, rows):
+        columns = [list(values) for values in zip(*rows)] if rows else [[] for _ in STUDENT_COLUMNS]
+        self._writer.write_table(self._pa.Table.from_arrays(columns, schema=self._schema))
+
+    def close(self): self._writer.close()
+
+
+WRITERS = {"csv": _CsvWriter, "jsonl": _JsonlWriter, "parquet": _ParquetWriter}
+
+
+def export_students(conn, path, fmt=None, search_query=None, sort_col_name=None, use_fts=False,
+                    chunk_size=DEFAULT_CHUNK_SIZE, progress=None, cancelled=None):
+    """Writes the student list, or a filtered/sorted view of it, to a file and returns an ExportResult.
+
+    The query is the grid's (see build_student_query), read with fetchmany so
+    memory stays flat however many students there are. A path ending in .gz is
+    gzip-compressed (for Parquet, the column chunks are). The file is written
+    next to path and renamed into place when complete, so a cancelled or failed
+    export leaves nothing behind. progress(result, fraction) is called after
+    each chunk; cancelled() is checked between chunks.
+    """
+    fmt = fmt or export_format(path)
+    if fmt not in WRITERS: raise ValueError(f"format must be one of {EXPORT_FORMATS}")
+    result = ExportResult(path)
+    start = time.perf_counter()
+    total = conn.execute(*build_student_count_query(search_query, use_fts)).fetchone()[0] if progress else 0
+    part_path = path + ".part"
+    writer = WRITERS[fmt](part_path, path.endswith(".gz"))
+    try:
+        cursor = conn.execute(*build_student_query(search_query, sort_col_name, use_fts))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows: break
+            writer.write([tuple(row) for row in rows])
+            result.rows += len(rows)
+            if progress: progress(result, min(result.rows / total, 1.0) if total else 1.0)
+            if cancelled and cancelled(): raise ExportCancelled()
+        cursor.close()
+        writer.close()
+        os.replace(part_path, path)
+    except BaseException as e:
+        writer.close()
+        os.remove(part_path)
+        if not isinstance(e, ExportCancelled): raise
+        result.cancelled = True
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+# --- Change export ---
+# A consumer's delta has one line per student or college changed since its
+# watermark, in the order of their last change:
+#   {"seq": ..., "table": "students", "op": "upsert", "key": "2023-0001", "row": {...}}
+# with "op": "delete" and "row": null for one that no longer exists. Rows are read
+# as they are now, so however often a student was edited, it is sent once. The
+# lines are built by SQLite's json_object, and everything, with the watermark it
+# ends at, is read in one transaction.
+CHANGE_STUDENT_COLUMNS = STUDENT_COLUMNS + ("graduated",)
+_STUDENT_ROW = "json_object(" + ", ".join(f"'{column}', s.{column}" for column in CHANGE_STUDENT_COLUMNS) + ")"
+_COLLEGE_ROW = "json_object('CollegeCode', c.CollegeCode, 'CollegeName', c.CollegeName)"
+_CHANGED = "SELECT tbl, pk, MAX(seq) AS seq FROM ChangeLog WHERE seq > ?1 AND seq <= ?2 GROUP BY tbl, pk"
+
+
+def _change_line(table, key, row, seq="seq"):
+    return f"json_object('seq', {seq}, 'table', '{table}', 'op', IIF({key} IS NULL, 'delete', 'upsert'), 'key', pk, 'row', IIF({key} IS NULL, NULL, {row}))"
+
+
+CHANGES_SQL = f"""WITH changed AS MATERIALIZED ({_CHANGED})
+    SELECT seq, {_change_line('colleges', 'c.CollegeCode', _COLLEGE_ROW)} FROM changed LEFT JOIN Colleges c ON c.CollegeCode = pk WHERE tbl = 'Colleges'
+    UNION ALL SELECT seq, {_change_line('students', 's.idnum', _STUDENT_ROW)} FROM changed LEFT JOIN Students s ON s.idnum = pk WHERE tbl = 'Students'
+    ORDER BY 1"""
+CHANGES_COUNT_SQL = f"SELECT COUNT(*) FROM ({_CHANGED})"
+# A first export, or one asked for in full: every college, then every student, as upserts at the watermark.
+FULL_CHANGES_SQL = (
+    f"SELECT ?2 AS seq, {_change_line('colleges', '1', _COLLEGE_ROW, '?2')} FROM (SELECT *, CollegeCode AS pk FROM Colleges) c",
+    f"SELECT ?2 AS seq, {_change_line('students', '1', _STUDENT_ROW, '?2')} FROM (SELECT *, idnum AS pk FROM Students) s",
+)
+FULL_CHANGES_COUNT_SQL = "SELECT (SELECT COUNT(*) FROM Colleges) + (SELECT COUNT(*) FROM Students)"
+
+
+class ChangeExportResult:
+    def __init__(self, path, consumer=None):
+        self.path = path
+        self.consumer = consumer
+        self.since = 0
+        self.watermark = 0
+        self.full = False
+        self.upserts = 0
+        self.deletes = 0
+        self.cancelled = False
+        self.elapsed = 0.0
+
+    @property
+    def rows(self):
+        return self.upserts + self.deletes
+
+    def summary(self):
+        if self.cancelled: return f"Export cancelled after {self.rows:,} change(s); nothing was written and no watermark moved."
+        text = (f"Full export of {self.upserts:,} row(s)" if self.full else
+                f"{self.upserts:,} upsert(s) and {self.deletes:,} delete(s) since change {self.since:,}")
+        text += f" to {self.path}, up to change {self.watermark:,}"
+        if self.consumer: text += f"; watermark of '{self.consumer}' stored"
+        if self.elapsed: text += f" in {self.elapsed:.2f} s ({self.rows / self.elapsed:,.0f} rows/s)"
+        return text
+
+
+def export_changes(conn, path, consumer=None, since=None, full=False, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, cancelled=None):
+    """Writes the students and colleges changed since a watermark as JSONL (.gz to compress) and returns a ChangeExportResult.
+
+    The watermark is since or, failing that, consumer's stored one. A consumer
+    seen for the first time, a watermark ahead of the log (a database restored
+    from an older copy) or full=True gets every college and student instead.
+    Once the file is in place, consumer's watermark moves to the last change it
+    covers, so an export that fails is taken again in full next time. path '-'
+    writes to stdout. progress(result, fraction) and cancelled() as for
+    export_students.
+    """
+    result, start = ChangeExportResult(path, consumer), time.perf_counter()
+    conn.execute("BEGIN")  # one snapshot for the changes and the watermark
+    try:
+        result.watermark = change_log_head(conn)
+        if since is None and consumer is not None:
+            row = conn.execute("SELECT seq FROM ChangeConsumers WHERE name = ?", (consumer,)).fetchone()
+            since = row[0] if row else None
+        result.full = full or since is None or since > result.watermark
+        result.since = 0 if result.full else since
+        params = (result.since, result.watermark)
+        queries = FULL_CHANGES_SQL if result.full else (CHANGES_SQL,)
+        total = conn.execute(FULL_CHANGES_COUNT_SQL if result.full else CHANGES_COUNT_SQL, () if result.full else params).fetchone()[0] if progress else 0
+        part_path = path + ".part"
+        out = sys.stdout if path == "-" else _open_text(part_path, path.endswith(".gz"))
+        try:
+            for query in queries:
+                cursor = conn.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows: break
+                    out.write("".join(line + "\n" for _, line in rows))
+                    deletes = sum(line.endswith('"row":null}') for _, line in rows)
+                    result.deletes += deletes; result.upserts += len(rows) - deletes
+                    if progress: progress(result, min(result.rows / total, 1.0) if total else 1.0)
+                    if cancelled and cancelled(): raise ExportCancelled()
+                cursor.close()
+            if out is not sys.stdout: out.close(); os.replace(part_path, path)
+        except BaseException:
+            if out is not sys.stdout: out.close(); os.remove(part_path)
+            raise
+    except ExportCancelled:
+        result.cancelled = True
+    finally:
+        conn.commit()  # ends the read
+    if consumer is not None and not result.cancelled:
+        conn.execute("INSERT INTO ChangeConsumers (name, seq) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET seq = excluded.seq",
+                     (consumer, result.watermark))
+        conn.commit()
+    result.elapsed = time.perf_counter() - start
+    return result
@@ -0,0 +1,269 @@
+"""Typo-tolerant name search and likely-duplicate detection over the name trigram index (see db.py).
+
+Names are compared by their keys: lower-cased, spaces, hyphens and periods
+dropped, so "Dela Cruz", "Delacruz" and "dela-cruz" are the same name. A search
+looks up the distinct names sharing the most trigrams with the text, ranks them
+by edit distance and returns their students, best match first; the whole
+search is one statement, so the grid runs it on its search worker.
+"""
+import functools
+import json
+import time
+
+from search import SELECT_COLUMNS
+
+
+FUZZY_PREFIX = "~"          # search box text starting with it is a fuzzy name search
+FUZZY_LIMIT = 100           # students returned
+FUZZY_CANDIDATE_NAMES = 200  # names sharing the most trigrams, ranked by edit distance
+FUZZY_MATCHED_NAMES = 30     # of those, the closest kept
+FUZZY_MIN_SIMILARITY = 0.6
+DUPLICATE_MIN_SIMILARITY = 0.8
+DUPLICATE_MAX_GROUP = 10    # a name shared by more students than this is common, not a double registration
+DUPLICATE_REPORT_LIMIT = 500
+DUPLICATE_COMMON_GRAM_NAMES = 500  # a trigram in more names than this is too common to pair names by
+_KEY_TABLE = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz", " -.")  # as NAME_KEY_SQL
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def name_key(name):
+    return name.translate(_KEY_TABLE)
+
+
+def name_trigrams(key):
+    padded = f"${key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b):
+    """Levenshtein distance: insertions, deletions and substitutions."""
+    if len(a) < len(b): a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def name_similarity(a, b):
+    """1 minus the edit distance between the names' keys over the longer key: 1.0 is the same name, 0.0 nothing alike.
+
+    Registered on every connection as the SQL function name_similarity.
+    """
+    if a is None or b is None: return 0.0
+    a, b = name_key(a), name_key(b)
+    if not (a or b): return 1.0
+    return 1.0 - edit_distance(a, b) / max(len(a), len(b))
+
+
+def is_fuzzy(text):
+    return bool(text) and text.lstrip().startswith(FUZZY_PREFIX)
+
+
+def fuzzy_text(text):
+    return text.lstrip()[len(FUZZY_PREFIX):].strip() if is_fuzzy(text) else text
+
+
+# A student scores the better of: either name against the whole text ("dela crus"
+# against Dela Cruz), or the mean of the best word match of each name ("maria
+# santos" against Maria Santos). The score depends only on which of the matched
+# names a student has, so students are read in groups, one per first and last
+# name pair (or a single matched name), each through an index and cut at the
+# limit: however many students share a name, at most limit of them are read.
+# Ties are broken by last name, first name, then rowid, as the indexes order them.
+FUZZY_SQL = f"""WITH candidates AS MATERIALIZED (
+        SELECT name FROM NameTrigrams WHERE gram IN (SELECT value FROM json_each(?1))
+        GROUP BY name ORDER BY COUNT(*) DESC LIMIT ?2),
+    scored AS MATERIALIZED (
+        SELECT lower(c.name) AS name, MAX(name_similarity(?3, c.name)) AS whole, MAX(name_similarity(w.value, c.name)) AS word
+        FROM candidates c, json_each(?4) w GROUP BY 1 HAVING MAX(whole, word) >= ?5 ORDER BY MAX(whole, word) DESC LIMIT ?7),
+    groups AS (
+        SELECT MAX(f.whole, l.whole, (f.word + l.word) / 2.0) AS score,
+            (SELECT json_group_array(rowid) FROM (SELECT rowid FROM Students
+                WHERE lname COLLATE NOCASE = l.name AND fname COLLATE NOCASE = f.name LIMIT ?6)) AS ids
+        FROM scored f, scored l
+        UNION ALL SELECT MAX(l.whole, l.word / 2.0), (SELECT json_group_array(rowid) FROM (SELECT rowid FROM Students
+                WHERE lname COLLATE NOCASE = l.name AND (fname IS NULL OR fname COLLATE NOCASE NOT IN (SELECT name FROM scored)) LIMIT ?6))
+        FROM scored l
+        UNION ALL SELECT MAX(f.whole, f.word / 2.0), (SELECT json_group_array(rowid) FROM (SELECT rowid FROM Students
+                WHERE fname COLLATE NOCASE = f.name AND (lname IS NULL OR lname COLLATE NOCASE NOT IN (SELECT name FROM scored)) LIMIT ?6))
+        FROM scored f)
+    SELECT {SELECT_COLUMNS}, g.score FROM groups g, json_each(g.ids) j JOIN Students s ON s.rowid = j.value
+    ORDER BY g.score DESC, s.lname COLLATE NOCASE, s.fname COLLATE NOCASE, s.rowid LIMIT ?6"""
+
+
+def build_fuzzy_query(text, limit=FUZZY_LIMIT, min_similarity=FUZZY_MIN_SIMILARITY):
+    """Returns (sql, params) for the students whose names best match text, with their score as a last column."""
+    words = [key for key in map(name_key, fuzzy_text(text).split()) if key]
+    whole = "".join(words)
+    words += [a + b for a, b in zip(words, words[1:])]  # "dela cruz angelo": Dela Cruz is two words
+    grams = name_trigrams(whole).union(*map(name_trigrams, words)) if words else set()
+    return FUZZY_SQL, [json.dumps(sorted(grams)), FUZZY_CANDIDATE_NAMES, whole, json.dumps(words), min_similarity, limit, FUZZY_MATCHED_NAMES]
+
+
+class FuzzyView:
+    """The closest name matches for search box text starting with ~, shown in the grid in one page.
+
+    Like a ranked search, it can't be patched: a write re-runs it.
+    """
+
+    patchable = False
+    search_query = None
+    sort_col_name = None
+    descending = False
+    use_fts = False
+    exhausted = True
+
+    def __init__(self, text, limit=FUZZY_LIMIT):
+        self.text = fuzzy_text(text)
+        self.page_size = limit
+        self.ids = []
+        self.scores = []
+        self.total = None
+        self.loading = False
+
+    @property
+    def loaded(self):
+        return len(self.ids)
+
+    def first_page_query(self, limit=None):
+        return build_fuzzy_query(self.text, self.page_size)
+
+    def wants_more(self):
+        return False
+
+    def accept_page(self, rows):
+        self.loading = False
+        self.ids = [row[0] for row in rows]
+        self.scores = [row[-1] for row in rows]
+        self.total = len(rows)
+        return [tuple(row[:-1]) for row in rows]
+
+    def status_text(self):
+        if not self.total: return f"No names like '{self.text}'"
+        return f"{self.total:,} closest name match(es) for '{self.text}' (best {self.scores[0]:.0%})"
+
+
+# --- Duplicate registrations ---
+# Similar names are paired through shared trigrams, so only names in the same
+# trigram postings are ever compared; pairs close enough are merged into one
+# spelling, and students are then grouped by (first name, last name, sex) in one
+# GROUP BY. No two students are compared directly.
+#
+# Names within k edits of each other differ in length by at most k, and as an
+# edit changes at most 3 trigrams, share at least max(grams) - 3k of them, where
+# similarity >= t allows k = floor((1 - t) * max(length)). Both are checked in
+# SQL, so only pairs that pass reach name_similarity. Trigrams in more than
+# DUPLICATE_COMMON_GRAM_NAMES names ("$ma", "an$") aren't joined on; the count
+# a pair needs drops by the common trigrams it could share, so a pair is missed
+# only if it shares nothing rarer.
+DUPLICATE_GRAMS_DDL = (
+    "CREATE TEMP TABLE IF NOT EXISTS DuplicateGrams (gram TEXT NOT NULL, name TEXT NOT NULL, length INTEGER NOT NULL,"
+    " grams INTEGER NOT NULL, common INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS temp.idx_duplicate_grams ON DuplicateGrams (gram, length)",
+)
+# length is the key's (as db.NAME_KEY_SQL, which lower() doesn't lengthen), grams and common count the name's trigrams.
+DUPLICATE_GRAMS_SQL = """INSERT INTO temp.DuplicateGrams (gram, name, length, grams, common)
+    WITH postings AS MATERIALIZED (SELECT gram, COUNT(*) AS names FROM NameTrigrams GROUP BY gram),
+        names AS MATERIALIZED (SELECT t.name, COUNT(*) AS grams, SUM(p.names > ?1) AS common
+            FROM NameTrigrams t JOIN postings p USING (gram) GROUP BY t.name)
+    SELECT t.gram, t.name, length(replace(replace(replace(t.name, ' ', ''), '-', ''), '.', '')), n.grams, n.common
+    FROM NameTrigrams t JOIN postings p USING (gram) JOIN names n USING (name) WHERE p.names <= ?1"""
+_EDITS = "CAST((1 - ?1) * MAX(a.length, b.length) + 1e-9 AS INTEGER)"  # k; the epsilon keeps 0.2 * 5 at 1
+# The candidates are materialized: a deterministic function in HAVING would be
+# moved into WHERE by SQLite and run on every joined row, before the count.
+SIMILAR_NAME_PAIRS_SQL = f"""WITH candidates AS MATERIALIZED (
+        SELECT a.name AS a, b.name AS b FROM temp.DuplicateGrams a JOIN temp.DuplicateGrams b
+            ON b.gram = a.gram AND b.length BETWEEN a.length * ?1 - 1e-9 AND a.length / ?1 + 1e-9 AND b.name > a.name
+        GROUP BY a.name, b.name HAVING COUNT(*) >= MAX(a.grams, b.grams) - 3 * {_EDITS} - MIN(a.common, b.common))
+    SELECT a, b FROM candidates WHERE name_similarity(a, b) >= ?1"""
+DUPLICATE_NAMES_DDL = "CREATE TEMP TABLE IF NOT EXISTS DuplicateNames (name TEXT PRIMARY KEY, spelling TEXT NOT NULL)"
+DUPLICATE_GROUPS_SQL = """SELECT COUNT(*), json_group_array(s.idnum) FROM Students s
+    LEFT JOIN temp.DuplicateNames f ON f.name = s.fname LEFT JOIN temp.DuplicateNames l ON l.name = s.lname
+    WHERE s.fname IS NOT NULL AND s.lname IS NOT NULL
+    GROUP BY IFNULL(f.spelling, s.fname), IFNULL(l.spelling, s.lname), s.sex HAVING COUNT(*) > 1"""
+DUPLICATE_MEMBERS_SQL = ("SELECT idnum, fname, lname, sex, pcode, yrlvl, ccode FROM Students"
+                         " WHERE idnum IN (SELECT value FROM json_each(?)) ORDER BY idnum")
+
+
+class DuplicateReport:
+    def __init__(self):
+        self.names = 0
+        self.similar_pairs = 0
+        self.groups = []  # [[(idnum, fname, lname, sex, pcode, yrlvl, ccode), ...]], differing spellings first
+        self.group_count = 0
+        self.common_skipped = 0  # groups over DUPLICATE_MAX_GROUP
+        self.cancelled = False
+        self.elapsed = 0.0
+
+    def summary(self):
+        if self.cancelled: return "Duplicate search cancelled."
+        text = (f"{self.group_count:,} group(s) of possibly double-registered students"
+                f" ({self.names:,} distinct names, {self.similar_pairs:,} similar pairs)")
+        if self.common_skipped: text += f"; {self.common_skipped:,} common name(s) shared by over {DUPLICATE_MAX_GROUP} students skipped"
+        if self.group_count > len(self.groups): text += f"; first {len(self.groups):,} listed"
+        return text + (f" in {self.elapsed:.2f} s" if self.elapsed else "")
+
+
+def _spellings(pairs):
+    """Union-find over similar name pairs: each name mapped to one spelling of its cluster."""
+    parent = {}
+
+    def root(name):
+        while parent.setdefault(name, name) != name:
+            parent[name] = parent[parent[name]]; name = parent[name]
+        return name
+
+    for a, b in pairs:
+        ra, rb = root(a), root(b)
+        if ra != rb: parent[max(ra, rb)] = min(ra, rb)
+    return {name: root(name) for name in parent}
+
+
+def find_duplicates(conn, min_similarity=DUPLICATE_MIN_SIMILARITY, max_group=DUPLICATE_MAX_GROUP, limit=DUPLICATE_REPORT_LIMIT,
+                    progress=None, cancelled=None):
+    """Groups students who may be registered twice: same sex, and first and last names alike; returns a DuplicateReport.
+
+    Groups whose members spell their names differently come first, as typos
+    are the usual sign of a double registration. progress(report, fraction) is
+    called between the steps, and cancelled() checked.
+    """
+    report, start = DuplicateReport(), time.perf_counter()
+
+    def step(fraction):
+        if progress: progress(report, fraction)
+        if cancelled and cancelled(): report.cancelled = True; return False
+        return True
+
+    report.names = conn.execute("SELECT COUNT(*) FROM StudentNames").fetchone()[0]
+    for statement in DUPLICATE_GRAMS_DDL: conn.execute(statement)
+    conn.execute("DELETE FROM temp.DuplicateGrams")
+    conn.execute(DUPLICATE_GRAMS_SQL, (DUPLICATE_COMMON_GRAM_NAMES,))
+    if not step(0.1): return report
+    pairs = conn.execute(SIMILAR_NAME_PAIRS_SQL, (min_similarity,)).fetchall()
+    conn.execute("DELETE FROM temp.DuplicateGrams")
+    report.similar_pairs = len(pairs)
+    if not step(0.3): return report
+    conn.execute(DUPLICATE_NAMES_DDL)
+    conn.execute("DELETE FROM temp.DuplicateNames")
+    conn.executemany("INSERT INTO temp.DuplicateNames (name, spelling) VALUES (?, ?)", _spellings(pairs).items())
+    candidates = []
+    for count, idnums in conn.execute(DUPLICATE_GROUPS_SQL).fetchall():
+        if count > max_group: report.common_skipped += 1
+        else: candidates.append(json.loads(idnums))
+    conn.execute("DELETE FROM temp.DuplicateNames")
+    conn.commit()
+    report.group_count = len(candidates)
+    if not step(0.8): return report
+    groups = []
+    for idnums in candidates:
+        members = [tuple(row) for row in conn.execute(DUPLICATE_MEMBERS_SQL, (json.dumps(idnums),)).fetchall()]
+        groups.append((len({(fname, lname) for _, fname, lname, *_ in members}) == 1, len(members), members))
+    groups.sort(key=lambda group: group[:2])
+    report.groups = [members for _, _, members in groups[:limit]]
+    report.elapsed = time.perf_counter() - start
+    if progress: progress(report, 1.0)
+    return report
@@ -0,0 +1,198 @@
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import sqlite3 as sql
+import time
+
+from db import write_students_bulk, is_busy_error, retry_backoff, WRITE_RETRIES
+from search import STUDENT_COLUMNS, DB_COLUMN_MAP
+
+
+IDNUM_RE = re.compile(r'^\d{4}-\d{4}$')
+SEXES = {"F", "M"}
+YEAR_LEVELS = range(1, 6)
+DEFAULT_BATCH_SIZE = 20000
+IMPORT_MODES = ("skip", "upsert")
+
+# Header names accepted in import files: the column names or the grid's headings.
+HEADER_ALIASES = {**{column: column for column in STUDENT_COLUMNS},
+                  **{heading.lower(): column for heading, column in DB_COLUMN_MAP.items()}}
+
+INSERT_SQL = "INSERT INTO Students (idnum, fname, lname, sex, pcode, yrlvl, cname, ccode) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+UPSERT_SQL = INSERT_SQL + (" ON CONFLICT(idnum) DO UPDATE SET fname = excluded.fname, lname = excluded.lname,"
+                           " sex = excluded.sex, pcode = excluded.pcode, yrlvl = excluded.yrlvl,"
+                           " cname = excluded.cname, ccode = excluded.ccode, version = Students.version + 1")
+EXISTING_ROWS_SQL = ("SELECT idnum, fname, lname, sex, pcode, yrlvl, cname, ccode FROM Students"
+                     " WHERE idnum IN (SELECT value FROM json_each(?))")
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+class ImportResult:
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0  # upsert rows identical to the stored student; not rewritten
+        self.skipped = 0   # already in the database (skip mode)
+        self.rejected = 0  # failed validation
+        self.cancelled = False
+        self.elapsed = 0.0
+
+    def summary(self):
+        text = f"{self.read:,} row(s) read: {self.inserted:,} inserted, {self.updated:,} updated, "
+        if self.unchanged: text += f"{self.unchanged:,} unchanged, "
+        text += f"{self.skipped:,} skipped as existing, {self.rejected:,} rejected"
+        if self.elapsed: text += f" in {self.elapsed:.1f} s ({self.read / self.elapsed:,.0f} rows/s)"
+        return text + (" (cancelled)" if self.cancelled else "")
+
+
+def _open_text(path):
+    """Returns (text stream, raw file); the raw file's position drives progress."""
+    raw = open(path, "rb")
+    stream = gzip.GzipFile(fileobj=raw) if path.endswith(".gz") else raw
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""), raw
+
+def file_format(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    return "jsonl" if name.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+def read_records(path, position=None):
+    """Yields (line number, record dict) from a CSV or JSONL file, one at a time.
+
+    Keys are normalized to Students column names; unknown keys are dropped.
+    position, if given, is a one-item list kept at the raw file offset read so far.
+    """
+    text, raw = _open_text(path)
+    with text:
+        if file_format(path) == "jsonl":
+            for line_no, line in enumerate(text, 1):
+                if position is not None: position[0] = raw.tell()
+                if not line.strip(): continue
+                try: obj = json.loads(line)
+                except ValueError: yield line_no, {"_error": "not valid JSON"}; continue
+                if not isinstance(obj, dict): yield line_no, {"_error": "not a JSON object"}; continue
+                yield line_no, {HEADER_ALIASES[k.strip().lower()]: v for k, v in obj.items()
+                                if isinstance(k, str) and k.strip().lower() in HEADER_ALIASES}
+        else:
+            reader = csv.reader(text)
+            header = next(reader, None)
+            if header is None: return
+            columns = [HEADER_ALIASES.get(h.strip().lower()) for h in header]
+            for values in reader:
+                if position is not None: position[0] = raw.tell()
+                if not any(values): continue
+                yield reader.line_num, {column: value for column, value in zip(columns, values) if column}
+
+
+def load_catalog(conn):
+    """Returns (college names by code, college codes by name, {college code: {program name or code: code}})."""
+    names_by_code, codes_by_name, programs = {}, {}, {}
+    for name, code in conn.execute("SELECT CollegeName, CollegeCode FROM Colleges"):
+        names_by_code[code] = name; codes_by_name[name.lower()] = code
+    for ccode, pname, pcode in conn.execute("SELECT CollegeCode, ProgramName, ProgramCode FROM Programs"):
+        by_key = programs.setdefault(ccode, {})
+        by_key[pcode.upper()] = pcode; by_key[pname.upper()] = pcode
+    return names_by_code, codes_by_name, programs
+
+def validate_record(record, catalog):
+    """Returns (row, None) with the Students row for a record, or (None, reason)."""
+    if "_error" in record: return None, record["_error"]
+    names_by_code, codes_by_name, programs = catalog
+    idnum, fname, lname, sex, pcode, yrlvl, cname, ccode = (
+        "" if record.get(column) is None else str(record[column]).strip() for column in STUDENT_COLUMNS)
+    if not IDNUM_RE.match(idnum): return None, f"bad idnum {idnum!r} (expected YYYY-NNNN)"
+    if not fname or not lname: return None, "first and last name are required"
+    sex = sex.upper()
+    if sex not in SEXES: return None, f"bad sex {sex!r}"
+    try: year = int(yrlvl)
+    except ValueError: return None, f"bad year level {yrlvl!r}"
+    if year not in YEAR_LEVELS: return None, f"year level {year} out of range"
+    college_code = ccode.upper() or codes_by_name.get(cname.lower(), "")
+    if college_code not in names_by_code: return None, f"unknown college {ccode or cname!r}"
+    program_code = programs.get(college_code, {}).get(pcode.upper())
+    if not program_code: return None, f"program {pcode!r} is not offered by {college_code}"
+    return (idnum, fname, lname, sex, program_code, year, names_by_code[college_code], college_code), None
+
+
+def import_students(conn, path, mode="skip", batch_size=DEFAULT_BATCH_SIZE, reject_path=None,
+                    progress=None, cancelled=None):
+    """Streams students from a CSV/JSONL file into the database and returns an ImportResult.
+
+    Rows are validated against the colleges and programs in the database, then
+    written with executemany, one transaction per batch. An idnum already in the
+    database is skipped (mode "skip") or overwritten (mode "upsert"), unless it
+    is unchanged. Rejected and skipped rows go to reject_path as CSV with the
+    reason. A batch that finds the database locked by another station is
+    retried, WRITE_RETRIES times, with backoff. progress(result, fraction) is
+    called after each batch; cancelled() is checked between batches and stops
+    the import, keeping the batches already committed.
+    """
+    if mode not in IMPORT_MODES: raise ValueError(f"mode must be one of {IMPORT_MODES}")
+    result = ImportResult()
+    start = time.perf_counter()
+    catalog = load_catalog(conn)
+    size = os.path.getsize(path) or 1
+    position = [0]
+    seen = set()
+    statement = UPSERT_SQL if mode == "upsert" else INSERT_SQL
+    report = open(reject_path, "w", newline="", encoding="utf-8") if reject_path else None
+    report_writer = csv.writer(report) if report else None
+    if report_writer: report_writer.writerow(["line", "reason"] + list(STUDENT_COLUMNS))
+
+    def reject(line_no, record, reason):
+        if report_writer: report_writer.writerow([line_no, reason] + [record.get(c, "") for c in STUDENT_COLUMNS])
+
+    def write(rows):
+        """One transaction for a batch; returns (stored rows of the IDs already in use, rows written)."""
+        conn.execute("BEGIN IMMEDIATE")  # hold the write lock from the existence check to the commit
+        existing = {r[0]: tuple(r) for r in conn.execute(EXISTING_ROWS_SQL, (json.dumps([row[0] for row in rows]),))}
+        if mode == "skip": rows = [row for row in rows if row[0] not in existing]
+        else: rows = [row for row in rows if existing.get(row[0]) != row]
+        write_students_bulk(conn, statement, rows, [row[0] for row in rows if row[0] in existing] if mode == "upsert" else ())
+        conn.commit()
+        return existing, rows
+
+    def flush(batch):
+        for attempt in range(WRITE_RETRIES + 1):
+            try: existing, rows = write([row for _, _, row in batch]); break
+            except sql.OperationalError as e:
+                conn.rollback()
+                if attempt == WRITE_RETRIES or not is_busy_error(e): raise
+                time.sleep(retry_backoff(attempt))
+            except BaseException:
+                conn.rollback(); raise
+        if mode == "upsert":
+            updated = sum(row[0] in existing for row in rows)
+            result.updated += updated; result.unchanged += len(batch) - len(rows); result.inserted += len(rows) - updated
+        else:
+            for line_no, record, row in batch:
+                if row[0] in existing: reject(line_no, record, "idnum already exists")
+            result.skipped += len(existing); result.inserted += len(rows)
+        if progress: progress(result, min(position[0] / size, 1.0))
+
+    try:
+        batch = []
+        for line_no, record in read_records(path, position):
+            result.read += 1
+            row, reason = validate_record(record, catalog)
+            if row and row[0] in seen: row, reason = None, "idnum repeated in file"
+            if not row:
+                result.rejected += 1; reject(line_no, record, reason); continue
+            seen.add(row[0])
+            batch.append((line_no, record, row))
+            if len(batch) >= batch_size:
+                flush(batch); batch = []
+                if cancelled and cancelled(): raise ImportCancelled()
+        if batch: flush(batch)
+    except ImportCancelled:
+        result.cancelled = True
+    finally:
+        if report: report.close()
+        result.elapsed = time.perf_counter() - start
+    return result
@@ -0,0 +1,252 @@
+"""Timing for SQL statements and UI actions: latency histograms and a slow-query log.
+
+Connections opened with metrics (see db.open_tuned_connection) are
+InstrumentedConnections: each statement is timed from execute() through its
+fetch calls and recorded under its SQL text, and a trace callback counts every
+statement SQLite runs, including those inside triggers, so an action can
+report how many it took. Rows read by iterating a cursor directly aren't
+timed; the hot paths fetch with fetchall/fetchmany.
+
+With SSIS_METRICS_FILE set, the collected metrics are written there as JSON
+when the process exits.
+"""
+import atexit
+import contextlib
+import functools
+import json
+import os
+import re
+import sqlite3 as sql
+import threading
+import time
+from collections import deque
+
+
+METRICS_FILE_ENV = "SSIS_METRICS_FILE"
+SLOW_QUERY_ENV = "SSIS_SLOW_QUERY_MS"
+SLOW_QUERY_MS = float(os.environ.get(SLOW_QUERY_ENV, 100))
+SLOW_LOG_SIZE = 50
+# Bucket i holds samples up to BUCKET_BASE_MS * 2**i; the last one is unbounded.
+BUCKET_BASE_MS = 0.0625
+BUCKET_COUNT = 22  # up to ~2 minutes
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=1024)
+def statement_key(statement):
+    """The SQL text a statement is recorded under: whitespace collapsed, long texts cut."""
+    statement = _WHITESPACE_RE.sub(" ", statement).strip()
+    return statement if len(statement) <= 240 else statement[:237] + "..."
+
+
+class Histogram:
+    """Latencies in power-of-two millisecond buckets, with count, total and extremes."""
+
+    def __init__(self):
+        self.buckets = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.extra = 0  # an action's SQLite statements, summed
+
+    def add(self, ms, extra=0):
+        index, bound = 0, BUCKET_BASE_MS
+        while ms > bound and index < BUCKET_COUNT - 1: index += 1; bound *= 2
+        self.buckets[index] += 1
+        self.count += 1; self.total_ms += ms; self.extra += extra
+        if ms > self.max_ms: self.max_ms = ms
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples (the max for the last one)."""
+        if not self.count: return 0.0
+        seen, rank = 0, fraction * self.count
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank: return min(BUCKET_BASE_MS * 2 ** index, self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        return {"count": self.count, "total_ms": round(self.total_ms, 3), "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+                "p50_ms": round(self.percentile(0.5), 3), "p95_ms": round(self.percentile(0.95), 3), "p99_ms": round(self.percentile(0.99), 3),
+                "max_ms": round(self.max_ms, 3), "buckets": self.buckets[:]}
+
+
+class Metrics:
+    """Thread-safe store for statement and action latencies and the slow-query log."""
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.statements = {}
+            self.actions = {}
+            self.slow = deque(maxlen=SLOW_LOG_SIZE)
+            self.started_at = time.time()
+
+    def trace(self, statement):
+        """set_trace_callback hook: counts the statements SQLite runs on this thread."""
+        self._local.traced = getattr(self._local, "traced", 0) + 1
+
+    def traced(self):
+        return getattr(self._local, "traced", 0)
+
+    def record_statement(self, statement, ms, database=None, params=None, plan=None):
+        key = statement_key(statement)
+        with self._lock:
+            histogram = self.statements.get(key)
+            if histogram is None: histogram = self.statements[key] = Histogram()
+            histogram.add(ms)
+            if ms >= self.slow_query_ms:
+                self.slow.append({"sql": key, "ms": round(ms, 3), "at": time.time(), "thread": threading.current_thread().name,
+                                  "plan": plan, "_statement": statement, "_params": params, "_database": database})
+
+    def record_action(self, name, ms, statements=0):
+        with self._lock:
+            histogram = self.actions.get(name)
+            if histogram is None: histogram = self.actions[name] = Histogram()
+            histogram.add(ms, statements)
+
+    @contextlib.contextmanager
+    def action(self, name):
+        """Times the block as one UI action, with the SQLite statements it ran on this thread."""
+        start, traced = time.perf_counter(), self.traced()
+        try: yield
+        finally: self.record_action(name, (time.perf_counter() - start) * 1000, self.traced() - traced)
+
+    def slow_queries(self):
+        """The slow-query log, newest first, with each query's plan.
+
+        Plans are taken on the statement's own connection when it finishes; one
+        that finished as its cursor was garbage collected is explained here, on
+        a fresh connection, instead.
+        """
+        with self._lock: entries = list(self.slow)
+        for entry in entries:
+            if entry["plan"] is None and entry["_database"]:
+                try: conn = sql.connect(entry["_database"])
+                except sql.Error as e: entry["plan"] = f"(no plan: {e})"; continue
+                try: entry["plan"] = explain(conn, entry["_statement"], entry["_params"])
+                finally: conn.close()
+        return [{k: v for k, v in entry.items() if not k.startswith("_")} for entry in reversed(entries)]
+
+    def snapshot(self):
+        with self._lock:
+            statements = {key: h.summary() for key, h in self.statements.items()}
+            actions = {name: {**h.summary(), "statements_per_call": round(h.extra / h.count, 1) if h.count else 0}
+                       for name, h in self.actions.items()}
+        return {"since": self.started_at, "slow_query_ms": self.slow_query_ms, "bucket_base_ms": BUCKET_BASE_MS,
+                "actions": actions, "statements": statements, "slow_queries": self.slow_queries()}
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f: json.dump(self.snapshot(), f, indent=2, default=str)
+
+
+def explain(conn, statement, params):
+    """EXPLAIN QUERY PLAN of a statement as indented text, or why there is none."""
+    if params is None: return "(no plan: statement run with executemany)"
+    if not re.match(r"\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b", statement, re.IGNORECASE): return "(no plan)"
+    try: rows = sql.Cursor(conn).execute("EXPLAIN QUERY PLAN " + statement, params).fetchall()  # not recorded itself
+    except (sql.Error, ValueError) as e: return f"(no plan: {e})"
+    depth = {0: 0}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, 0) + 1
+        lines.append("  " * (depth[node_id] - 1) + detail)
+    return "\n".join(lines)
+
+
+class InstrumentedCursor(sql.Cursor):
+    """Times a statement from execute() until its rows are fetched, the cursor closes or is reused."""
+
+    _statement = None
+
+    def _finish(self, explain_now=True):
+        if self._statement is None: return
+        statement, self._statement = self._statement, None
+        conn, ms = self.connection, self._elapsed * 1000
+        plan = explain(conn, statement, self._params) if explain_now and ms >= conn.metrics.slow_query_ms else None
+        conn.metrics.record_statement(statement, ms, conn.database, self._params, plan)
+
+    def _timed(self, call, *args):
+        start = time.perf_counter()
+        try: return call(*args)
+        finally: self._elapsed += time.perf_counter() - start
+
+    def execute(self, statement, parameters=()):
+        self._finish()
+        self._statement, self._params, self._elapsed = statement, parameters, 0.0
+        try: self._timed(super().execute, statement, parameters)
+        except BaseException: self._finish(); raise
+        if self.description is None: self._finish()  # no rows to fetch
+        return self
+
+    def executemany(self, statement, seq_of_parameters):
+        self._finish()
+        self._statement, self._params, self._elapsed = statement, None, 0.0
+        try: return self._timed(super().executemany, statement, seq_of_parameters)
+        finally: self._finish()
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None: self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if len(rows) < (self.arraysize if size is None else size): self._finish()
+        return rows
+
+    def fetchall(self):
+        try: return self._timed(super().fetchall)
+        finally: self._finish()
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try: self._finish(explain_now=False)
+        except Exception: pass  # e.g. at interpreter shutdown
+
+
+class InstrumentedConnection(sql.Connection):
+    """A connection whose statements are recorded in metrics (set by instrument())."""
+
+    metrics = None
+    database = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute doesn't go through cursor(), so these are routed by hand.
+    def execute(self, statement, parameters=()):
+        return self.cursor().execute(statement, parameters)
+
+    def executemany(self, statement, seq_of_parameters):
+        return self.cursor().executemany(statement, seq_of_parameters)
+
+
+def instrument(conn, metrics, database):
+    conn.metrics, conn.database = metrics, database
+    conn.set_trace_callback(metrics.trace)
+    return conn
+
+
+# The process-wide metrics that the GUI's connections and actions record into.
+metrics = Metrics()
+
+
+def metrics_file():
+    return os.environ.get(METRICS_FILE_ENV)
+
+
+def env_metrics():
+    """metrics if SSIS_METRICS_FILE asks for a dump, else None (for tools that only instrument on request)."""
+    return metrics if metrics_file() else None
+
+
+if metrics_file(): atexit.register(lambda: metrics.dump(metrics_file()))
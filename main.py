@@ -1,137 +1,79 @@
+import time
+STARTED_AT = time.perf_counter()  # for the startup timing report
 import sqlite3 as sql
 from tkinter import *
 from tkinter import ttk
 from tkinter import messagebox
+from tkinter import filedialog
 import re
 import os
+from db import connection_manager, get_db_connection, release_db_connection, initialize_database, split_program_names, is_busy_error
+from repository import StudentRepository, CollegeRepository, EnrollmentStatsRepository
+from catalog import CATALOG_TABLES, CatalogCache
+from student_view import StudentListView
+from search_cache import PREFETCH_ROWS, SearchCache
+from student_store import StudentStore, StoreView
+from workers import SearchWorker, BackgroundTask
+from instrumentation import metrics
+from importer import import_students
+from exporter import export_students
+from bulk import promote_students, transfer_students, delete_students
+from fuzzy import FuzzyView, is_fuzzy, find_duplicates
+from backup import SNAPSHOT_INTERVAL_S, backup_database, compact_database, snapshot_due, take_snapshot
+from staging import STAGING_FLUSH_ROWS, IdIndex, StagingQueue
 
 
-DATABASE_NAME = 'students_ssis_pure_sqlite_v3.db'
-
-DEFAULT_COLLEGES_DATA = [
-    ("College of Engineering and Technology", "COET"),
-    ("College of Education", "CED"),
-    ("College of Arts and Science", "CASS"),
-    ("College of Business Administration & Accountancy", "CBAA"),
-    ("College of Nursing", "CHS"), 
-    ("College of Science and Mathematics", "CSM"),
-    ("College of Computer Studies", "CCS")
-]
-
-DEFAULT_PROGRAM_LISTS_DATA = {
-    "COET": "DIPLOMA IN CHEMICAL ENGINEERING TECHNOLOGY,BS IN CIVIL ENGINEERING,BS IN CERAMICS ENGINEERING,BS IN CHEMICAL ENGINEERING,BS IN COMPUTER ENGINEERING,BS IN ELECTRONICS & COMMUNICATIONS ENGINEERING,BS IN ELECTRICAL ENGINEERING,BS IN MINING ENG'G.,BS IN ENVIRONMENTAL ENGINEERING TECHNOLOGY,BS IN MECHANICAL ENGINEERING,BS IN METALLURGICAL ENGINEERING",
-    "CED": "BACHELOR OF SECONDARY EDUCATION (BIOLOGY),BS IN INDUSTRIAL EDUCATION (DRAFTING),BACHELOR OF SECONDARY EDUCATION (CHEMISTRY),BACHELOR OF SECONDARY EDUCATION (PHYSICS),BACHELOR OF SECONDARY EDUCATION (MATHEMATICS),BACHELOR OF SECONDARY EDUCATION (MAPEH),Certificate Program for Teachers,BACHELOR OF SECONDARY EDUCATION (TLE),BACHELOR OF SECONDARY EDUCATION (GENERAL SCIENCE),BACHELOR OF ELEMENTARY EDUCATION (ENGLISH),BACHELOR OF ELEMENTARY EDUCATION (SCIENCE AND HEALTH),BS IN TECHNOLOGY TEACHER EDUCATION (INDUSTRIAL TECH),BS IN TECHNOLOGY TEACHER EDUCATION (DRAFTING TECH)",
-    "CASS": "GENERAL EDUCATION PROGRAM,BA IN ENGLISH,BS IN PSYCHOLOGY,BA IN FILIPINO,BA IN HISTORY,BA IN POLITICAL SCIENCE",
-    "CBAA": "BS IN BUSINESS ADMINISTRATION (BUSINESS ECONOMICS),BS IN BUSINESS ADMINISTRATION (ECONOMICS),BS IN BUSINESS ADMINISTRATION (ENTREPRENEURIAL MARKETING),BS IN HOTEL AND RESTAURANT MANAGEMENT,BS IN ACCOUNTANCY",
-    "CHS": "BS IN NURSING",
-    "CSM": "BS IN BIOLOGY (GENERAL),BS IN STATISTICS,BS IN BIOLOGY (BOTANY),BS IN BIOLOGY (ZOOLOGY),BS IN BIOLOGY (MARINE),BS IN CHEMISTRY,BS IN MATHEMATICS,BS IN PHYSICS",
-    "CCS": "BS IN COMPUTER SCIENCE,BS IN INFORMATION TECHNOLOGY,BS IN INFORMATION SYSTEMS,BS IN ELECTRONICS AND COMPUTER TECHNOLOGY (EMBEDDED SYSTEMS),BS IN ELECTRONICS AND COMPUTER TECHNOLOGY (COMMUNICATIONS SYSTEM),DIPLOMA IN ELECTRONICS TECHNOLOGY,DIPLOMA IN ELECTRONICS ENGINEERING TECH (Communication Electronics),DIPLOMA IN ELECTRONICS ENGINEERING TECH (Computer Electronics)"
-}
-
-
-def get_db_connection():
-    conn = sql.connect(DATABASE_NAME)
-    conn.row_factory = sql.Row
-    conn.execute("PRAGMA foreign_keys = ON;")
-    return conn
-
-def initialize_database():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Colleges (
-            CollegeCode TEXT PRIMARY KEY,
-            CollegeName TEXT NOT NULL UNIQUE
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS CollegeProgramLists (
-            CollegeCode TEXT PRIMARY KEY,
-            ProgramNames TEXT,
-            FOREIGN KEY (CollegeCode) REFERENCES Colleges(CollegeCode) ON DELETE CASCADE ON UPDATE CASCADE
-        )
-    ''') 
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Students (
-            idnum TEXT PRIMARY KEY,
-            fname TEXT,
-            lname TEXT,
-            sex TEXT,
-            pcode TEXT,
-            yrlvl INTEGER,
-            cname TEXT,
-            ccode TEXT,
-            FOREIGN KEY (ccode) REFERENCES Colleges(CollegeCode) ON DELETE SET NULL ON UPDATE CASCADE
-        )
-    ''')
-    conn.commit()
-    conn.close()
+# All database access goes through the repositories, which the CLI shares.
+# Their writes run on the Tk thread, so a database another station keeps
+# locked must not freeze the window for the full busy timeout and retries:
+# each try waits at most UI_BUSY_TIMEOUT_MS, and after UI_WRITE_RETRIES the
+# write fails and the user is asked to try again (see db_error_text).
+UI_BUSY_TIMEOUT_MS = 250
+UI_WRITE_RETRIES = 2
+students = StudentRepository(connection_manager, busy_timeout_ms=UI_BUSY_TIMEOUT_MS, write_retries=UI_WRITE_RETRIES)
+colleges = CollegeRepository(connection_manager, busy_timeout_ms=UI_BUSY_TIMEOUT_MS, write_retries=UI_WRITE_RETRIES)
+enrollment_stats = EnrollmentStatsRepository(connection_manager, busy_timeout_ms=UI_BUSY_TIMEOUT_MS, write_retries=UI_WRITE_RETRIES)
+catalog = CatalogCache(colleges)  # colleges and programs as the form and dialogs see them
 
 def seed_default_data_if_empty():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM Colleges")
-    college_count = cursor.fetchone()[0]
-
-    if college_count == 0:
-        print("Database is empty. Seeding default college and program data...")
-        try:
-            for cname, ccode in DEFAULT_COLLEGES_DATA:
-                try:
-                    cursor.execute("INSERT INTO Colleges (CollegeName, CollegeCode) VALUES (?, ?)", (cname, ccode))
-                except sql.IntegrityError: pass
-            conn.commit()
-            for ccode, programs_str in DEFAULT_PROGRAM_LISTS_DATA.items():
-                cursor.execute("SELECT CollegeCode FROM Colleges WHERE CollegeCode = ?", (ccode,))
-                if cursor.fetchone():
-                    try:
-                        cursor.execute("INSERT INTO CollegeProgramLists (CollegeCode, ProgramNames) VALUES (?, ?)", (ccode, programs_str))
-                    except sql.IntegrityError: pass
-            conn.commit()
-            print("Default data seeded.")
-        except sql.Error as e:
-            messagebox.showerror("DB Seeding Error", f"Error seeding default data: {e}")
-    conn.close()
-
-# --- Load data into Python dictionaries from DB ---
-def load_college_programs_from_db():
-    programs = {}
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT CollegeCode, ProgramNames FROM CollegeProgramLists")
-        rows = cursor.fetchall()
-        for row in rows:
-            program_list = [p.strip() for p in row['ProgramNames'].split(',') if p.strip()] if row['ProgramNames'] else []
-            programs[row['CollegeCode']] = program_list
-    except sql.Error as e: messagebox.showerror("DB Error", f"Error loading college programs: {e}")
-    finally: conn.close()
-    return programs
-
-def load_college_mapping_from_db():
-    mapping = {}
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute("SELECT CollegeName, CollegeCode FROM Colleges ORDER BY CollegeName")
-        rows = cursor.fetchall()
-        for row in rows: mapping[row['CollegeName']] = row['CollegeCode']
-    except sql.Error as e: messagebox.showerror("DB Error", f"Error loading college mapping: {e}")
-    finally: conn.close()
-    return mapping
-
-initialize_database()
-seed_default_data_if_empty()
-college_programs_dict = load_college_programs_from_db()
-college_mapping_dict = load_college_mapping_from_db()
+        colleges.seed_defaults()  # the seeded colleges show up in the form once the catalog loads
+    except sql.Error as e:
+        messagebox.showerror("DB Seeding Error", f"Error seeding default data: {e}")
+
+# --- Startup ---
+# The schema check is the only database work before the window is built; the
+# catalog and the first page of students load once the first frame is shown.
+startup_marks = []
+
+def mark_startup(phase):
+    startup_marks.append((phase, (time.perf_counter() - STARTED_AT) * 1000))
+
+def finish_startup():
+    seed_default_data_if_empty()
+    refresh_ui_data()  # loads the catalog and fills the form
+    refresh_student_treeview()
+    mark_startup("first page")
+    report_startup()
+
+def report_startup():
+    """Records each phase with the UI actions (see the Diagnostics window) and shows the total in the status bar."""
+    for phase, ms in startup_marks: metrics.record_action(f"startup: {phase}", ms)
+    show_status_note(f"started in {startup_marks[-1][1]:.0f} ms")
+
+def show_status_note(text):
+    """Shows a short note after the student count in the status bar, until the next search replaces it."""
+    global search_latency_text
+    search_latency_text = text
+    update_student_status()
 
 # --- GUI Functions ---
 def autofill_code(event):
     selected_college_name = CollName_entry.get()
-    if selected_college_name in college_mapping_dict:
-        college_code = college_mapping_dict[selected_college_name]
+    if selected_college_name in catalog.mapping:
+        college_code = catalog.mapping[selected_college_name]
         CollCode_entry.config(state='normal'); CollCode_entry.delete(0, END); CollCode_entry.insert(0, college_code); CollCode_entry.config(state='readonly')
-        programs_list = college_programs_dict.get(college_code, [])
+        programs_list = catalog.program_list(college_code)
         program_combobox['values'] = programs_list
         if programs_list: program_combobox.current(0); autofill_program_code_display(None)
         else: program_combobox.set(''); autofill_program_code_display(None)
@@ -141,11 +83,18 @@ def autofill_code(event):
 
 def autofill_program_code_display(event):
     selected_program = progcode_var.get()
+    program_code = catalog.program_code(collcode_var.get(), selected_program)
     ProgCode_entry.config(state='normal'); ProgCode_entry.delete(0, END)
-    if selected_program: ProgCode_entry.insert(0, selected_program)
+    if program_code: ProgCode_entry.insert(0, program_code)
     ProgCode_entry.config(state='readonly')
 
+def db_error_text(error):
+    """How a database error is shown: a locked database reads as a busy one to retry, not as a failure."""
+    if is_busy_error(error): return "another station is saving right now; try again in a moment."
+    return str(error)
+
 def save_student_to_db():
+    if staging_queue is not None: stage_student(); return  # rapid entry
     idnum, fname, lname, sex = idnum_var.get(), fname_var.get(), lname_var.get(), sex_var.get()
     program_name_selected, year_str = progcode_var.get(), year_var.get()
     collname, collcode = collname_var.get(), collcode_var.get()
@@ -153,13 +102,14 @@ def save_student_to_db():
         messagebox.showwarning("Input Error", "All fields must be filled out"); return
     try: year = int(year_str)
     except ValueError: messagebox.showwarning("Input Error", "Year level must be a number."); return
-    conn = get_db_connection(); cursor = conn.cursor()
+    program_code = catalog.program_code(collcode, program_name_selected)
+    if not program_code: messagebox.showwarning("Input Error", "Select a program offered by the college."); return
     try:
-        cursor.execute("INSERT INTO Students VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (idnum, fname, lname, sex, program_name_selected, year, collname, collcode))
-        conn.commit(); messagebox.showinfo("Success", "Student saved successfully!"); refresh_student_treeview(); clear_input_fields()
+        with metrics.action("save student"):
+            students.add((idnum, fname, lname, sex, program_code, year, collname, collcode)); sync_student_rows([idnum])
+        messagebox.showinfo("Success", "Student saved successfully!"); clear_input_fields()
     except sql.IntegrityError: messagebox.showerror("Save Error", f"Student ID '{idnum}' already exists.")
-    except sql.Error as e: messagebox.showerror("Database Error", f"Error saving student: {e}")
-    finally: conn.close()
+    except sql.Error as e: messagebox.showerror("Database Error", f"Error saving student: {db_error_text(e)}")
 
 def clear_input_fields():
     idnum_var.set(""); fname_var.set(""); lname_var.set(""); sex_var.set(""); progcode_var.set(""); year_var.set("1"); collname_var.set("")
@@ -169,27 +119,39 @@ def clear_input_fields():
     if CollName_entry['values']: CollName_entry.current(0); autofill_code(None)
     else: pass
 
-def refresh_ui_data():
-    """Reloads global dictionaries and updates relevant UI elements."""
-    global college_mapping_dict, college_programs_dict
-    college_mapping_dict = load_college_mapping_from_db()
-    college_programs_dict = load_college_programs_from_db()
-    
-    CollName_entry['values'] = list(college_mapping_dict.keys())
-    if list(college_mapping_dict.keys()):
-        current_selection = collname_var.get()
-        if current_selection in college_mapping_dict:
-            CollName_entry.set(current_selection)
-        else:
-            CollName_entry.current(0)
-        autofill_code(None)
-    else:
+def refresh_ui_data(tables=CATALOG_TABLES):
+    """Reloads the given catalog tables after a local write and updates only what changed."""
+    try:
+        with metrics.action("college refresh"): apply_catalog_changes(catalog.reload(tables))
+    except sql.Error as e: messagebox.showerror("DB Error", f"Error loading colleges and programs: {e}")
+
+def apply_catalog_changes(changed_codes):
+    """Refreshes the form's comboboxes and the grid rows of the colleges whose name or programs changed."""
+    if not changed_codes: return
+    names = list(catalog.mapping)
+    if list(CollName_entry['values']) != names: CollName_entry['values'] = names
+    current_selection, current_program = collname_var.get(), progcode_var.get()
+    if not names:
         collname_var.set('')
         CollCode_entry.config(state='normal'); CollCode_entry.delete(0, END); CollCode_entry.config(state='readonly')
         program_combobox['values'] = []; progcode_var.set('')
         ProgCode_entry.config(state='normal'); ProgCode_entry.delete(0, END); ProgCode_entry.config(state='readonly')
+    elif current_selection not in catalog.mapping: CollName_entry.current(0); autofill_code(None)
+    elif {catalog.mapping[current_selection], collcode_var.get()} & changed_codes:
+        autofill_code(None)
+        if current_program in program_combobox['values']: program_combobox.set(current_program); autofill_program_code_display(None)
+    # Rows still show the old college code until they are reread.
+    if isinstance(student_view, StoreView): reload_student_view(); return  # students past the loaded rows changed too
+    affected = [iid for iid in student_info.get_children() if student_info.set(iid, "College Code") in changed_codes]
+    sync_student_rows(affected)
 
-    refresh_student_treeview()
+CATALOG_POLL_MS = 2000
+
+def poll_catalog_changes():
+    """Picks up colleges and programs changed by another process (see CatalogCache.poll)."""
+    try: apply_catalog_changes(catalog.poll())
+    except sql.Error: pass  # e.g. the database is locked; try again on the next poll
+    root.after(CATALOG_POLL_MS, poll_catalog_changes)
 
 def open_add_college_window():
     add_college_win = Toplevel(root)
@@ -215,31 +177,26 @@ def open_add_college_window():
         if not cname or not ccode:
             messagebox.showerror("Input Error", "College Name and Code are required!", parent=add_college_win); return
         
-        conn = get_db_connection(); cursor = conn.cursor()
         try:
-            cursor.execute("INSERT INTO Colleges (CollegeName, CollegeCode) VALUES (?, ?)", (cname, ccode))
-            if progs_str:
-                cursor.execute("INSERT INTO CollegeProgramLists (CollegeCode, ProgramNames) VALUES (?, ?)", (ccode, progs_str))
-            conn.commit()
+            colleges.add(cname, ccode, split_program_names(progs_str))
             messagebox.showinfo("Success", "College added successfully!", parent=add_college_win)
             refresh_ui_data()
             add_college_win.destroy()
         except sql.IntegrityError: messagebox.showerror("Save Error", f"College Code '{ccode}' or Name '{cname}' already exists.", parent=add_college_win)
-        except sql.Error as e: messagebox.showerror("Database Error", f"Error saving college: {e}", parent=add_college_win)
-        finally: conn.close()
+        except sql.Error as e: messagebox.showerror("Database Error", f"Error saving college: {db_error_text(e)}", parent=add_college_win)
 
     Button(add_college_win, text="Save College", command=save_new_college).pack(pady=15)
 
 def open_edit_college_window():
     edit_college_win = Toplevel(root)
     edit_college_win.title("Edit College")
-    edit_college_win.geometry("450x380")
+    edit_college_win.geometry("450x420")
     edit_college_win.grab_set()
 
     Label(edit_college_win, text="Select College to Edit:").pack(pady=5)
     select_cname_var = StringVar()
     college_select_combo = ttk.Combobox(edit_college_win, textvariable=select_cname_var, 
-                                        values=list(college_mapping_dict.keys()), state="readonly", width=40)
+                                        values=list(catalog.mapping.keys()), state="readonly", width=40)
     college_select_combo.pack(pady=2)
 
     details_frame = LabelFrame(edit_college_win, text="Edit Details", padx=10, pady=10)
@@ -254,29 +211,39 @@ def open_edit_college_window():
     Label(details_frame, text="College Code:").grid(row=1, column=0, sticky="w", pady=3)
     Entry(details_frame, textvariable=edit_ccode_var, width=15).grid(row=1, column=1, pady=3, sticky="w")
     Label(details_frame, text="Current Programs:").grid(row=2, column=0, sticky="nw", pady=3)
-    current_progs_text = Text(details_frame, height=4, width=35, state="disabled", wrap="word")
-    current_progs_text.grid(row=2, column=1, pady=3, sticky="w")
-    Label(details_frame, text="Add New Programs (comma-sep):").grid(row=3, column=0, sticky="w", pady=3)
-    Entry(details_frame, textvariable=add_progs_var, width=35).grid(row=3, column=1, pady=3, sticky="w")
+    current_progs_list = Listbox(details_frame, height=5, width=35, exportselection=False)
+    current_progs_list.grid(row=2, column=1, pady=3, sticky="w")
+    Label(details_frame, text="Add New Programs (comma-sep):").grid(row=4, column=0, sticky="w", pady=3)
+    Entry(details_frame, textvariable=add_progs_var, width=35).grid(row=4, column=1, pady=3, sticky="w")
+    listed_program_codes = []
 
     def populate_edit_fields(event=None):
         selected_name = select_cname_var.get()
-        if selected_name in college_mapping_dict:
-            original_code = college_mapping_dict[selected_name]
+        if selected_name in catalog.mapping:
+            original_code = catalog.mapping[selected_name]
             original_ccode_hidden.set(original_code)
             edit_cname_var.set(selected_name)
             edit_ccode_var.set(original_code)
             add_progs_var.set("")
             
-            current_progs_list = college_programs_dict.get(original_code, [])
-            current_progs_text.config(state="normal")
-            current_progs_text.delete(1.0, END)
-            if current_progs_list: current_progs_text.insert(END, "\n".join(current_progs_list))
-            else: current_progs_text.insert(END, "(No programs listed)")
-            current_progs_text.config(state="disabled")
+            current_progs_list.delete(0, END); listed_program_codes.clear()
+            for program_name, program_code in catalog.programs.get(original_code, {}).items():
+                current_progs_list.insert(END, f"{program_code} - {program_name}"); listed_program_codes.append(program_code)
     
     college_select_combo.bind("<<ComboboxSelected>>", populate_edit_fields)
-    if list(college_mapping_dict.keys()): college_select_combo.current(0); populate_edit_fields()
+    if list(catalog.mapping.keys()): college_select_combo.current(0); populate_edit_fields()
+
+    def remove_selected_program():
+        selection = current_progs_list.curselection()
+        if not selection: messagebox.showwarning("Selection Error", "No program selected!", parent=edit_college_win); return
+        program_code = listed_program_codes[selection[0]]
+        if not messagebox.askyesno("Confirm Removal", f"Remove program '{program_code}'? Students enrolled in it will have no program.", parent=edit_college_win): return
+        try:
+            colleges.remove_programs([program_code])
+            refresh_ui_data(("Programs",)); populate_edit_fields()
+        except sql.Error as e: messagebox.showerror("Database Error", f"Error removing program: {db_error_text(e)}", parent=edit_college_win)
+
+    Button(details_frame, text="Remove Selected Program", command=remove_selected_program).grid(row=3, column=1, pady=3, sticky="w")
 
     def save_college_changes():
         orig_ccode = original_ccode_hidden.get()
@@ -286,39 +253,13 @@ def open_edit_college_window():
         if not orig_ccode: messagebox.showerror("Error", "No college selected or original code lost.", parent=edit_college_win); return
         if not new_cname or not new_ccode: messagebox.showerror("Input Error", "College Name and Code are required.", parent=edit_college_win); return
 
-        conn = get_db_connection(); cursor = conn.cursor()
         try:
-            cursor.execute("UPDATE Colleges SET CollegeName = ?, CollegeCode = ? WHERE CollegeCode = ?", 
-                           (new_cname, new_ccode, orig_ccode))
-            
-            cursor.execute("SELECT ProgramNames FROM CollegeProgramLists WHERE CollegeCode = ?", (new_ccode,))
-            current_prog_row = cursor.fetchone()
-            existing_progs_list = []
-            if current_prog_row and current_prog_row['ProgramNames']:
-                existing_progs_list = [p.strip() for p in current_prog_row['ProgramNames'].split(',') if p.strip()]
-            
-            if progs_to_add_str:
-                newly_added_progs = [p.strip() for p in progs_to_add_str.split(',') if p.strip()]
-                for prog in newly_added_progs:
-                    if prog not in existing_progs_list:
-                        existing_progs_list.append(prog)
-            
-            updated_progs_str = ",".join(existing_progs_list)
-            
-            cursor.execute("SELECT COUNT(*) FROM CollegeProgramLists WHERE CollegeCode = ?", (new_ccode,))
-            if cursor.fetchone()[0] > 0 :
-                 cursor.execute("UPDATE CollegeProgramLists SET ProgramNames = ? WHERE CollegeCode = ?", 
-                               (updated_progs_str, new_ccode))
-            else:
-                 cursor.execute("INSERT INTO CollegeProgramLists (CollegeCode, ProgramNames) VALUES (?,?)", (new_ccode, updated_progs_str))
-
-            conn.commit()
+            colleges.update(orig_ccode, new_cname, new_ccode, split_program_names(progs_to_add_str))
             messagebox.showinfo("Success", "College updated successfully!", parent=edit_college_win)
             refresh_ui_data()
             edit_college_win.destroy()
         except sql.IntegrityError as ie: messagebox.showerror("Save Error", f"New College Code '{new_ccode}' or Name '{new_cname}' might conflict. {ie}", parent=edit_college_win)
-        except sql.Error as e: messagebox.showerror("Database Error", f"Error updating college: {e}", parent=edit_college_win)
-        finally: conn.close()
+        except sql.Error as e: messagebox.showerror("Database Error", f"Error updating college: {db_error_text(e)}", parent=edit_college_win)
 
     Button(edit_college_win, text="Save Changes", command=save_college_changes).pack(pady=10)
 
@@ -326,19 +267,25 @@ def open_edit_student_window():
     selected_item_iid = student_info.selection()
     if not selected_item_iid: messagebox.showwarning("Selection Error", "No student selected!"); return
     
-    stud_values = student_info.item(selected_item_iid[0], 'values')
+    # Read afresh, with its version, rather than trusting a grid row another station may have changed.
+    try: fresh = students.get_versioned(selected_item_iid[0])
+    except sql.Error as e: messagebox.showerror("DB Error", f"Error loading student: {e}"); return
+    if fresh is None:
+        messagebox.showwarning("Edit Student", "This student was deleted at another station."); sync_student_rows([selected_item_iid[0]]); return
+    stud_values, read_version = fresh[0], [fresh[1]]  # the version is replaced when a conflict is resolved
     # (IDNum, FName, LName, Sex, PCode, YrLvl, CName, CCode)
 
     edit_stud_win = Toplevel(root)
     edit_stud_win.title("Edit Student Information")
     edit_stud_win.geometry("400x450")
+    program_names = catalog.program_names
     edit_stud_win.grab_set()
 
-    edit_id_var = StringVar(value=stud_values[0])
+    edit_id_var = StringVar(value=selected_item_iid[0])
     edit_fname_var = StringVar(value=stud_values[1])
     edit_lname_var = StringVar(value=stud_values[2])
     edit_sex_var = StringVar(value=stud_values[3])
-    edit_pcode_var = StringVar(value=stud_values[4])
+    edit_pcode_var = StringVar(value=program_names.get(stud_values[4], ""))
     edit_yrlvl_var = StringVar(value=str(stud_values[5]))
     edit_cname_var = StringVar(value=stud_values[6])
     edit_ccode_var = StringVar(value=stud_values[7])
@@ -354,7 +301,7 @@ def open_edit_student_window():
     
     Label(edit_stud_win, text="College Name:").pack(pady=2)
     edit_cname_combo = ttk.Combobox(edit_stud_win, textvariable=edit_cname_var, 
-                                     values=list(college_mapping_dict.keys()), state="readonly")
+                                     values=list(catalog.mapping.keys()), state="readonly")
     edit_cname_combo.pack(pady=2)
     
     Label(edit_stud_win, text="College Code (Read-only):").pack(pady=2)
@@ -370,10 +317,10 @@ def open_edit_student_window():
 
     def update_edit_student_college_fields(event=None):
         sel_cname = edit_cname_var.get()
-        if sel_cname in college_mapping_dict:
-            sel_ccode = college_mapping_dict[sel_cname]
+        if sel_cname in catalog.mapping:
+            sel_ccode = catalog.mapping[sel_cname]
             edit_ccode_var.set(sel_ccode)
-            progs = college_programs_dict.get(sel_ccode, [])
+            progs = catalog.program_list(sel_ccode)
             edit_pcode_combo['values'] = progs
             current_pcode = edit_pcode_var.get()
             if progs:
@@ -390,34 +337,68 @@ def open_edit_student_window():
 
     def save_student_changes():
         idnum, fname, lname, sex = edit_id_var.get(), edit_fname_var.get(), edit_lname_var.get(), edit_sex_var.get()
-        pcode, yrlvl_str = edit_pcode_var.get(), edit_yrlvl_var.get()
+        yrlvl_str = edit_yrlvl_var.get()
         cname, ccode = edit_cname_var.get(), edit_ccode_var.get()
+        pcode = catalog.program_code(ccode, edit_pcode_var.get())
 
         if not all([fname, lname, sex, pcode, yrlvl_str, cname, ccode]):
             messagebox.showerror("Input Error", "All fields (except ID) must be filled.", parent=edit_stud_win); return
         try: yrlvl = int(yrlvl_str)
         except ValueError: messagebox.showerror("Input Error", "Year level must be a number.", parent=edit_stud_win); return
 
-        conn = get_db_connection(); cursor = conn.cursor()
+        mine = (idnum, fname, lname, sex, pcode, yrlvl, cname, ccode)
         try:
-            cursor.execute("""UPDATE Students SET fname=?, lname=?, sex=?, pcode=?, yrlvl=?, cname=?, ccode=?
-                              WHERE idnum = ?""", 
-                           (fname, lname, sex, pcode, yrlvl, cname, ccode, idnum))
-            conn.commit()
-            if cursor.rowcount > 0:
-                messagebox.showinfo("Success", "Student updated successfully!", parent=edit_stud_win)
-                refresh_student_treeview()
-                edit_stud_win.destroy()
-            else: messagebox.showerror("Update Error", "No student found with that ID or no changes made.", parent=edit_stud_win)
-        except sql.Error as e: messagebox.showerror("Database Error", f"Error updating student: {e}", parent=edit_stud_win)
-        finally: conn.close()
+            with metrics.action("update student"):
+                while not students.update_if_unchanged(mine, read_version[0]):
+                    # Someone else saved (or deleted) the student since this window read it.
+                    theirs = students.get_versioned(idnum)
+                    if theirs is None:
+                        messagebox.showerror("Update Error", "This student was deleted at another station; the changes can't be saved.",
+                                             parent=edit_stud_win)
+                        sync_student_rows([idnum]); edit_stud_win.destroy(); return
+                    choice = resolve_edit_conflict(edit_stud_win, mine, theirs[0])
+                    if choice is None: return
+                    read_version[0] = theirs[1]
+                    if choice == "theirs": fill_edit_fields(theirs[0]); sync_student_rows([idnum]); return
+                sync_student_rows([idnum])
+            messagebox.showinfo("Success", "Student updated successfully!", parent=edit_stud_win)
+            edit_stud_win.destroy()
+        except sql.Error as e: messagebox.showerror("Database Error", f"Error updating student: {db_error_text(e)}", parent=edit_stud_win)
+
+    def fill_edit_fields(values):
+        edit_fname_var.set(values[1]); edit_lname_var.set(values[2]); edit_sex_var.set(values[3])
+        edit_pcode_var.set(catalog.program_names.get(values[4], "")); edit_yrlvl_var.set(str(values[5]))
+        edit_cname_var.set(values[6] or ""); edit_ccode_var.set(values[7] or "")
+        update_edit_student_college_fields()
 
     Button(edit_stud_win, text="Save Changes", command=save_student_changes).pack(pady=15)
 
+EDIT_CONFLICT_FIELDS = ("ID Number", "First Name", "Last Name", "Sex", "Program Code", "Year Level", "College Name", "College Code")
+
+def resolve_edit_conflict(parent, mine, theirs):
+    """Shows both versions of a student saved elsewhere meanwhile; returns "mine", "theirs" or None (cancel)."""
+    choice = [None]
+    win = Toplevel(parent); win.title("Edit Conflict"); win.geometry("520x330"); win.grab_set()
+    Label(win, text="Another station saved this student while you were editing it.", font=("Arial", 10, "bold")).pack(pady=(10, 5))
+    table = ttk.Treeview(win, columns=("Field", "Yours", "Theirs"), show="headings", height=len(EDIT_CONFLICT_FIELDS))
+    for column, width in (("Field", 110), ("Yours", 180), ("Theirs", 180)): table.heading(column, text=column); table.column(column, width=width)
+    for field, yours, saved in zip(EDIT_CONFLICT_FIELDS, mine, theirs):
+        table.insert('', 'end', values=(field, yours, saved), tags=("differs",) if str(yours) != str(saved) else ())
+    table.tag_configure("differs", background="#ffe0b0")
+    table.pack(padx=10, pady=5, fill=X)
+    buttons = Frame(win); buttons.pack(pady=10)
+    def choose(value): choice[0] = value; win.destroy()
+    Button(buttons, text="Keep Mine", command=lambda: choose("mine")).pack(side=LEFT, padx=5)
+    Button(buttons, text="Take Theirs", command=lambda: choose("theirs")).pack(side=LEFT, padx=5)
+    Button(buttons, text="Cancel", command=win.destroy).pack(side=LEFT, padx=5)
+    win.wait_window()
+    parent.grab_set()
+    return choice[0]
+
 def open_delete_college_window():
     delete_college_window = Toplevel(root); delete_college_window.title("Delete College"); delete_college_window.geometry("400x250"); delete_college_window.grab_set()
     Label(delete_college_window, text="Select College to Delete:", font=("Arial", 12)).pack(pady=10)
-    current_college_names = list(college_mapping_dict.keys())
+    current_college_names = list(catalog.mapping.keys())
     college_combobox_del = ttk.Combobox(delete_college_window, values=current_college_names, state="readonly", font=("Arial", 10), width=35)
     college_combobox_del.pack(pady=10)
     if current_college_names: college_combobox_del.current(0)
@@ -427,7 +408,7 @@ def open_delete_college_window():
         if not selected_college_name: 
             messagebox.showwarning("Selection Error", "No college selected!", parent=delete_college_window); return
             
-        college_code_to_delete = college_mapping_dict.get(selected_college_name)
+        college_code_to_delete = catalog.mapping.get(selected_college_name)
         if not college_code_to_delete: 
             messagebox.showerror("Error", "Could not find code for selected college.", parent=delete_college_window); return
 
@@ -439,156 +420,869 @@ def open_delete_college_window():
         )
         if not confirm: return
             
-        conn = get_db_connection(); cursor = conn.cursor()
         try:
-            cursor.execute("UPDATE Students SET cname = NULL, pcode = NULL WHERE ccode = ?", (college_code_to_delete,))
-            cursor.execute("DELETE FROM Colleges WHERE CollegeCode = ?", (college_code_to_delete,))
-            conn.commit()
-            
-            if cursor.rowcount > 0:
+            if colleges.delete(college_code_to_delete) > 0:
                 messagebox.showinfo("Success", f"College '{selected_college_name}' deleted.", parent=delete_college_window)
                 refresh_ui_data()
                 delete_college_window.destroy()
             else: 
                 messagebox.showerror("Delete Error", "College not found or could not be deleted.", parent=delete_college_window)
         except sql.Error as e: 
-            messagebox.showerror("Database Error", f"Error deleting college: {e}", parent=delete_college_window)
-        finally: conn.close()
+            messagebox.showerror("Database Error", f"Error deleting college: {db_error_text(e)}", parent=delete_college_window)
             
     Button(delete_college_window, text="Delete College", command=delete_college_from_db).pack(pady=20)
 
 def refresh_student_treeview(search_query=None, sort_col_name=None):
-    for item in student_info.get_children(): student_info.delete(item)
-    conn = get_db_connection(); cursor = conn.cursor()
-    query = "SELECT idnum, fname, lname, sex, pcode, yrlvl, cname, ccode FROM Students"
-    params = []
-    if search_query:
-        search_like = f"%{search_query}%"
-        query += " WHERE idnum LIKE ? OR fname LIKE ? OR lname LIKE ? OR sex LIKE ? OR pcode LIKE ? OR cname LIKE ? OR ccode LIKE ?"
-        params = [search_like] * 7
-    if sort_col_name:
-        db_column_map = {"ID Number": "idnum", "First Name": "fname", "Last Name": "lname", "Sex": "sex", 
-                         "Program Code": "pcode", "Year Level": "yrlvl", "College Name": "cname", "College Code": "ccode"}
-        actual_db_col = db_column_map.get(sort_col_name)
-        if actual_db_col: query += f" ORDER BY {actual_db_col}"
-    try:
-        cursor.execute(query, params)
-        for stud_row in cursor.fetchall(): student_info.insert('', 'end', values=tuple(stud_row))
+    view = StudentListView(search_query, sort_col_name, use_fts=students.use_fts)
+    try: show_student_view(view, students.first_page(view))
     except sql.Error as e: messagebox.showerror("DB Error", f"Error loading students: {e}")
-    finally: conn.close()
 
 def delete_selected_students():
     selected_items_iids = student_info.selection()
     if not selected_items_iids: messagebox.showwarning("Selection Error", "No student selected"); return
-    id_nums_to_delete = [student_info.item(iid, 'values')[0] for iid in selected_items_iids]
+    id_nums_to_delete = list(selected_items_iids)  # rows are keyed by idnum
     confirm = messagebox.askyesno("Confirm Delete", f"Delete {len(id_nums_to_delete)} student(s)?")
     if not confirm: return
-    conn = get_db_connection(); cursor = conn.cursor()
     try:
-        placeholders = ','.join(['?'] * len(id_nums_to_delete))
-        cursor.execute(f"DELETE FROM Students WHERE idnum IN ({placeholders})", id_nums_to_delete)
-        conn.commit()
-        if cursor.rowcount > 0: messagebox.showinfo("Success", f"{cursor.rowcount} student(s) deleted."); refresh_student_treeview()
+        with metrics.action("delete students"):
+            deleted = students.delete_many(id_nums_to_delete)
+            if deleted > 0: sync_student_rows(id_nums_to_delete)
+            if staging_queue is not None and staging_queue.ids is not None:
+                for idnum in id_nums_to_delete: staging_queue.ids.discard(idnum)
+        if deleted > 0: messagebox.showinfo("Success", f"{deleted} student(s) deleted.")
         else: messagebox.showerror("Delete Error", "No students were deleted.")
-    except sql.Error as e: messagebox.showerror("Database Error", f"Error deleting students: {e}")
-    finally: conn.close()
+    except sql.Error as e: messagebox.showerror("Database Error", f"Error deleting students: {db_error_text(e)}")
+
+# --- Rapid entry ---
+# While the Rapid Entry window is open, saving from the form stages the student
+# instead (Enter in the ID or name fields does the same): checked on the spot
+# against the cached catalog and an in-memory index of the IDs in use, listed,
+# and saved with the others every few entries or on demand, with only the new
+# rows patched into the grid. Problems are noted in the window, not in popups.
+ID_INDEX_POLL_MS = 100
+RAPID_LOG_LINES = 200
+staging_queue = None  # the open window's StagingQueue, or None when rapid entry is off
+staging_tree = staging_log = staging_status_var = staging_every_var = rapid_window = None
+id_index_task = None
+rapid_saved = 0
+
+def open_rapid_entry_window():
+    global staging_queue, staging_tree, staging_log, staging_status_var, staging_every_var, rapid_window, id_index_task, rapid_saved
+    if rapid_window is not None: rapid_window.lift(); return
+    staging_queue, rapid_saved = StagingQueue(), 0
+    rapid_window = Toplevel(root); rapid_window.title("Rapid Entry"); rapid_window.geometry("760x460")
+    Label(rapid_window, text="Fill in the form and press Enter (or Stage Student): entries are checked at once and saved together.",
+          font=("Arial", 9)).pack(anchor="w", padx=8, pady=(8, 2))
+    columns = ("ID Number", "First Name", "Last Name", "Sex", "Program Code", "Year Level", "College Code")
+    staging_tree = ttk.Treeview(rapid_window, columns=columns, show="headings", height=8)
+    for column in columns: staging_tree.heading(column, text=column); staging_tree.column(column, width=100, anchor="w")
+    staging_tree.pack(fill=BOTH, expand=True, padx=8, pady=4)
+    controls = Frame(rapid_window); controls.pack(fill=X, padx=8, pady=2)
+    Label(controls, text="Save every").pack(side=LEFT)
+    staging_every_var = StringVar(value=str(STAGING_FLUSH_ROWS))
+    Spinbox(controls, from_=1, to=1000, textvariable=staging_every_var, width=5).pack(side=LEFT, padx=4)
+    Label(controls, text="entries").pack(side=LEFT)
+    ttk.Button(controls, text="Save Staged Now (Ctrl+S)", command=flush_staged_students).pack(side=LEFT, padx=8)
+    ttk.Button(controls, text="Remove Selected", command=remove_staged_students).pack(side=LEFT)
+    staging_status_var = StringVar()
+    Label(controls, textvariable=staging_status_var, fg="#404040").pack(side=RIGHT)
+    staging_log = Listbox(rapid_window, height=6, font=("Arial", 9))
+    staging_log.pack(fill=X, padx=8, pady=(2, 8))
+    for window in (root, rapid_window): window.bind("<Control-s>", lambda event: flush_staged_students())
+    rapid_window.protocol("WM_DELETE_WINDOW", close_rapid_entry_window)
+    button_save.config(text="Stage Student (Enter)")
+    id_index_task = BackgroundTask(load_id_index, name="id-index", connections=connection_manager).start()
+    root.after(ID_INDEX_POLL_MS, poll_id_index)
+    update_staging_status()
+
+def close_rapid_entry_window():
+    """Saves whatever is still staged, then turns rapid entry off."""
+    global staging_queue, rapid_window, id_index_task
+    if staging_queue and not flush_staged_students(): return  # kept open: the students are still staged
+    if id_index_task is not None: id_index_task.cancel(); id_index_task = None
+    root.unbind("<Control-s>")
+    rapid_window.destroy(); rapid_window = staging_queue = None
+    button_save.config(text="Save Student")
+
+def load_id_index(progress, cancelled):
+    return IdIndex.load(students, cancelled)
+
+def poll_id_index():
+    global id_index_task
+    if id_index_task is None: return
+    for kind, value in id_index_task.drain():
+        if kind == "progress": continue
+        id_index_task = None
+        if kind == "error": note_staging(f"Could not load the IDs in use ({value}); taken IDs are caught when saving."); return
+        staging_queue.ids = value
+        for row in staging_queue.taken_by_now():
+            staging_tree.delete(row[0]); note_staging(f"{row[0]} ({row[2]}, {row[1]}) is already registered; removed from the list.")
+        update_staging_status(); return
+    root.after(ID_INDEX_POLL_MS, poll_id_index)
+
+def note_staging(message):
+    staging_log.insert(0, f"{time.strftime('%H:%M:%S')}  {message}")
+    if staging_log.size() > RAPID_LOG_LINES: staging_log.delete(RAPID_LOG_LINES, END)
+
+def update_staging_status():
+    ids = "loading IDs in use..." if staging_queue.ids is None else "IDs in use loaded"
+    staging_status_var.set(f"{len(staging_queue):,} staged, {rapid_saved:,} saved  |  {ids}")
+
+def stage_student():
+    record = dict(zip(("idnum", "fname", "lname", "sex", "pcode", "yrlvl", "cname", "ccode"),
+                      (idnum_var.get(), fname_var.get(), lname_var.get(), sex_var.get(), progcode_var.get(), year_var.get(),
+                       collname_var.get(), collcode_var.get())))
+    row, reason = staging_queue.stage(record, catalog.validation_catalog())
+    if row is None: note_staging(f"Not staged: {reason}"); idnum_entry.focus_set(); return
+    staging_tree.insert('', 'end', iid=row[0], values=row[:6] + row[7:])
+    staging_tree.see(row[0])
+    idnum_var.set(""); fname_var.set(""); lname_var.set("")  # college, program, year and sex carry over to the next student
+    idnum_entry.focus_set()
+    try: flush_rows = max(int(staging_every_var.get()), 1)
+    except ValueError: flush_rows = STAGING_FLUSH_ROWS
+    staging_queue.flush_rows = flush_rows
+    if staging_queue.due(): flush_staged_students()
+    else: update_staging_status()
+
+def flush_staged_students():
+    """Saves the staged students; returns False if the database refused them (they stay staged)."""
+    global rapid_saved
+    if staging_queue is None or not staging_queue: return True
+    try:
+        with metrics.action("save staged students"):
+            result = staging_queue.flush(students)
+            sync_student_rows([row[0] for row in result.added])
+    except sql.Error as e:
+        note_staging(f"Nothing saved, {len(staging_queue):,} still staged: {db_error_text(e)}"); update_staging_status(); return False
+    for iid in staging_tree.get_children(): staging_tree.delete(iid)
+    rapid_saved += len(result.added)
+    for row in result.taken: note_staging(f"{row[0]} ({row[2]}, {row[1]}) was registered at another station first; not saved.")
+    note_staging(result.summary())
+    update_staging_status()
+    return True
+
+def remove_staged_students():
+    for row in staging_queue.unstage(staging_tree.selection()): staging_tree.delete(row[0])
+    update_staging_status()
+
+def on_form_return(event):
+    if staging_queue is not None: stage_student()
+
+# --- Import and export ---
+# Both run on a BackgroundTask thread with its own connection; the window polls
+# the task for progress and closes when it finishes or is cancelled.
+TASK_POLL_MS = 100
+
+def open_task_window(title, heading, start_label, run, describe_progress, on_finish, build_options=None, confirm=None,
+                     geometry="460x230"):
+    """Opens a window that runs run(*options, progress=..., cancelled=...) with a progress bar and Cancel.
+
+    build_options(window), if given, adds option widgets and returns a function
+    that reads them into run's leading arguments when the task starts.
+    confirm(window, *options), if given, can decline to start it.
+    """
+    task_win = Toplevel(root); task_win.title(title); task_win.geometry(geometry); task_win.grab_set()
+    Label(task_win, text=heading, font=("Arial", 10, "bold")).pack(pady=5)
+    read_options = build_options(task_win) if build_options else tuple
+    progress_bar = ttk.Progressbar(task_win, length=400, maximum=1.0); progress_bar.pack(pady=8)
+    task_status_var = StringVar(); Label(task_win, textvariable=task_status_var).pack()
+    task = None
+
+    def poll_task():
+        for kind, value in task.drain():
+            if kind == "progress":
+                result, fraction = value
+                progress_bar['value'] = fraction; task_status_var.set(describe_progress(result)); continue
+            task_win.destroy(); on_finish(kind, value); return
+        root.after(TASK_POLL_MS, poll_task)
+
+    def start_task():
+        nonlocal task
+        options = read_options()
+        if confirm and not confirm(task_win, *options): return
+        start_button.config(state="disabled")
+        task_status_var.set("Working...")
+        task = BackgroundTask(run, *options, name=title.lower().replace(" ", "-"), connections=connection_manager).start()
+        poll_task()
+
+    def cancel_task():
+        if task: task.cancel(); task_status_var.set("Cancelling...")
+        else: task_win.destroy()
+
+    buttons = Frame(task_win); buttons.pack(pady=5)
+    start_button = Button(buttons, text=start_label, command=start_task); start_button.pack(side=LEFT, padx=5)
+    Button(buttons, text="Cancel", command=cancel_task).pack(side=LEFT, padx=5)
+    task_win.protocol("WM_DELETE_WINDOW", cancel_task)
+
+def open_import_students_window():
+    path = filedialog.askopenfilename(title="Import Students", filetypes=[("Student files", "*.csv *.jsonl *.ndjson *.csv.gz *.jsonl.gz"), ("All files", "*.*")])
+    if not path: return
+    reject_path = os.path.splitext(path[:-3] if path.endswith(".gz") else path)[0] + "_rejected.csv"
+
+    def build_options(win):
+        mode_var = StringVar(value="skip")
+        Radiobutton(win, text="Skip students whose ID already exists", variable=mode_var, value="skip").pack(anchor="w", padx=20)
+        Radiobutton(win, text="Update students whose ID already exists", variable=mode_var, value="upsert").pack(anchor="w", padx=20)
+        return lambda: (mode_var.get(),)
+
+    def run_import(mode, progress, cancelled):
+        conn = get_db_connection()
+        try: return import_students(conn, path, mode, reject_path=reject_path, progress=progress, cancelled=cancelled)
+        finally: release_db_connection(conn)
+
+    def on_finish(kind, value):
+        if kind == "error": messagebox.showerror("Import Error", f"Error importing students: {value}")
+        else:
+            message = value.summary()
+            if value.rejected or value.skipped: message += f"\n\nRejected rows were written to {reject_path}"
+            messagebox.showinfo("Import Finished", message)
+        reload_student_view()
+
+    open_task_window("Import Students", os.path.basename(path), "Start Import", run_import,
+                     lambda r: f"{r.read:,} rows read, {r.inserted + r.updated:,} saved", on_finish, build_options)
+
+def open_export_students_window(current_view_only):
+    view = student_view if current_view_only else None
+    if isinstance(view, FuzzyView):
+        messagebox.showinfo("Export Students", "Fuzzy name matches can't be exported; select them and use Bulk Change, or search by field."); return
+    path = filedialog.asksaveasfilename(title="Export Students", defaultextension=".csv",
+                                        filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("Parquet", "*.parquet"),
+                                                   ("Gzipped CSV", "*.csv.gz"), ("Gzipped JSON Lines", "*.jsonl.gz")])
+    if not path: return
+    query_args = (view.search_query, view.sort_col_name, view.use_fts) if view else (None, None, False)
+
+    def run_export(progress, cancelled):
+        conn = get_db_connection()
+        try: return export_students(conn, path, None, *query_args, progress=progress, cancelled=cancelled)
+        finally: release_db_connection(conn)
+
+    def on_finish(kind, value):
+        if kind == "error": messagebox.showerror("Export Error", f"Error exporting students: {value}")
+        else: messagebox.showinfo("Export Finished", value.summary())
+
+    heading = f"Current view to {os.path.basename(path)}" if view else f"All students to {os.path.basename(path)}"
+    open_task_window("Export Students", heading, "Start Export", run_export,
+                     lambda r: f"{r.rows:,} rows written", on_finish)
+
+# --- Bulk changes ---
+# One transaction of set-based statements for the selection or the whole current view.
+BULK_PATCH_LIMIT = 2000  # changed students patched into the grid; past this, the view is reloaded
+
+def open_bulk_change_window():
+    selected = list(student_info.selection())
+    view = student_view
+    in_view = f"{view.total:,} " if view is not None and view.total is not None else ""
+    view_query, view_use_fts = (view.search_query, view.use_fts) if view is not None else (None, False)
+    view_idnums = list(view.ids) if isinstance(view, FuzzyView) else None  # no query to rerun: its students are listed
+    if view_idnums is not None: view_query = f"~{view.text}"
+
+    def build_options(win):
+        target_var = StringVar(value="selection" if selected else "view")
+        Radiobutton(win, text=f"Selected students ({len(selected)})", variable=target_var, value="selection",
+                    state="normal" if selected else "disabled").pack(anchor="w", padx=20)
+        Radiobutton(win, text=f"All {in_view}students in the current view" + (f" ({view_query})" if view_query else ""),
+                    variable=target_var, value="view").pack(anchor="w", padx=20)
+        operation_var = StringVar(value="promote")
+        Radiobutton(win, text="Promote one year level (final-year students are flagged as graduated)", variable=operation_var,
+                    value="promote").pack(anchor="w", padx=20, pady=(8, 0))
+        transfer_row = Frame(win); transfer_row.pack(anchor="w", padx=20)
+        Radiobutton(transfer_row, text="Transfer to", variable=operation_var, value="transfer").pack(side=LEFT)
+        college_box = ttk.Combobox(transfer_row, values=list(catalog.mapping), state="readonly", width=28); college_box.pack(side=LEFT)
+        program_box = ttk.Combobox(transfer_row, state="readonly", width=28); program_box.pack(side=LEFT, padx=3)
+        Radiobutton(win, text="Delete", variable=operation_var, value="delete").pack(anchor="w", padx=20)
+
+        def fill_programs(event=None):
+            program_box['values'] = catalog.program_list(catalog.mapping.get(college_box.get()))
+            program_box.set(program_box['values'][0] if program_box['values'] else '')
+            operation_var.set("transfer")
+
+        college_box.bind("<<ComboboxSelected>>", fill_programs)
+
+        def read_options():
+            college_code = catalog.mapping.get(college_box.get())
+            idnums = selected if target_var.get() == "selection" else None
+            return operation_var.get(), idnums, college_code, catalog.program_code(college_code, program_box.get())
+        return read_options
+
+    def confirm(win, operation, idnums, college_code, program_code):
+        if operation == "transfer" and not college_code:
+            messagebox.showwarning("Selection Error", "Choose a college to transfer to.", parent=win); return False
+        who = f"{len(idnums)} selected student(s)" if idnums is not None else f"all {in_view}student(s) in the current view"
+        action = {"promote": "Promote", "transfer": f"Transfer to {college_code} {program_code or ''}".rstrip(), "delete": "Delete"}[operation]
+        return messagebox.askyesno("Confirm Bulk Change", f"{action} {who}?", parent=win)
+
+    def run_bulk(operation, idnums, college_code, program_code, progress, cancelled):
+        conn = get_db_connection()
+        try:
+            if idnums is None and view_idnums is not None: idnums = view_idnums
+            target = dict(search_query=view_query if view_idnums is None else None, use_fts=view_use_fts, idnums=idnums,
+                          progress=progress, cancelled=cancelled)
+            if operation == "promote": return promote_students(conn, **target)
+            if operation == "transfer": return transfer_students(conn, college_code, program_code, **target)
+            return delete_students(conn, **target)
+        finally: release_db_connection(conn)
+
+    def on_finish(kind, value):
+        if kind == "error": messagebox.showerror("Bulk Change Error", f"Error changing students: {value}"); return
+        metrics.record_action(f"bulk {value.operation}", value.elapsed * 1000)
+        messagebox.showinfo("Bulk Change Finished", value.summary())
+        if len(value.idnums) <= BULK_PATCH_LIMIT: sync_student_rows(value.idnums)
+        else: reload_student_view()
+
+    open_task_window("Bulk Change", "Change many students in one transaction", "Apply", run_bulk,
+                     lambda r: f"{r.changed:,} of {r.matched:,} student(s) changed", on_finish, build_options, confirm,
+                     geometry="620x330")
+
+# --- Duplicate registrations ---
+DUPLICATE_COLUMNS = ("ID Number", "First Name", "Last Name", "Sex", "Program Code", "Year Level", "College Code")
+
+def open_duplicates_window():
+    def run_duplicates(progress, cancelled):
+        conn = get_db_connection()
+        try: return find_duplicates(conn, progress=progress, cancelled=cancelled)
+        finally: release_db_connection(conn)
+
+    def on_finish(kind, value):
+        if kind == "error": messagebox.showerror("Duplicates Error", f"Error looking for duplicates: {value}")
+        elif not value.cancelled: show_duplicates_report(value)
+
+    open_task_window("Possible Duplicates", "Students who may be registered twice", "Search", run_duplicates,
+                     lambda r: f"{r.names:,} names, {r.similar_pairs:,} similar pairs", on_finish)
+
+def show_duplicates_report(report):
+    """Lists the groups of a DuplicateReport, one tree node per group."""
+    win = Toplevel(root); win.title("Possible Duplicates"); win.geometry("900x480")
+    Label(win, text=report.summary(), wraplength=860, justify=LEFT).pack(padx=10, pady=5, anchor="w")
+    table_frame = Frame(win); table_frame.pack(fill=BOTH, expand=True, padx=10, pady=5)
+    table = ttk.Treeview(table_frame, columns=DUPLICATE_COLUMNS, show="tree headings")
+    scroll = Scrollbar(table_frame, orient=VERTICAL, command=table.yview); table.configure(yscrollcommand=scroll.set)
+    scroll.pack(side=RIGHT, fill=Y); table.pack(fill=BOTH, expand=True)
+    table.column("#0", width=170)
+    for column in DUPLICATE_COLUMNS: table.heading(column, text=column); table.column(column, width=95)
+    for number, members in enumerate(report.groups, 1):
+        differ = len({(member[1], member[2]) for member in members}) > 1
+        group = table.insert('', 'end', text=f"Group {number}: {len(members)}" + (", spelled differently" if differ else ""), open=True)
+        for member in members: table.insert(group, 'end', values=member)
+
+# --- Backups ---
+# Copies of the live database while everyone keeps working (see backup.py), and a
+# snapshot every SNAPSHOT_INTERVAL_S, taken by whichever station finds one due.
+SNAPSHOT_POLL_MS = 60000
+snapshot_task = None
+
+def open_backup_window(compact=False):
+    title = "Compact Copy" if compact else "Back Up Database"
+    path = filedialog.asksaveasfilename(title=title, defaultextension=".db", filetypes=[("SQLite database", "*.db")])
+    if not path: return
+    if os.path.abspath(path) == os.path.abspath(connection_manager.database):
+        messagebox.showerror(title, "Choose a file other than the live database."); return
+
+    def run_backup(progress, cancelled):
+        conn = get_db_connection()
+        try: return (compact_database if compact else backup_database)(conn, path, progress=progress, cancelled=cancelled)
+        finally: release_db_connection(conn)
+
+    def on_finish(kind, value):
+        if kind == "error": messagebox.showerror(f"{title} Error", f"Error copying the database: {value}")
+        elif value.problems: messagebox.showwarning(f"{title} Finished", value.summary())
+        else: messagebox.showinfo(f"{title} Finished", value.summary())
+
+    open_task_window(title, f"{os.path.basename(connection_manager.database)} to {os.path.basename(path)}", "Start", run_backup,
+                     lambda r: f"{r.steps:,} steps, {r.restarts} restart(s)" if r.steps else "Copying...", on_finish)
+
+def run_snapshot(progress, cancelled):
+    conn = get_db_connection()
+    try: return take_snapshot(conn, connection_manager.database, cancelled=cancelled)
+    finally: release_db_connection(conn)
+
+def poll_snapshots():
+    global snapshot_task
+    if snapshot_task is not None:
+        for kind, value in snapshot_task.drain():
+            if kind == "progress": continue
+            snapshot_task = None
+            if kind == "error" or value.problems: show_status_note(f"snapshot failed: {value if kind == 'error' else value.summary()}")
+            break
+    elif snapshot_due(connection_manager.database, interval=SNAPSHOT_INTERVAL_S):
+        snapshot_task = BackgroundTask(run_snapshot, name="snapshot", connections=connection_manager).start()
+    root.after(SNAPSHOT_POLL_MS if snapshot_task is None else TASK_POLL_MS, poll_snapshots)
+
+# --- Enrollment statistics ---
+# Read from the trigger-maintained EnrollmentStats table: one row per group, however many students.
+STATS_DIMENSIONS = (("ccode", "College"), ("pcode", "Program"), ("yrlvl", "Year Level"), ("sex", "Sex"))
+
+def open_enrollment_stats_window():
+    stats_win = Toplevel(root); stats_win.title("Enrollment Statistics"); stats_win.geometry("560x460")
+    options = Frame(stats_win); options.pack(pady=5)
+    Label(options, text="Group by:").pack(side=LEFT)
+    dimension_vars = {column: BooleanVar(value=column in ("ccode", "yrlvl")) for column, _ in STATS_DIMENSIONS}
+    for column, heading in STATS_DIMENSIONS:
+        Checkbutton(options, text=heading, variable=dimension_vars[column], command=lambda: refresh_stats()).pack(side=LEFT)
+    stats_tree = ttk.Treeview(stats_win, show="headings", height=16)
+    stats_tree.pack(fill=BOTH, expand=True, padx=10)
+    stats_status_var = StringVar(); Label(stats_win, textvariable=stats_status_var).pack()
+
+    def refresh_stats():
+        dimensions = [column for column, _ in STATS_DIMENSIONS if dimension_vars[column].get()]
+        start = time.perf_counter()
+        try: rows = enrollment_stats.totals(dimensions)
+        except sql.Error as e: messagebox.showerror("Database Error", f"Error reading statistics: {e}", parent=stats_win); return
+        read_ms = (time.perf_counter() - start) * 1000
+        headings = [heading for column, heading in STATS_DIMENSIONS if column in dimensions] + ["Students"]
+        stats_tree.delete(*stats_tree.get_children())
+        stats_tree['columns'] = headings
+        for heading in headings: stats_tree.heading(heading, text=heading); stats_tree.column(heading, width=100, anchor=CENTER)
+        for row in rows: stats_tree.insert("", END, values=[value if value != '' else "(blank)" for value in row])
+        total = sum(row[-1] for row in rows)
+        stats_status_var.set(f"{total:,} student(s) in {len(rows):,} group(s), read in {read_ms:.1f} ms")
+
+    def verify_stats():
+        try: differences = enrollment_stats.verify()
+        except sql.Error as e: messagebox.showerror("Database Error", f"Error verifying statistics: {e}", parent=stats_win); return
+        if not differences: messagebox.showinfo("Statistics Verified", "Every group matches a recount of the students.", parent=stats_win); return
+        listed = "\n".join(f"{'/'.join(map(str, group))}: {maintained} kept, {counted} counted" for group, maintained, counted in differences[:10])
+        if len(differences) > 10: listed += f"\n...and {len(differences) - 10} more"
+        if messagebox.askyesno("Statistics Differ", f"{len(differences)} group(s) differ from a recount:\n{listed}\n\nRebuild them from the students?", parent=stats_win):
+            try: enrollment_stats.rebuild()
+            except sql.Error as e: messagebox.showerror("Database Error", f"Error rebuilding statistics: {db_error_text(e)}", parent=stats_win); return
+            refresh_stats()
+
+    buttons = Frame(stats_win); buttons.pack(pady=5)
+    Button(buttons, text="Refresh", command=refresh_stats).pack(side=LEFT, padx=5)
+    Button(buttons, text="Verify", command=verify_stats).pack(side=LEFT, padx=5)
+    refresh_stats()
+
+# --- Diagnostics ---
+# What the instrumented connections and the timed actions above have recorded (see instrumentation).
+def open_diagnostics_window():
+    diag_win = Toplevel(root); diag_win.title("Diagnostics"); diag_win.geometry("980x520")
+    notebook = ttk.Notebook(diag_win); notebook.pack(fill=BOTH, expand=True, padx=5, pady=5)
+    latency_columns = ("Count", "Mean ms", "p50 ms", "p95 ms", "p99 ms", "Max ms")
+
+    def make_tree(title, columns, first_width):
+        tab = Frame(notebook); notebook.add(tab, text=title)
+        tree = ttk.Treeview(tab, columns=columns, show="headings")
+        scroll = Scrollbar(tab, orient=VERTICAL, command=tree.yview); tree.configure(yscrollcommand=scroll.set)
+        scroll.pack(side=RIGHT, fill=Y); tree.pack(fill=BOTH, expand=True)
+        for i, column in enumerate(columns):
+            tree.heading(column, text=column); tree.column(column, width=first_width if i == 0 else 70, anchor="w" if i == 0 else "e")
+        return tab, tree
+
+    _, actions_tree = make_tree("UI actions", ("Action",) + latency_columns + ("Statements",), 200)
+    _, statements_tree = make_tree("Statements", ("SQL",) + latency_columns + ("Total ms",), 520)
+    slow_tab, slow_tree = make_tree("Slow queries", ("SQL", "ms", "Thread"), 700)
+    plan_text = Text(slow_tab, height=8, font=("Courier", 9)); plan_text.pack(fill=X)
+    status_var = StringVar(); Label(diag_win, textvariable=status_var).pack()
+    slow_plans = {}
+
+    def latencies(summary):
+        return (summary["count"], f"{summary['mean_ms']:.2f}", f"{summary['p50_ms']:.2f}", f"{summary['p95_ms']:.2f}",
+                f"{summary['p99_ms']:.2f}", f"{summary['max_ms']:.2f}")
+
+    def refresh_diagnostics():
+        snapshot = metrics.snapshot()
+        for tree in (actions_tree, statements_tree, slow_tree): tree.delete(*tree.get_children())
+        for name, summary in sorted(snapshot["actions"].items()):
+            actions_tree.insert("", END, values=(name,) + latencies(summary) + (summary["statements_per_call"],))
+        for key, summary in sorted(snapshot["statements"].items(), key=lambda item: -item[1]["total_ms"]):
+            statements_tree.insert("", END, values=(key,) + latencies(summary) + (f"{summary['total_ms']:.1f}",))
+        slow_plans.clear()
+        for entry in snapshot["slow_queries"]:
+            iid = slow_tree.insert("", END, values=(entry["sql"], f"{entry['ms']:.1f}", entry["thread"]))
+            slow_plans[iid] = f"{entry['sql']}\n\n{entry['plan']}"
+        status_var.set(f"{len(snapshot['statements'])} distinct statement(s), {len(snapshot['slow_queries'])} slower than "
+                       f"{snapshot['slow_query_ms']:.0f} ms  |  {search_cache.stats_text()}")
+
+    def show_plan(event=None):
+        plan_text.delete("1.0", END)
+        selection = slow_tree.selection()
+        if selection: plan_text.insert("1.0", slow_plans.get(selection[0], ""))
+
+    def save_diagnostics():
+        path = filedialog.asksaveasfilename(parent=diag_win, title="Save Diagnostics", defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if not path: return
+        try: metrics.dump(path)
+        except OSError as e: messagebox.showerror("Save Error", f"Error saving diagnostics: {e}", parent=diag_win)
+
+    def reset_diagnostics():
+        metrics.reset(); refresh_diagnostics()
+
+    slow_tree.bind("<<TreeviewSelect>>", show_plan)
+    buttons = Frame(diag_win); buttons.pack(pady=5)
+    Button(buttons, text="Refresh", command=refresh_diagnostics).pack(side=LEFT, padx=5)
+    Button(buttons, text="Reset", command=reset_diagnostics).pack(side=LEFT, padx=5)
+    Button(buttons, text="Save JSON...", command=save_diagnostics).pack(side=LEFT, padx=5)
+    refresh_diagnostics()
+
+# --- Background search and paging ---
+# Keystrokes are debounced, the query runs on search_worker's thread, and the
+# Tk loop polls for results; anything but the newest query's result is dropped.
+# The grid holds only the pages loaded so far (see StudentListView); the next
+# page is fetched on the worker once the scrollbar nears the bottom, and the
+# total is counted on its own worker so it never delays the first page.
+SEARCH_DEBOUNCE_MS = 150
+SEARCH_POLL_MS = 20
+PREFETCH_AT = 0.8  # fraction of the loaded rows scrolled past before the next page loads
+search_worker = None  # SearchWorkers, started with the GUI
+count_worker = None
+search_after_id = None
+last_keystroke_at = None
+search_latency_text = ""
+current_sort_keys = []  # [(column heading, descending)], most significant first
+student_view = None
+pending_view = None
+
+def data_generation():
+    """Changes whenever students or colleges are written, here or by another connection."""
+    return connection_manager.write_generation, students.data_version()
+
+# Pages already read, reused for repeated, narrowed and re-sorted searches until something is written.
+search_cache = SearchCache(data_generation)
+
+def update_search_suggestions(event=None):
+    global search_after_id, last_keystroke_at
+    last_keystroke_at = time.perf_counter()
+    if search_after_id: root.after_cancel(search_after_id)
+    search_after_id = root.after(SEARCH_DEBOUNCE_MS, start_background_search)
+
+def start_background_search():
+    global search_after_id, pending_view
+    search_after_id = None
+    text = search_var.get()
+    if is_fuzzy(text):
+        pending_view = FuzzyView(text)  # ranked by name similarity, in one page, never cached
+        search_worker.submit(*pending_view.first_page_query(), tag=pending_view); return
+    if current_sort_keys and not text.strip():
+        store = current_student_store()
+        if store is not None:
+            pending_view = None
+            start = time.perf_counter()
+            view = StoreView(store, current_sort_keys)
+            show_student_view(view, view.next_page(), 0.0, f"sorted in memory in {(time.perf_counter() - start) * 1000:.0f} ms")
+            return
+    # Searches are sorted in SQL, by the first key only.
+    sort_col_name, descending = current_sort_keys[0] if current_sort_keys else (None, False)
+    pending_view = StudentListView(text, sort_col_name, use_fts=students.use_fts, descending=descending)
+    rows = search_cache.first_page(pending_view)
+    if rows is not None:
+        view, pending_view = pending_view, None
+        show_student_view(view, rows, 0.0, "from cache"); return
+    search_worker.submit(*pending_view.first_page_query(PREFETCH_ROWS), tag=pending_view)
+
+def poll_search_results():
+    global pending_view
+    for generation, view, rows, error, query_ms in search_worker.drain():
+        if search_worker.is_stale(generation): continue
+        if error: messagebox.showerror("DB Error", f"Error loading students: {error}"); continue
+        if view is pending_view:
+            pending_view = None
+            if isinstance(view, StudentListView): search_cache.store(view, 0, rows, PREFETCH_ROWS)
+            show_student_view(view, rows[:view.page_size], query_ms)
+        elif view is student_view: search_cache.store(view, view.loaded, rows); append_student_page(rows)
+    for generation, view, rows, error, query_ms in count_worker.drain():
+        if view is student_view and rows: view.total = rows[0][0]; update_student_status()
+    root.after(SEARCH_POLL_MS, poll_search_results)
+
+def reload_student_view():
+    """Re-runs the current search and sort, e.g. after a write the grid can't be patched for."""
+    global search_after_id
+    if search_after_id: root.after_cancel(search_after_id)
+    start_background_search()
+
+@metrics.action("grid render")
+def show_student_view(view, rows, query_ms=None, source=None):
+    """Replaces the grid with the first page of a new view and starts counting its total."""
+    global student_view
+    student_view = view
+    for item in student_info.get_children(): student_info.delete(item)
+    for i, stud_row in enumerate(view.accept_page(rows)):
+        student_info.insert('', 'end', iid=stud_row[0], values=stud_row)
+        if i == 0 and query_ms is not None: student_info.update_idletasks(); report_search_latency(query_ms, source)
+    if not rows and query_ms is not None: report_search_latency(query_ms, source)
+    student_info.yview_moveto(0)
+    if view.total is None: count_worker.submit(*view.count_query(), tag=view)
+    update_student_status()
+
+@metrics.action("grid append page")
+def append_student_page(rows):
+    for stud_row in student_view.accept_page(rows): student_info.insert('', 'end', iid=stud_row[0], values=stud_row)
+    update_student_status()
+
+@metrics.action("grid patch")
+def sync_student_rows(idnums):
+    """Patches only the given students into the grid after a write (insert, update or delete).
+
+    Rows are keyed by idnum; the selection and the top visible row are kept.
+    Full reloads are left to search and sort changes.
+    """
+    if student_view is None or not idnums: return
+    if not student_view.patchable: reload_student_view(); return
+    store_view = isinstance(student_view, StoreView)
+    # A store can only follow the one write just made: anything else written since it was read isn't in idnums.
+    if store_view and student_view.store.generation != (connection_manager.write_generation - 1, students.data_version()):
+        reload_student_view(); return
+    try: rows = students.view_rows(student_view, idnums)
+    except sql.Error as e: messagebox.showerror("DB Error", f"Error loading students: {e}"); return
+    top_iid = student_info.identify_row(1)
+    selection = set(student_info.selection())
+    for op in student_view.apply_rows(idnums, rows):
+        if op[0] == "delete":
+            if student_info.exists(op[1]): student_info.delete(op[1])
+        elif op[0] == "update": student_info.item(op[1], values=op[2])
+        else:
+            _, index, values = op
+            student_info.insert('', index, iid=values[0], values=values)
+            if values[0] in selection: student_info.selection_add(values[0])
+    if top_iid and student_info.exists(top_iid):
+        student_info.yview_moveto(student_info.index(top_iid) / max(len(student_view.ids), 1))
+    if store_view: student_view.store.generation = data_generation()
+    else: count_worker.submit(*student_view.count_query(), tag=student_view)
+    update_student_status()
+
+# --- Changes from other stations ---
+# PRAGMA data_version moves when another connection commits. The loaded rows and
+# any students added since the last look are then reread and patched in; a view
+# that can't be patched, or holds too many rows to reread, is reloaded instead.
+STUDENT_POLL_MS = 1000
+seen_data_version = None
+seen_rowid = 0
+
+def poll_student_changes():
+    global seen_data_version, seen_rowid
+    try:
+        version = students.data_version()
+        if version != seen_data_version:
+            first_look, seen_data_version = seen_data_version is None, version
+            seen_rowid, added = students.added_since(seen_rowid, BULK_PATCH_LIMIT + 1)
+            if staging_queue is not None and staging_queue.ids is not None: staging_queue.ids.update(added)
+            if not first_look and student_view is not None and pending_view is None:
+                idnums = list(dict.fromkeys(getattr(student_view, "ids", [])[:BULK_PATCH_LIMIT + 1] + added))
+                if not student_view.patchable or len(idnums) > BULK_PATCH_LIMIT: reload_student_view()
+                elif idnums: sync_student_rows(idnums)
+    except sql.Error: pass  # e.g. the database is locked; try again on the next poll
+    root.after(STUDENT_POLL_MS, poll_student_changes)
+
+def load_next_student_page():
+    if student_view is None or pending_view is not None or not student_view.wants_more(): return
+    student_view.loading = True
+    rows = student_view.next_page() if isinstance(student_view, StoreView) else search_cache.next_page(student_view)
+    if rows is not None:
+        view = student_view  # appended once this scroll event is done
+        root.after_idle(lambda: view is student_view and append_student_page(rows)); return
+    search_worker.submit(*student_view.next_page_query(), tag=student_view)
+
+def on_student_yscroll(first, last):
+    yscroll_tree.set(first, last)
+    if float(last) >= PREFETCH_AT: load_next_student_page()
+
+def report_search_latency(query_ms, source=None):
+    """Records the time from the last keystroke to the first rendered row."""
+    global search_latency_text
+    if last_keystroke_at is None: return
+    latency_ms = (time.perf_counter() - last_keystroke_at) * 1000
+    metrics.record_action("search keystroke", latency_ms)
+    source = source or f"query {query_ms:.0f} ms"
+    search_latency_text = f"keystroke to first row: {latency_ms:.0f} ms (debounce {SEARCH_DEBOUNCE_MS} ms, {source})"
+
+def update_student_status():
+    text = student_view.status_text() if student_view else ""
+    search_status_var.set(f"{text}  |  {search_latency_text}" if search_latency_text else text)
+
+def sort_by_column_action(column_display_name):
+    apply_sort_keys([(column_display_name, False)])
+
+def sort_by_heading(heading, add_key=False):
+    """Click: sort by the column, or reverse it if it already leads.
+    Shift-click: add the column as the next sort key, or reverse it if it is one."""
+    keys = dict(current_sort_keys if add_key else current_sort_keys[:1])
+    if heading in keys: keys[heading] = not keys[heading]
+    elif add_key: keys[heading] = False
+    else: keys = {heading: False}
+    apply_sort_keys(list(keys.items()))
+
+def on_heading_shift_click(event):
+    if student_info.identify_region(event.x, event.y) != "heading": return
+    sort_by_heading(student_info_cols[int(student_info.identify_column(event.x)[1:]) - 1], add_key=True)
+    return "break"
+
+def apply_sort_keys(sort_keys):
+    global current_sort_keys, last_keystroke_at
+    current_sort_keys = sort_keys
+    for heading in student_info_cols: student_info.heading(heading, text=heading)
+    for i, (heading, descending) in enumerate(sort_keys):
+        student_info.heading(heading, text=f"{heading} {'▼' if descending else '▲'}{i + 1 if len(sort_keys) > 1 else ''}")
+    last_keystroke_at = time.perf_counter()
+    reload_student_view()
+
+# --- In-memory sorting ---
+# Sorting the unfiltered list by one or more headings is done in a StudentStore,
+# loaded on a background thread the first time it is needed and again after
+# writes; until it is current, the grid sorts in SQL by the first key.
+STORE_POLL_MS = 100
+student_store = None
+student_store_task = None
+
+def current_student_store():
+    """Returns the store if it matches the database; otherwise starts (re)loading it and returns None."""
+    global student_store_task
+    generation = data_generation()
+    if student_store is not None and student_store.generation == generation: return student_store
+    if student_store_task is None:
+        student_store_task = BackgroundTask(load_student_store, generation, name="student-store", connections=connection_manager).start()
+        root.after(STORE_POLL_MS, poll_student_store)
+    return None
+
+def load_student_store(generation, progress, cancelled):
+    conn = get_db_connection()
+    try: return StudentStore.load(conn, generation, cancelled)
+    finally: release_db_connection(conn)
+
+def poll_student_store():
+    global student_store, student_store_task
+    for kind, value in student_store_task.drain():
+        if kind == "progress": continue
+        student_store_task = None
+        if kind == "error": show_status_note(f"sorting in SQL, the in-memory store failed to load: {value}"); return
+        student_store = value
+        if current_sort_keys and not search_var.get().strip(): reload_student_view()
+        return
+    root.after(STORE_POLL_MS, poll_student_store)
+
 
-def update_search_suggestions(event=None): refresh_student_treeview(search_query=search_var.get())
-def sort_by_column_action(column_display_name): refresh_student_treeview(search_query=search_var.get(), sort_col_name=column_display_name)
 def validate_idnum_format(new_value): return re.match(r'^\d{0,4}(-\d{0,4})?$', new_value) is not None
 
-# --- UI Setup ---
-root = Tk()
-root.title("Student System Information (SSIS - Pure SQLite v3)")
-root.geometry("1450x550")
-frame = Frame(root, bg="#f0f0f0", bd=5, relief=RIDGE); frame.place(relwidth=1, relheight=1)
-idnum_var, fname_var, lname_var, sex_var = StringVar(), StringVar(), StringVar(), StringVar()
-progcode_var, year_var, collname_var, collcode_var, search_var = StringVar(), StringVar(), StringVar(), StringVar(), StringVar()
-year_var.set("1")
-
-# Student Info Input Section
-StuInfo = LabelFrame(frame, text="Student Information", font=("Arial", 12, "bold"), bg="#e0e0e0", bd=5, relief=RIDGE)
-StuInfo.grid(row=0, column=0, padx=10, pady=5, sticky="ew")
-Label(StuInfo, text="ID Number:").grid(row=0, column=0, padx=5, pady=2, sticky="w")
-vcmd_id = (root.register(validate_idnum_format), '%P')
-Entry(StuInfo, textvariable=idnum_var, font=("Arial", 10), validate='key', validatecommand=vcmd_id, width=25).grid(row=0, column=1, padx=5, pady=2, sticky="ew")
-Label(StuInfo, text="First Name:").grid(row=1, column=0, padx=5, pady=2, sticky="w")
-Entry(StuInfo, textvariable=fname_var, font=("Arial", 10), width=25).grid(row=1, column=1, padx=5, pady=2, sticky="ew")
-Label(StuInfo, text="Last Name:").grid(row=2, column=0, padx=5, pady=2, sticky="w")
-Entry(StuInfo, textvariable=lname_var, font=("Arial", 10), width=25).grid(row=2, column=1, padx=5, pady=2, sticky="ew")
-Label(StuInfo, text="Sex:").grid(row=3, column=0, padx=5, pady=2, sticky="w")
-Gender_entry = ttk.Combobox(StuInfo, values=["F", "M"], textvariable=sex_var, font=("Arial", 10), state='readonly', width=22)
-Gender_entry.grid(row=3, column=1, padx=5, pady=2, sticky="ew"); Gender_entry.current(0) if Gender_entry['values'] else None
-StuInfo.grid_columnconfigure(1, weight=1)
-
-# College Info Input Section
-StuColl = LabelFrame(frame, text="College Information", font=("Arial", 12, "bold"), bg="#e0e0e0", bd=5, relief=RIDGE)
-StuColl.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
-Label(StuColl, text="College Name:").grid(row=0, column=0, padx=5, pady=2, sticky="w")
-CollName_entry = ttk.Combobox(StuColl, values=list(college_mapping_dict.keys()), textvariable=collname_var, font=("Arial", 10), state='readonly', width=40)
-CollName_entry.grid(row=0, column=1, padx=5, pady=2, sticky="ew"); CollName_entry.bind("<<ComboboxSelected>>", autofill_code)
-Label(StuColl, text="College Code:").grid(row=1, column=0, padx=5, pady=2, sticky="w")
-CollCode_entry = Entry(StuColl, textvariable=collcode_var, font=("Arial", 10), state='readonly', width=15)
-CollCode_entry.grid(row=1, column=1, padx=5, pady=2, sticky="w")
-StuColl.grid_columnconfigure(1, weight=1)
-
-# Program Info Input Section
-StuProg = LabelFrame(frame, text="Program Information", font=("Arial", 12, "bold"), bg="#e0e0e0", bd=5, relief=RIDGE)
-StuProg.grid(row=2, column=0, padx=10, pady=5, sticky="ew")
-Label(StuProg, text="Program Name:").grid(row=0, column=0, padx=5, pady=2, sticky="w")
-program_combobox = ttk.Combobox(StuProg, values=[], textvariable=progcode_var, font=("Arial", 10), state='readonly', width=40)
-program_combobox.grid(row=0, column=1, padx=5, pady=2, sticky="ew"); program_combobox.bind("<<ComboboxSelected>>", autofill_program_code_display)
-Label(StuProg, text="Program Code:").grid(row=1, column=0, padx=5, pady=2, sticky="w") # Display only
-ProgCode_entry = Entry(StuProg, font=("Arial", 10), state='readonly', width=40)
-ProgCode_entry.grid(row=1, column=1, padx=5, pady=2, sticky="ew")
-Label(StuProg, text="Year Level:").grid(row=2, column=0, padx=5, pady=2, sticky="w")
-Year_entry = ttk.Combobox(StuProg, values=[str(i) for i in range(1,6)], textvariable=year_var, font=("Arial", 10), state='readonly', width=5)
-Year_entry.grid(row=2, column=1, padx=5, pady=2, sticky="w"); Year_entry.set("1")
-StuProg.grid_columnconfigure(1, weight=1)
-
-# Save Student Button
-button_save = ttk.Button(frame, text="Save Student", command=save_student_to_db)
-button_save.grid(row=3, column=0, padx=10, pady=10, sticky="ew")
-
-# Student Display Section
-Saved_student_lf = LabelFrame(frame, text="Saved Students", font=("Arial", 12, "bold"), bg="#e0e0e0", bd=5, relief=RIDGE)
-Saved_student_lf.grid(row=0, column=1, rowspan=4, padx=10, pady=5, sticky="nsew")
-frame.grid_columnconfigure(0, weight=1); frame.grid_columnconfigure(1, weight=3)
-frame.grid_rowconfigure(0, weight=0);frame.grid_rowconfigure(1, weight=0);frame.grid_rowconfigure(2, weight=0); frame.grid_rowconfigure(3, weight=1)
-
-# Search and Action Buttons Bar
-Search_frame_top = Frame(Saved_student_lf, bg="#e0e0e0")
-Search_frame_top.pack(side=TOP, fill=X, padx=5, pady=5)
-Label(Search_frame_top, text="Search:", font=("Arial", 10), bg="#e0e0e0").pack(side=LEFT, padx=(0,5))
-search_entry = Entry(Search_frame_top, textvariable=search_var, font=("Arial", 10), width=25)
-search_entry.pack(side=LEFT, padx=5); search_entry.bind('<KeyRelease>', update_search_suggestions)
-edit_menu_button = Menubutton(Search_frame_top, text="Edit", relief=RAISED, font=("Arial", 10)); edit_menu_button.pack(side=LEFT, padx=5)
-edit_menu = Menu(edit_menu_button, tearoff=0); edit_menu_button.config(menu=edit_menu)
-edit_menu.add_command(label="Edit Selected Student", command=open_edit_student_window)
-edit_menu.add_command(label="Edit College Info", command=open_edit_college_window)
-edit_menu.add_command(label="Add New College", command=open_add_college_window)
-delete_menu_button = Menubutton(Search_frame_top, text="Delete", relief=RAISED, font=("Arial", 10)); delete_menu_button.pack(side=LEFT, padx=5)
-delete_menu = Menu(delete_menu_button, tearoff=0); delete_menu_button.config(menu=delete_menu)
-delete_menu.add_command(label="Delete Selected Student(s)", command=delete_selected_students)
-delete_menu.add_command(label="Delete College", command=open_delete_college_window)
-sort_menu_button = Menubutton(Search_frame_top, text="Sort By", relief=RAISED, font=("Arial", 10)); sort_menu_button.pack(side=LEFT, padx=5)
-sort_menu = Menu(sort_menu_button, tearoff=0); sort_menu_button.config(menu=sort_menu)
-sort_menu.add_command(label="ID Number", command=lambda: sort_by_column_action("ID Number"))
-sort_menu.add_command(label="First Name", command=lambda: sort_by_column_action("First Name"))
-sort_menu.add_command(label="Last Name", command=lambda: sort_by_column_action("Last Name"))
-
-# Treeview for Student Data
-Data_display_frame = Frame(Saved_student_lf, bg="#f0f0f0", bd=2, relief=SUNKEN)
-Data_display_frame.pack(side=TOP, fill=BOTH, expand=True, padx=5, pady=5)
-yscroll_tree = Scrollbar(Data_display_frame, orient=VERTICAL); xscroll_tree = Scrollbar(Data_display_frame, orient=HORIZONTAL)
-student_info_cols = ("ID Number", "First Name", "Last Name", "Sex", "Program Code", "Year Level", "College Name", "College Code")
-student_info = ttk.Treeview(Data_display_frame, columns=student_info_cols, yscrollcommand=yscroll_tree.set, xscrollcommand=xscroll_tree.set)
-yscroll_tree.config(command=student_info.yview); xscroll_tree.config(command=student_info.xview)
-yscroll_tree.pack(side=RIGHT, fill=Y); xscroll_tree.pack(side=BOTTOM, fill=X); student_info.pack(fill=BOTH, expand=True)
-for col_name in student_info_cols: student_info.heading(col_name, text=col_name); student_info.column(col_name, width=120, anchor='w')
-student_info['show'] = 'headings'
-
-if list(college_mapping_dict.keys()): CollName_entry.current(0); autofill_code(None)
-refresh_student_treeview()
-
-root.mainloop()
\ No newline at end of file
+# --- Startup and UI Setup ---
+# Nothing above touches the database or Tk at import time, so the functions and
+# repositories can be imported headless (see cli.py).
+if __name__ == "__main__":
+    mark_startup("imports")
+    initialize_database()  # no DDL unless the schema is behind
+    mark_startup("schema")
+    search_worker = SearchWorker(connection_manager)
+    count_worker = SearchWorker(connection_manager)
+
+    root = Tk()
+    root.title("Student System Information (SSIS - Pure SQLite v3)")
+    root.geometry("1450x550")
+    frame = Frame(root, bg="#f0f0f0", bd=5, relief=RIDGE); frame.place(relwidth=1, relheight=1)
+    idnum_var, fname_var, lname_var, sex_var = StringVar(), StringVar(), StringVar(), StringVar()
+    progcode_var, year_var, collname_var, collcode_var, search_var = StringVar(), StringVar(), StringVar(), StringVar(), StringVar()
+    search_status_var = StringVar()
+    year_var.set("1")
+
+    # Student Info Input Section
+    StuInfo = LabelFrame(frame, text="Student Information", font=("Arial", 12, "bold"), bg="#e0e0e0", bd=5, relief=RIDGE)
+    StuInfo.grid(row=0, column=0, padx=10, pady=5, sticky="ew")
+    Label(StuInfo, text="ID Number:").grid(row=0, column=0, padx=5, pady=2, sticky="w")
+    vcmd_id = (root.register(validate_idnum_format), '%P')
+    idnum_entry = Entry(StuInfo, textvariable=idnum_var, font=("Arial", 10), validate='key', validatecommand=vcmd_id, width=25)
+    idnum_entry.grid(row=0, column=1, padx=5, pady=2, sticky="ew"); idnum_entry.bind("<Return>", on_form_return)
+    Label(StuInfo, text="First Name:").grid(row=1, column=0, padx=5, pady=2, sticky="w")
+    fname_entry = Entry(StuInfo, textvariable=fname_var, font=("Arial", 10), width=25)
+    fname_entry.grid(row=1, column=1, padx=5, pady=2, sticky="ew"); fname_entry.bind("<Return>", on_form_return)
+    Label(StuInfo, text="Last Name:").grid(row=2, column=0, padx=5, pady=2, sticky="w")
+    lname_entry = Entry(StuInfo, textvariable=lname_var, font=("Arial", 10), width=25)
+    lname_entry.grid(row=2, column=1, padx=5, pady=2, sticky="ew"); lname_entry.bind("<Return>", on_form_return)
+    Label(StuInfo, text="Sex:").grid(row=3, column=0, padx=5, pady=2, sticky="w")
+    Gender_entry = ttk.Combobox(StuInfo, values=["F", "M"], textvariable=sex_var, font=("Arial", 10), state='readonly', width=22)
+    Gender_entry.grid(row=3, column=1, padx=5, pady=2, sticky="ew"); Gender_entry.current(0) if Gender_entry['values'] else None
+    StuInfo.grid_columnconfigure(1, weight=1)
+
+    # College Info Input Section
+    StuColl = LabelFrame(frame, text="College Information", font=("Arial", 12, "bold"), bg="#e0e0e0", bd=5, relief=RIDGE)
+    StuColl.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
+    Label(StuColl, text="College Name:").grid(row=0, column=0, padx=5, pady=2, sticky="w")
+    CollName_entry = ttk.Combobox(StuColl, values=[], textvariable=collname_var, font=("Arial", 10), state='readonly', width=40)
+    CollName_entry.grid(row=0, column=1, padx=5, pady=2, sticky="ew"); CollName_entry.bind("<<ComboboxSelected>>", autofill_code)
+    Label(StuColl, text="College Code:").grid(row=1, column=0, padx=5, pady=2, sticky="w")
+    CollCode_entry = Entry(StuColl, textvariable=collcode_var, font=("Arial", 10), state='readonly', width=15)
+    CollCode_entry.grid(row=1, column=1, padx=5, pady=2, sticky="w")
+    StuColl.grid_columnconfigure(1, weight=1)
+
+    # Program Info Input Section
+    StuProg = LabelFrame(frame, text="Program Information", font=("Arial", 12, "bold"), bg="#e0e0e0", bd=5, relief=RIDGE)
+    StuProg.grid(row=2, column=0, padx=10, pady=5, sticky="ew")
+    Label(StuProg, text="Program Name:").grid(row=0, column=0, padx=5, pady=2, sticky="w")
+    program_combobox = ttk.Combobox(StuProg, values=[], textvariable=progcode_var, font=("Arial", 10), state='readonly', width=40)
+    program_combobox.grid(row=0, column=1, padx=5, pady=2, sticky="ew"); program_combobox.bind("<<ComboboxSelected>>", autofill_program_code_display)
+    Label(StuProg, text="Program Code:").grid(row=1, column=0, padx=5, pady=2, sticky="w") # Display only
+    ProgCode_entry = Entry(StuProg, font=("Arial", 10), state='readonly', width=40)
+    ProgCode_entry.grid(row=1, column=1, padx=5, pady=2, sticky="ew")
+    Label(StuProg, text="Year Level:").grid(row=2, column=0, padx=5, pady=2, sticky="w")
+    Year_entry = ttk.Combobox(StuProg, values=[str(i) for i in range(1,6)], textvariable=year_var, font=("Arial", 10), state='readonly', width=5)
+    Year_entry.grid(row=2, column=1, padx=5, pady=2, sticky="w"); Year_entry.set("1")
+    StuProg.grid_columnconfigure(1, weight=1)
+
+    # Save Student Button
+    button_save = ttk.Button(frame, text="Save Student", command=save_student_to_db)
+    button_save.grid(row=3, column=0, padx=10, pady=10, sticky="ew")
+
+    # Student Display Section
+    Saved_student_lf = LabelFrame(frame, text="Saved Students", font=("Arial", 12, "bold"), bg="#e0e0e0", bd=5, relief=RIDGE)
+    Saved_student_lf.grid(row=0, column=1, rowspan=4, padx=10, pady=5, sticky="nsew")
+    frame.grid_columnconfigure(0, weight=1); frame.grid_columnconfigure(1, weight=3)
+    frame.grid_rowconfigure(0, weight=0);frame.grid_rowconfigure(1, weight=0);frame.grid_rowconfigure(2, weight=0); frame.grid_rowconfigure(3, weight=1)
+
+    # Search and Action Buttons Bar
+    Search_frame_top = Frame(Saved_student_lf, bg="#e0e0e0")
+    Search_frame_top.pack(side=TOP, fill=X, padx=5, pady=5)
+    Label(Search_frame_top, text="Search:", font=("Arial", 10), bg="#e0e0e0").pack(side=LEFT, padx=(0,5))
+    search_entry = Entry(Search_frame_top, textvariable=search_var, font=("Arial", 10), width=25)
+    search_entry.pack(side=LEFT, padx=5); search_entry.bind('<KeyRelease>', update_search_suggestions)
+    file_menu_button = Menubutton(Search_frame_top, text="File", relief=RAISED, font=("Arial", 10)); file_menu_button.pack(side=LEFT, padx=5)
+    file_menu = Menu(file_menu_button, tearoff=0); file_menu_button.config(menu=file_menu)
+    file_menu.add_command(label="Import Students...", command=open_import_students_window)
+    file_menu.add_command(label="Export All Students...", command=lambda: open_export_students_window(False))
+    file_menu.add_command(label="Export Current View...", command=lambda: open_export_students_window(True))
+    file_menu.add_separator()
+    file_menu.add_command(label="Back Up Database...", command=open_backup_window)
+    file_menu.add_command(label="Compact Copy...", command=lambda: open_backup_window(compact=True))
+    file_menu.add_separator()
+    file_menu.add_command(label="Enrollment Statistics...", command=open_enrollment_stats_window)
+    file_menu.add_command(label="Possible Duplicates...", command=open_duplicates_window)
+    file_menu.add_command(label="Search Cache Statistics", command=lambda: messagebox.showinfo("Search Cache", search_cache.stats_text()))
+    file_menu.add_command(label="Diagnostics...", command=open_diagnostics_window)
+    edit_menu_button = Menubutton(Search_frame_top, text="Edit", relief=RAISED, font=("Arial", 10)); edit_menu_button.pack(side=LEFT, padx=5)
+    edit_menu = Menu(edit_menu_button, tearoff=0); edit_menu_button.config(menu=edit_menu)
+    edit_menu.add_command(label="Edit Selected Student", command=open_edit_student_window)
+    edit_menu.add_command(label="Bulk Change Students...", command=open_bulk_change_window)
+    edit_menu.add_command(label="Rapid Entry...", command=open_rapid_entry_window)
+    edit_menu.add_command(label="Edit College Info", command=open_edit_college_window)
+    edit_menu.add_command(label="Add New College", command=open_add_college_window)
+    delete_menu_button = Menubutton(Search_frame_top, text="Delete", relief=RAISED, font=("Arial", 10)); delete_menu_button.pack(side=LEFT, padx=5)
+    delete_menu = Menu(delete_menu_button, tearoff=0); delete_menu_button.config(menu=delete_menu)
+    delete_menu.add_command(label="Delete Selected Student(s)", command=delete_selected_students)
+    delete_menu.add_command(label="Delete College", command=open_delete_college_window)
+    sort_menu_button = Menubutton(Search_frame_top, text="Sort By", relief=RAISED, font=("Arial", 10)); sort_menu_button.pack(side=LEFT, padx=5)
+    sort_menu = Menu(sort_menu_button, tearoff=0); sort_menu_button.config(menu=sort_menu)
+    sort_menu.add_command(label="ID Number", command=lambda: sort_by_column_action("ID Number"))
+    sort_menu.add_command(label="First Name", command=lambda: sort_by_column_action("First Name"))
+    sort_menu.add_command(label="Last Name", command=lambda: sort_by_column_action("Last Name"))
+    Label(Search_frame_top, text="Filters: ccode:CCS  yr:3  lname:santo*  sex:F  id:2023-*  ~dela crus (typos)", font=("Arial", 8), fg="#606060", bg="#e0e0e0").pack(side=LEFT, padx=10)
+
+    Label(Saved_student_lf, textvariable=search_status_var, font=("Arial", 9), fg="#404040", bg="#e0e0e0", anchor="w").pack(side=BOTTOM, fill=X, padx=5)
+
+    # Treeview for Student Data
+    Data_display_frame = Frame(Saved_student_lf, bg="#f0f0f0", bd=2, relief=SUNKEN)
+    Data_display_frame.pack(side=TOP, fill=BOTH, expand=True, padx=5, pady=5)
+    yscroll_tree = Scrollbar(Data_display_frame, orient=VERTICAL); xscroll_tree = Scrollbar(Data_display_frame, orient=HORIZONTAL)
+    student_info_cols = ("ID Number", "First Name", "Last Name", "Sex", "Program Code", "Year Level", "College Name", "College Code")
+    student_info = ttk.Treeview(Data_display_frame, columns=student_info_cols, yscrollcommand=on_student_yscroll, xscrollcommand=xscroll_tree.set)
+    yscroll_tree.config(command=student_info.yview); xscroll_tree.config(command=student_info.xview)
+    yscroll_tree.pack(side=RIGHT, fill=Y); xscroll_tree.pack(side=BOTTOM, fill=X); student_info.pack(fill=BOTH, expand=True)
+    for col_name in student_info_cols:
+        student_info.heading(col_name, text=col_name, command=lambda heading=col_name: sort_by_heading(heading))
+        student_info.column(col_name, width=120, anchor='w')
+    student_info.bind("<Shift-Button-1>", on_heading_shift_click)
+    student_info['show'] = 'headings'
+
+    mark_startup("window built")
+    root.update()  # put the first frame on screen before loading anything
+    mark_startup("first frame")
+    finish_startup()
+    poll_search_results()
+    root.after(CATALOG_POLL_MS, poll_catalog_changes)
+    poll_student_changes()
+    root.after(SNAPSHOT_POLL_MS, poll_snapshots)
+
+    root.mainloop()
@@ -0,0 +1,278 @@
+import json
+import sqlite3 as sql
+import time
+
+from db import (connection_manager, student_fts_available, seed_default_data, add_program, remove_program, write_students_bulk,
+                delete_students_bulk, change_students_bulk, rebuild_enrollment_stats, enrollment_stats_differences, is_busy_error,
+                retry_backoff, WRITE_RETRIES, BUSY_TIMEOUT_MS)
+from search import build_student_query, build_student_count_query
+from fuzzy import FUZZY_LIMIT, build_fuzzy_query
+
+
+STUDENT_INSERT_SQL = "INSERT INTO Students (idnum, fname, lname, sex, pcode, yrlvl, cname, ccode) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+STUDENT_UPDATE_SQL = ("UPDATE Students SET fname = ?, lname = ?, sex = ?, pcode = ?, yrlvl = ?, cname = ?, ccode = ?,"
+                      " version = version + 1 WHERE idnum = ?")
+STUDENT_UPDATE_IF_VERSION_SQL = STUDENT_UPDATE_SQL + " AND version = ?"
+STUDENT_DELETE_WHERE = "idnum IN (SELECT value FROM json_each(?))"
+BULK_WRITE_MIN_ROWS = 1000  # from here on, index the rows for search in one pass (see write_students_bulk)
+ENROLLMENT_STATS_DIMENSIONS = ("ccode", "pcode", "yrlvl", "sex")
+STUDENT_SELECT_SQL = ("SELECT idnum, fname, lname, sex, pcode, yrlvl, cname, ccode FROM Students"
+                      " WHERE idnum IN (SELECT value FROM json_each(?))")
+STUDENT_EXISTING_SQL = "SELECT idnum FROM Students WHERE idnum IN (SELECT value FROM json_each(?))"
+STUDENT_VERSION_SELECT_SQL = "SELECT idnum, fname, lname, sex, pcode, yrlvl, cname, ccode, version FROM Students WHERE idnum = ?"
+
+
+class _Repository:
+    """Runs work on the calling thread's connection from a ConnectionManager.
+
+    Writes commit before returning; a failed write is rolled back and the
+    sqlite3 error is raised to the caller. A write that finds the database
+    locked by another station is retried, write_retries times, with backoff,
+    so work must be rerunnable: build its parameters as lists, not generators.
+    busy_timeout_ms, if given, replaces the connection's busy timeout for the
+    writes, so a caller that can't wait long (the GUI) gives up sooner.
+    """
+
+    write_retries = WRITE_RETRIES
+    busy_timeout_ms = None
+
+    def __init__(self, connections=connection_manager, busy_timeout_ms=None, write_retries=None):
+        self.connections = connections
+        if busy_timeout_ms is not None: self.busy_timeout_ms = busy_timeout_ms
+        if write_retries is not None: self.write_retries = write_retries
+
+    def _read(self, query, params=()):
+        conn = self.connections.get()
+        try: return [tuple(row) for row in conn.execute(query, params).fetchall()]
+        finally: self.connections.release(conn)
+
+    def data_version(self):
+        """PRAGMA data_version of this thread's connection: it changes when another connection commits."""
+        return self._read("PRAGMA data_version")[0][0]
+
+    def _write(self, work):
+        conn = self.connections.get()
+        if self.busy_timeout_ms is not None: conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        try:
+            for attempt in range(self.write_retries + 1):
+                try:
+                    result = work(conn)
+                    conn.commit()
+                    break
+                except sql.OperationalError as e:
+                    conn.rollback()
+                    if attempt == self.write_retries or not is_busy_error(e): raise
+                    self.connections.busy_retries += 1
+                    time.sleep(retry_backoff(attempt))
+            self.connections.write_generation += 1
+            return result
+        finally:
+            if self.busy_timeout_ms is not None: conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            self.connections.release(conn)
+
+
+class StudentRepository(_Repository):
+    """Student reads and writes. Rows are tuples in Students column order:
+    (idnum, fname, lname, sex, pcode, yrlvl, cname, ccode)."""
+
+    def __init__(self, connections=connection_manager, use_fts=None, **write_options):
+        super().__init__(connections, **write_options)
+        self._use_fts = use_fts
+
+    @property
+    def use_fts(self):
+        if self._use_fts is None:
+            conn = self.connections.get()
+            try: self._use_fts = student_fts_available(conn)
+            finally: self.connections.release(conn)
+        return self._use_fts
+
+    def add_many(self, students):
+        """Inserts students in one transaction: all of them or, on a duplicate ID, none."""
+        students = list(students)
+        if len(students) < BULK_WRITE_MIN_ROWS:
+            return self._write(lambda conn: conn.executemany(STUDENT_INSERT_SQL, students).rowcount)
+        self._write(lambda conn: write_students_bulk(conn, STUDENT_INSERT_SQL, students))
+        return len(students)
+
+    def add(self, student):
+        return self.add_many([student])
+
+    def add_new(self, students):
+        """Inserts the students whose IDs are free with one executemany, in one transaction; returns the set of IDs found taken."""
+        students = list(students)
+
+        def work(conn):
+            conn.execute("BEGIN IMMEDIATE")  # no other station can take an ID between the check and the insert
+            taken = {row[0] for row in conn.execute(STUDENT_EXISTING_SQL, (json.dumps([student[0] for student in students]),)).fetchall()}
+            conn.executemany(STUDENT_INSERT_SQL, [student for student in students if student[0] not in taken])
+            return taken
+        return self._write(work)
+
+    def update_many(self, students):
+        """Overwrites students by idnum in one transaction; returns how many were found."""
+        params = [(*student[1:], student[0]) for student in students]  # a list: a retried write runs it again
+        return self._write(lambda conn: conn.executemany(STUDENT_UPDATE_SQL, params).rowcount)
+
+    def update_if_unchanged(self, student, version):
+        """Overwrites a student only if its version is still the one read; returns False if someone else saved first."""
+        return self._write(lambda conn: conn.execute(STUDENT_UPDATE_IF_VERSION_SQL, (*student[1:], student[0], version)).rowcount) > 0
+
+    def get_versioned(self, idnum):
+        """Returns (student, version), or None if there is no such student."""
+        rows = self._read(STUDENT_VERSION_SELECT_SQL, (idnum,))
+        return (rows[0][:8], rows[0][8]) if rows else None
+
+    def last_rowid(self):
+        return self._read("SELECT IFNULL(MAX(rowid), 0) FROM Students")[0][0]
+
+    def added_since(self, rowid, limit):
+        """Returns (last rowid, idnums) of up to limit students added after rowid."""
+        rows = self._read("SELECT rowid, idnum FROM Students WHERE rowid > ? ORDER BY rowid LIMIT ?", (rowid, limit))
+        return (rows[-1][0] if rows else rowid), [idnum for _, idnum in rows]
+
+    def delete_many(self, idnums):
+        idnums = json.dumps(list(idnums))
+        return len(self._write(lambda conn: delete_students_bulk(conn, STUDENT_DELETE_WHERE, (idnums,))))
+
+    def get_many(self, idnums):
+        return self._read(STUDENT_SELECT_SQL, (json.dumps(list(idnums)),))
+
+    def search(self, search_query=None, sort_col_name=None, limit=None):
+        """Returns the student list as the grid would show it (see build_student_query)."""
+        query, params = build_student_query(search_query, sort_col_name, self.use_fts)
+        if limit is not None: query += " LIMIT ?"; params = params + [limit]
+        return self._read(query, params)
+
+    def iter_search(self, search_query=None, sort_col_name=None, chunk_size=5000):
+        """Like search, but yields the rows a chunk at a time."""
+        conn = self.connections.get()
+        try:
+            cursor = conn.execute(*build_student_query(search_query, sort_col_name, self.use_fts))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows: return
+                yield from (tuple(row) for row in rows)
+        finally: self.connections.release(conn)
+
+    def iter_idnums(self, chunk_size=5000):
+        """Yields the IDs in use as lists of up to chunk_size."""
+        conn = self.connections.get()
+        try:
+            cursor = conn.execute("SELECT idnum FROM Students")
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows: return
+                yield [row[0] for row in rows]
+        finally: self.connections.release(conn)
+
+    def fuzzy_search(self, text, limit=FUZZY_LIMIT):
+        """Students whose names best match text, typos allowed, closest first; each row ends with its score."""
+        return self._read(*build_fuzzy_query(text, limit))
+
+    def count(self, search_query=None):
+        return self._read(*build_student_count_query(search_query, self.use_fts))[0][0]
+
+    def first_page(self, view, limit=None):
+        return self._read(*view.first_page_query(limit))
+
+    def next_page(self, view):
+        return self._read(*view.next_page_query())
+
+    def view_rows(self, view, idnums):
+        """Reads the given students as they would appear in a StudentListView (see apply_rows)."""
+        return self._read(*view.rows_query(idnums))
+
+
+class CollegeRepository(_Repository):
+    """Colleges and the programs they offer."""
+
+    def mapping(self):
+        """Returns {college name: college code}, by name."""
+        return dict(self._read("SELECT CollegeName, CollegeCode FROM Colleges ORDER BY CollegeName"))
+
+    def programs(self):
+        """Returns {college code: {program name: program code}}, programs in the order they were added."""
+        programs = {}
+        for ccode, pname, pcode in self._read("SELECT CollegeCode, ProgramName, ProgramCode FROM Programs ORDER BY rowid"):
+            programs.setdefault(ccode, {})[pname] = pcode
+        return programs
+
+    def seed_defaults(self):
+        """Fills an empty catalog with the default colleges; returns True if it did."""
+        return self._write(seed_default_data)
+
+    def add(self, name, code, program_names=()):
+        program_names = list(program_names)
+
+        def work(conn):
+            conn.execute("INSERT INTO Colleges (CollegeName, CollegeCode) VALUES (?, ?)", (name, code))
+            return [add_program(conn, code, program_name) for program_name in program_names]
+        return self._write(work)
+
+    def update(self, code, new_name, new_code, add_program_names=()):
+        """Renames/recodes a college and adds programs to it; its programs and students follow the new code."""
+        add_program_names = list(add_program_names)
+        found = []  # colleges updated, by the latest attempt
+
+        def recode(conn):
+            # A new code cascades to the college's students, so they are logged as changed.
+            students = [row[0] for row in conn.execute("SELECT idnum FROM Students WHERE ccode = ?", (code,)).fetchall()]
+            found.append(conn.execute("UPDATE Colleges SET CollegeName = ?, CollegeCode = ? WHERE CollegeCode = ?",
+                                      (new_name, new_code, code)).rowcount)
+            return students if new_code != code else []
+
+        def work(conn):
+            found.clear()
+            change_students_bulk(conn, recode)
+            for program_name in add_program_names: add_program(conn, new_code, program_name)
+            return found[0]
+        return self._write(work)
+
+    def delete(self, code):
+        """Deletes a college and its programs; its students keep their rows with college and program blanked."""
+        found = []  # colleges deleted, by the latest attempt
+
+        def blank(conn):
+            # Blanking ccode here too leaves the delete's ON DELETE SET NULL nothing to do, so
+            # each student is reindexed and logged once rather than once per statement.
+            students = conn.execute("UPDATE Students SET cname = NULL, pcode = NULL, ccode = NULL, version = version + 1 WHERE ccode = ?"
+                                    " RETURNING idnum", (code,)).fetchall()
+            found.append(conn.execute("DELETE FROM Colleges WHERE CollegeCode = ?", (code,)).rowcount)
+            return [row[0] for row in students]
+
+        def work(conn):
+            found.clear()
+            change_students_bulk(conn, blank)
+            return found[0]
+        return self._write(work)
+
+    def add_programs(self, code, program_names):
+        program_names = list(program_names)
+        return self._write(lambda conn: [add_program(conn, code, program_name) for program_name in program_names])
+
+    def remove_programs(self, program_codes):
+        program_codes = list(program_codes)
+        return self._write(lambda conn: sum(remove_program(conn, program_code) for program_code in program_codes))
+
+
+class EnrollmentStatsRepository(_Repository):
+    """Headcounts from the trigger-maintained EnrollmentStats table; a blank key part is ''."""
+
+    def totals(self, dimensions=ENROLLMENT_STATS_DIMENSIONS):
+        """Returns [(*group, students)] summed over the given key columns, in group order."""
+        dimensions = [d for d in ENROLLMENT_STATS_DIMENSIONS if d in dimensions]
+        if not dimensions: return self._read("SELECT IFNULL(SUM(students), 0) FROM EnrollmentStats")
+        columns = ", ".join(dimensions)
+        return self._read(f"SELECT {columns}, SUM(students) FROM EnrollmentStats GROUP BY {columns} ORDER BY {columns}")
+
+    def verify(self):
+        """Recounts every group from Students; returns [(group, maintained, counted)] that disagree."""
+        conn = self.connections.get()
+        try:
+            conn.execute("BEGIN")  # both counts from one snapshot
+            return enrollment_stats_differences(conn)
+        finally: self.connections.release(conn)
+
+    def rebuild(self):
+        self._write(rebuild_enrollment_stats)
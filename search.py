@@ -0,0 +1,279 @@
+import functools
+import json
+import re
+import unicodedata
+
+
+STUDENT_COLUMNS = ("idnum", "fname", "lname", "sex", "pcode", "yrlvl", "cname", "ccode")
+
+DB_COLUMN_MAP = {"ID Number": "idnum", "First Name": "fname", "Last Name": "lname", "Sex": "sex",
+                 "Program Code": "pcode", "Year Level": "yrlvl", "College Name": "cname", "College Code": "ccode"}
+
+SELECT_COLUMNS = "s.idnum, s.fname, s.lname, s.sex, s.pcode, s.yrlvl, s.cname, s.ccode"
+
+# ORDER BY keys per column. Text sorts are case-insensitive, and the extra keys
+# follow the column order of the matching index so the index can serve the sort.
+SORT_KEY_SQL = {"idnum": ("s.idnum",), "fname": ("s.fname COLLATE NOCASE",),
+                "lname": ("s.lname COLLATE NOCASE", "s.fname COLLATE NOCASE"),
+                "sex": ("s.sex",), "pcode": ("s.pcode",), "yrlvl": ("s.yrlvl",),
+                "cname": ("s.cname COLLATE NOCASE",), "ccode": ("s.ccode", "s.yrlvl")}
+UNIQUE_SORT_COLUMNS = {"idnum"}
+# Every Students column but the idnum key may be NULL (see db.STUDENTS_DDL): names written
+# through update_many, program and college blanked when a college is deleted.
+NULLABLE_COLUMNS = set(STUDENT_COLUMNS) - {"idnum"}
+PAGE_SIZE = 200
+
+# field:value filters accepted in the search box, e.g. "ccode:CCS yr:3 lname:santo* id:2023-*".
+# pcode: matches the program code, program: the program name.
+FIELD_ALIASES = {"id": "idnum", "idnum": "idnum", "fname": "fname", "first": "fname", "lname": "lname", "last": "lname",
+                 "sex": "sex", "pcode": "pcode", "prog": "program", "program": "program", "yr": "yrlvl", "year": "yrlvl",
+                 "yrlvl": "yrlvl", "cname": "cname", "college": "cname", "ccode": "ccode", "grad": "graduated",
+                 "graduated": "graduated"}
+NOCASE_COLUMNS = {"fname", "lname", "cname", "program"}  # compared case-insensitively (NOCASE indexes)
+UPPERCASE_COLUMNS = {"sex", "ccode", "pcode"}   # stored upper-case, compared exactly
+INTEGER_COLUMNS = {"yrlvl", "graduated"}
+
+SEARCH_TOKEN_RE = re.compile(r'(?:(\w+):)?(?:"([^"]*)"|(\S+))')
+RANGE_OP_RE = re.compile(r'^(>=|<=|>|<)(.+)$')
+
+# Same notion of a token as FTS5's unicode61 tokenizer: runs of letters/digits.
+FTS_TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+def build_fts_query(search_query):
+    """Turns search box text into an FTS5 MATCH expression, or None if it has no tokens.
+
+    Every whitespace-separated term becomes a phrase whose last token is a prefix,
+    so "2023-03" matches ID 2023-0360 and "dela cr" matches Dela Cruz.
+    """
+    phrases = []
+    for term in search_query.split():
+        tokens = FTS_TOKEN_RE.findall(term)
+        if tokens: phrases.append('"' + ' '.join(tokens) + '"*')
+    return ' '.join(phrases) or None
+
+
+# --- Matching free text in Python ---
+# Mirrors the SQL for free search text so rows already read for "san" can be
+# filtered down to "sant" without a query (see SearchCache).
+SEARCHED_COLUMN_INDEXES = (0, 1, 2, 3, 4, 6, 7)  # every student column but yrlvl, as in StudentsFTS
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+def _fold(text):
+    """unicode61 with remove_diacritics 2: lower-cased, accents dropped."""
+    if text.isascii(): return text.lower()
+    return "".join(c for c in unicodedata.normalize("NFKD", text.lower()) if not unicodedata.combining(c))
+
+# A value's tokens, each preceded by a space: the phrase prefix "dela cr"* is then
+# the substring " dela cr", and values joined by newlines keep phrases in one column.
+@functools.lru_cache(maxsize=1 << 16)  # names and codes repeat a lot
+def _value_tokens(value):
+    return "".join(" " + token for token in FTS_TOKEN_RE.findall(_fold(value)))
+
+def _ascii_lower(value):
+    return value.lower() if value.isascii() else value.translate(_ASCII_LOWER)
+
+def searches_fts(text, use_fts):
+    """Whether free text is matched through StudentsFTS; text without tokens falls back to LIKE."""
+    return bool(use_fts and text and build_fts_query(text))
+
+def free_text_matcher(text, use_fts):
+    """Returns matches(row) for free search text on a student row, or None if Python can't mirror the SQL."""
+    if searches_fts(text, use_fts):
+        phrases = [_value_tokens(term) for term in text.split()]
+        phrases = [phrase for phrase in phrases if phrase]
+        def matches(row):
+            tokens = "\n".join(_value_tokens(row[i]) for i in SEARCHED_COLUMN_INDEXES if row[i] is not None)
+            return all(phrase in tokens for phrase in phrases)
+        return matches
+    if "%" in text or "_" in text: return None  # LIKE wildcards
+    needle = _ascii_lower(text)
+    return lambda row: any(row[i] is not None and needle in _ascii_lower(row[i]) for i in SEARCHED_COLUMN_INDEXES)
+
+
+def _prefix_upper_bound(prefix):
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def compile_filter(column, value):
+    """Compiles one field:value filter to (sql, params), or None if the value doesn't fit the column.
+
+    Supports equality ("yr:3"), prefix ("lname:santo*"), comparison ("yr:>=3")
+    and inclusive range ("yr:2..4") predicates, all written so an index on the
+    column can serve them.
+    """
+    value = value.strip()
+    if not value: return None
+    if column == "program":
+        # Program names live in Programs; match them there and filter by code.
+        compiled = _compile_predicate("ProgramName COLLATE NOCASE", value, integer=False, fold=True)
+        if not compiled: return None
+        clause, params = compiled
+        return f"s.pcode IN (SELECT ProgramCode FROM Programs WHERE {clause})", params
+    if column in UPPERCASE_COLUMNS: value = value.upper()
+    collate = " COLLATE NOCASE" if column in NOCASE_COLUMNS else ""
+    return _compile_predicate(f"s.{column}{collate}", value, integer=column in INTEGER_COLUMNS, fold=bool(collate))
+
+def _compile_predicate(col, value, integer, fold):
+    def literal(v):
+        if not integer: return v
+        try: return int(v)
+        except ValueError: return None
+
+    if ".." in value:
+        low, high = (literal(v.strip()) for v in value.split("..", 1))
+        if low is None or high is None: return None
+        return f"{col} BETWEEN ? AND ?", [low, high]
+    range_match = RANGE_OP_RE.match(value)
+    if range_match:
+        op, operand = range_match.groups()
+        operand = literal(operand.strip())
+        if operand is None or operand == "": return None
+        return f"{col} {op} ?", [operand]
+    if value.endswith("*") and not integer:
+        prefix = value.rstrip("*")
+        if not prefix: return None
+        if fold: prefix = prefix.lower()
+        return f"{col} >= ? AND {col} < ?", [prefix, _prefix_upper_bound(prefix)]
+    operand = literal(value)
+    if operand is None: return None
+    return f"{col} = ?", [operand]
+
+def parse_search(search_query):
+    """Splits search box text into compiled field filters and the remaining free text."""
+    filters, free_text = [], []
+    for match in SEARCH_TOKEN_RE.finditer(search_query):
+        field, quoted, bare = match.groups()
+        value = quoted if quoted is not None else bare
+        column = FIELD_ALIASES.get(field.lower()) if field else None
+        compiled = compile_filter(column, value) if column else None
+        if compiled: filters.append(compiled)
+        else: free_text.append(match.group(0))
+    return filters, " ".join(free_text)
+
+def _student_source(search_query, use_fts, by_idnum=False):
+    """Returns (from_sql, conditions, params, ranked) for the filtered student set.
+
+    by_idnum is for lookups of a few known students: Students is then forced to
+    be the outer loop so the FTS index is only probed for those rows.
+    """
+    from_sql = "Students s"
+    conditions, params = [], []
+    filters, text = parse_search(search_query) if search_query else ([], "")
+    match_expr = build_fts_query(text) if text and use_fts else None
+    if match_expr:
+        from_sql += f" {'CROSS JOIN' if by_idnum else 'JOIN'} StudentsFTS ON StudentsFTS.rowid = s.rowid"
+        conditions.append("StudentsFTS MATCH ?"); params.append(match_expr)
+    elif text:
+        search_like = f"%{text}%"
+        conditions.append("(s.idnum LIKE ? OR s.fname LIKE ? OR s.lname LIKE ? OR s.sex LIKE ? OR s.pcode LIKE ? OR s.cname LIKE ? OR s.ccode LIKE ?)")
+        params.extend([search_like] * 7)
+    for clause, values in filters:
+        conditions.append(clause); params.extend(values)
+    return from_sql, conditions, params, match_expr is not None
+
+def _where(conditions):
+    return " WHERE " + " AND ".join(conditions) if conditions else ""
+
+def build_student_query(search_query=None, sort_col_name=None, use_fts=False):
+    """Returns (sql, params) for the student list, optionally filtered and sorted.
+
+    field:value filters in the search text become per-column predicates; any
+    other text is searched across all columns, through the StudentsFTS index
+    when use_fts is set (ranked by relevance unless a sort column is given).
+    """
+    from_sql, conditions, params, ranked = _student_source(search_query, use_fts)
+    query = f"SELECT {SELECT_COLUMNS} FROM {from_sql}{_where(conditions)}"
+    order_by = "StudentsFTS.rank" if ranked else None
+    if sort_col_name:
+        actual_db_col = DB_COLUMN_MAP.get(sort_col_name)
+        if actual_db_col: order_by = ", ".join(SORT_KEY_SQL[actual_db_col])
+    if order_by: query += f" ORDER BY {order_by}"
+    return query, params
+
+def student_page_keys(sort_col_name=None, ranked=False):
+    """Returns (keys, nullable): the keyset a page is ordered and continued by, and which keys may be NULL.
+
+    The keys are the sort column's ORDER BY keys plus the rowid as a unique
+    tiebreaker (every index ends in the rowid, so it costs no extra sort).
+    """
+    actual_db_col = DB_COLUMN_MAP.get(sort_col_name) if sort_col_name else None
+    if actual_db_col:
+        keys = SORT_KEY_SQL[actual_db_col]
+        if actual_db_col not in UNIQUE_SORT_COLUMNS: keys = keys + ("s.rowid",)
+        return keys, tuple(key.split()[0][len("s."):] in NULLABLE_COLUMNS for key in keys)
+    if ranked: return ("StudentsFTS.rank", "s.rowid"), (False, False)
+    return ("s.rowid",), (False,)
+
+def _row_value(items):
+    return items[0] if len(items) == 1 else f"({', '.join(items)})"
+
+def _keyset_condition(keys, after, descending, nullable):
+    op = "<" if descending else ">"
+    # A row-value comparison involving NULL is never true. Ascending, NULLs sort
+    # first, so the rows it drops are all before a non-NULL cursor anyway.
+    if not any(nullable) or (not descending and None not in after):
+        return f"{_row_value(keys)} {op} {_row_value(['?'] * len(keys))}", list(after)
+    return _keys_after(keys, after, op, nullable)
+
+def _keys_after(keys, after, op, nullable):
+    """The comparison spelled out key by key: after on the first key, or equal to
+    it and after on the rest, NULL sorting first ascending and last descending."""
+    key, value = keys[0], after[0]
+    parts, params = [], []
+    if value is None:
+        if op == ">": parts.append(f"{key} IS NOT NULL")
+    else:
+        parts.append(f"{key} {op} ?" + (f" OR {key} IS NULL" if op == "<" and nullable[0] else "")); params.append(value)
+    if len(keys) > 1:
+        rest, rest_params = _keys_after(keys[1:], after[1:], op, nullable[1:])
+        if value is None: parts.append(f"({key} IS NULL AND {rest})")
+        else: parts.append(f"({key} = ? AND {rest})"); params.append(value)
+        params += rest_params
+    return (f"({' OR '.join(parts)})" if parts else "0"), params
+
+def build_student_page_query(search_query=None, sort_col_name=None, use_fts=False, descending=False,
+                             after=None, limit=PAGE_SIZE):
+    """Returns (sql, params, keys) for one page of the student list.
+
+    Pages are read with keyset pagination: each row carries its key columns
+    after the eight student columns, and the next page starts strictly after
+    the last row's key, so every page is an index range read however deep the
+    user has scrolled.
+    """
+    from_sql, conditions, params, ranked = _student_source(search_query, use_fts)
+    keys, nullable = student_page_keys(sort_col_name, ranked)
+    if after is not None:
+        condition, values = _keyset_condition(keys, after, descending, nullable)
+        conditions = conditions + [condition]; params = params + values
+    direction = " DESC" if descending else ""
+    key_select = ", ".join(f"{key} AS _key{i}" for i, key in enumerate(keys))
+    order_by = ", ".join(f"_key{i}{direction}" for i in range(len(keys)))
+    query = f"SELECT {SELECT_COLUMNS}, {key_select} FROM {from_sql}{_where(conditions)} ORDER BY {order_by} LIMIT ?"
+    return query, params + [limit], keys
+
+def build_student_rows_query(search_query=None, sort_col_name=None, use_fts=False, idnums=()):
+    """Returns (sql, params) fetching the given students, with page keys, if they are in the list.
+
+    Used to patch the grid after a write: a student missing from the result
+    is either gone or no longer matches the search.
+    """
+    from_sql, conditions, params, ranked = _student_source(search_query, use_fts, by_idnum=True)
+    keys, _ = student_page_keys(sort_col_name, ranked)
+    key_select = ", ".join(f"{key} AS _key{i}" for i, key in enumerate(keys))
+    conditions = ["s.idnum IN (SELECT value FROM json_each(?))"] + conditions
+    params = [json.dumps(list(idnums))] + params
+    return f"SELECT {SELECT_COLUMNS}, {key_select} FROM {from_sql}{_where(conditions)}", params
+
+def build_student_target_query(search_query=None, use_fts=False, idnums=None):
+    """Returns (sql, params) selecting the rowids of the students a bulk change applies to.
+
+    idnums, if given, are the selected students; otherwise it is every student
+    the search box text matches.
+    """
+    if idnums is not None: return "SELECT s.rowid FROM Students s WHERE s.idnum IN (SELECT value FROM json_each(?))", [json.dumps(list(idnums))]
+    from_sql, conditions, params, _ = _student_source(search_query, use_fts)
+    return f"SELECT s.rowid FROM {from_sql}{_where(conditions)}", params
+
+def build_student_count_query(search_query=None, use_fts=False):
+    from_sql, conditions, params, _ = _student_source(search_query, use_fts)
+    return f"SELECT COUNT(*) FROM {from_sql}{_where(conditions)}", params
@@ -0,0 +1,164 @@
+import sys
+from collections import OrderedDict
+
+from search import STUDENT_COLUMNS, parse_search, searches_fts, free_text_matcher, student_page_keys
+
+
+DEFAULT_MAX_ENTRIES = 32
+DEFAULT_MAX_ROWS = 100000  # across all entries
+# First pages are read this far ahead: a sorted or ranked search sorts every match
+# anyway, and the extra rows are what narrower searches get filtered from.
+PREFETCH_ROWS = 1000
+
+
+def _row_size(row):
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+
+
+class _Entry:
+    """Page rows read so far for one query, with their key columns, in grid order."""
+
+    def __init__(self, keys, rows=(), exhausted=False):
+        self.keys = keys
+        self.rows = list(rows)
+        self.exhausted = exhausted
+        self._size, self._sized_rows = 0, 0
+
+    def extend(self, rows):
+        self.rows.extend(rows)
+
+    @property
+    def size(self):
+        # Only needed for stats, so measured on demand and only for rows added since.
+        self._size += sum(_row_size(row) for row in self.rows[self._sized_rows:])
+        self._sized_rows = len(self.rows)
+        return self._size
+
+    def page(self, start, size):
+        rows = self.rows[start:start + size]
+        return rows if len(rows) == size or self.exhausted else None
+
+
+class SearchCache:
+    """LRU cache of the student grid's pages, keyed by parsed search, sort and direction.
+
+    Besides repeating a search, it answers without SQLite when:
+    - the search extends a cached one ("san" -> "sant", or an extra free-text
+      term): the cached rows are filtered in Python. Cached rows are a prefix
+      of the wider result in the same order, so the filtered rows are a prefix
+      of the narrower one, usable once they fill a page;
+    - only the sort changed and the cached result is complete: it is re-sorted.
+    Neither works for ranked (bm25) results. Any write, here or from another
+    connection, changes generation() and empties the cache.
+    """
+
+    def __init__(self, generation, max_entries=DEFAULT_MAX_ENTRIES, max_rows=DEFAULT_MAX_ROWS):
+        self._generation_of = generation
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._entries = OrderedDict()
+        self._generation = None
+        self.hits = self.refined = self.resorted = self.misses = 0
+
+    def _current_generation(self):
+        generation = self._generation_of()
+        if generation != self._generation: self._entries.clear(); self._generation = generation
+        return generation
+
+    @staticmethod
+    def _key(view):
+        filters, text = parse_search(view.search_query) if view.search_query else ([], "")
+        filters = tuple(sorted((clause, tuple(params)) for clause, params in filters))
+        return filters, text, view.sort_col_name, view.descending, view.use_fts
+
+    def first_page(self, view):
+        """Returns the view's first page from the cache, or None if it has to be queried."""
+        view.first_page_query()  # sets up the view's key columns
+        view.cache_generation = self._current_generation()
+        key = self._key(view)
+        entry = self._entries.get(key)
+        if entry is not None: self.hits += 1; self._entries.move_to_end(key)
+        else:
+            entry = self._refine(view, key)
+            if entry is not None: self.refined += 1
+            else:
+                entry = self._resort(view, key)
+                if entry is None: self.misses += 1; return None
+                self.resorted += 1
+            self._add(key, entry)
+        return entry.page(0, view.page_size)
+
+    def next_page(self, view):
+        if view.cache_generation != self._current_generation(): return None
+        entry = self._entries.get(self._key(view))
+        rows = entry.page(view.loaded, view.page_size) if entry is not None else None
+        if rows is not None: self.hits += 1
+        return rows
+
+    def store(self, view, start, rows, limit=None):
+        """Records rows read from SQLite for the view.
+
+        start is how many rows the view had loaded before them and limit the
+        LIMIT they were read with, if not the view's page size.
+        """
+        if view.cache_generation != self._current_generation(): return
+        key = self._key(view)
+        entry = self._entries.get(key)
+        if start == 0: entry = _Entry(student_page_keys(view.sort_col_name, view.ranked)[0])
+        elif entry is None or len(entry.rows) != start or self.rows + len(rows) > self.max_rows: return
+        entry.extend(rows)
+        entry.exhausted = len(rows) < (limit or view.page_size)
+        self._add(key, entry)
+
+    def _add(self, key, entry):
+        self._entries[key] = entry; self._entries.move_to_end(key)
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self.rows > self.max_rows):
+            self._entries.popitem(last=False)
+
+    def _refine(self, view, key):
+        filters, text, sort_col_name, descending, use_fts = key
+        if view.ranked or not text: return None
+        matches = free_text_matcher(text, use_fts)
+        if matches is None: return None
+        # A longer text narrows the result only if it is matched the same way (FTS
+        # or LIKE). Only the closest such search is filtered, to bound the cost of a miss.
+        parents = [(k, entry) for k, entry in self._entries.items()
+                   if k[0] == filters and k[2:] == key[2:] and text.startswith(k[1]) and text != k[1]
+                   and (not k[1] or searches_fts(k[1], use_fts) == searches_fts(text, use_fts))]
+        if not parents: return None
+        _, parent = max(parents, key=lambda item: (item[1].exhausted, len(item[0][1])))
+        rows = [row for row in parent.rows if matches(row)]
+        if parent.exhausted or len(rows) >= view.page_size: return _Entry(parent.keys, rows, parent.exhausted)
+        return None
+
+    def _resort(self, view, key):
+        if view.ranked: return None
+        keys = student_page_keys(view.sort_col_name, False)[0]
+        for other_key, other in self._entries.items():
+            if other_key[:2] != key[:2] or other_key[4] != key[4] or not other.exhausted: continue
+            if "s.rowid" in keys and other.keys[-1] != "s.rowid": continue
+            width = len(other.keys)
+            def key_values(row):
+                return tuple(row[-1] if k == "s.rowid" else row[STUDENT_COLUMNS.index(k.split()[0][2:])] for k in keys)
+            rows = [row[:-width] + key_values(row) for row in other.rows]
+            return _Entry(keys, view.order_rows(rows), True)
+        return None
+
+    @property
+    def rows(self):
+        return sum(len(entry.rows) for entry in self._entries.values())
+
+    @property
+    def size(self):
+        """Estimated bytes held by the cached rows (values shared between entries are counted per entry)."""
+        return sum(entry.size for entry in self._entries.values())
+
+    def stats(self):
+        return {"hits": self.hits, "refined": self.refined, "resorted": self.resorted, "misses": self.misses,
+                "entries": len(self._entries), "rows": self.rows, "bytes": self.size}
+
+    def stats_text(self):
+        lookups = self.hits + self.refined + self.resorted + self.misses
+        answered = lookups - self.misses
+        return (f"search cache: {answered}/{lookups} answered in memory ({self.refined} refined, {self.resorted} re-sorted), "
+                f"{len(self._entries)} entries, {self.rows:,} rows, ~{self.size / 2**20:.1f} MiB")
@@ -0,0 +1,127 @@
+"""Rapid data entry: students keyed in back to back, checked locally and saved in batches.
+
+Each entry is validated as an imported row is (importer.validate_record), against
+the cached catalog, and its ID against an IdIndex of the IDs in use, so keying a
+student in touches no database. Valid entries wait in a StagingQueue and are
+written together by StudentRepository.add_new, in one transaction, every
+STAGING_FLUSH_ROWS entries or on demand. An ID another station took since the
+index was loaded is reported back instead of failing the batch.
+"""
+import time
+
+from importer import validate_record
+
+
+STAGING_FLUSH_ROWS = 25
+ID_INDEX_CHUNK = 50000
+_NUMBERS_PER_YEAR = 10000  # NNNN in YYYY-NNNN
+
+
+class IdIndex:
+    """The student IDs in use. A YYYY-NNNN ID is one bit of its year's 1,250-byte bitmap,
+    so a million IDs take kilobytes rather than a set's ~100 MB; any other ID is kept in a set."""
+
+    def __init__(self):
+        self._years = {}  # {YYYY: bytearray, bit NNNN set if the ID is in use}
+        self._other = set()
+
+    @staticmethod
+    def _slot(idnum):
+        if len(idnum) != 9 or idnum[4] != "-" or not idnum.isascii(): return None  # IDNUM_RE, cheaper
+        year, number = idnum[:4], idnum[5:]
+        return (int(year), int(number)) if year.isdigit() and number.isdigit() else None
+
+    def add(self, idnum):
+        slot = self._slot(idnum)
+        if slot is None: self._other.add(idnum); return
+        bits = self._years.get(slot[0])
+        if bits is None: bits = self._years[slot[0]] = bytearray(_NUMBERS_PER_YEAR // 8)
+        bits[slot[1] >> 3] |= 1 << (slot[1] & 7)
+
+    def discard(self, idnum):
+        slot = self._slot(idnum)
+        if slot is None: self._other.discard(idnum); return
+        bits = self._years.get(slot[0])
+        if bits is not None: bits[slot[1] >> 3] &= ~(1 << (slot[1] & 7))
+
+    def update(self, idnums):
+        for idnum in idnums: self.add(idnum)
+
+    def __contains__(self, idnum):
+        slot = self._slot(idnum)
+        if slot is None: return idnum in self._other
+        bits = self._years.get(slot[0])
+        return bits is not None and bool(bits[slot[1] >> 3] & (1 << (slot[1] & 7)))
+
+    def __len__(self):
+        return sum(bin(byte).count("1") for bits in self._years.values() for byte in bits) + len(self._other)
+
+    @classmethod
+    def load(cls, students, cancelled=None):
+        """Reads every ID in use through a StudentRepository; returns None if cancelled() says stop."""
+        index = cls()
+        for chunk in students.iter_idnums(ID_INDEX_CHUNK):
+            index.update(chunk)
+            if cancelled and cancelled(): return None
+        return index
+
+
+class FlushResult:
+    def __init__(self):
+        self.added = []  # Students rows written
+        self.taken = []  # rows whose ID another station registered first; not written
+        self.elapsed = 0.0
+
+    def summary(self):
+        text = f"{len(self.added):,} student(s) saved in {self.elapsed * 1000:.0f} ms"
+        if self.taken: text += f"; {len(self.taken):,} not saved, ID already registered: {', '.join(row[0] for row in self.taken)}"
+        return text
+
+
+class StagingQueue:
+    """Validated students waiting to be saved, in the order they were keyed in."""
+
+    def __init__(self, ids=None, flush_rows=STAGING_FLUSH_ROWS):
+        self.ids = ids  # an IdIndex; None while it loads, when only the save catches taken IDs
+        self.flush_rows = flush_rows
+        self.rows = {}  # {idnum: Students row}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def check(self, record, catalog):
+        """Returns (row, None) for an entry that can be staged, or (None, reason); record is keyed by Students column."""
+        row, reason = validate_record(record, catalog)
+        if row is None: return None, reason
+        if row[0] in self.rows: return None, f"{row[0]} is already staged"
+        if self.ids is not None and row[0] in self.ids: return None, f"{row[0]} is already registered"
+        return row, None
+
+    def stage(self, record, catalog):
+        row, reason = self.check(record, catalog)
+        if row is not None: self.rows[row[0]] = row
+        return row, reason
+
+    def unstage(self, idnums):
+        return [self.rows.pop(idnum) for idnum in idnums if idnum in self.rows]
+
+    def taken_by_now(self):
+        """Unstages and returns the rows whose IDs the index (loaded since they were staged) says are in use."""
+        return self.unstage([idnum for idnum in self.rows if self.ids is not None and idnum in self.ids])
+
+    def due(self):
+        return len(self.rows) >= self.flush_rows
+
+    def flush(self, students):
+        """Saves the staged students with one executemany in one transaction and returns a FlushResult.
+
+        On a database error nothing is saved and the students stay staged.
+        """
+        result, start = FlushResult(), time.perf_counter()
+        rows = list(self.rows.values())
+        taken = students.add_new(rows) if rows else set()
+        self.rows.clear()
+        for row in rows: (result.taken if row[0] in taken else result.added).append(row)
+        if self.ids is not None: self.ids.update(row[0] for row in rows)
+        result.elapsed = time.perf_counter() - start
+        return result
@@ -0,0 +1,288 @@
+import json
+import operator
+import re
+import sys
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from search import DB_COLUMN_MAP, NOCASE_COLUMNS, PAGE_SIZE, STUDENT_COLUMNS
+from student_view import DescendingKey
+
+
+LOAD_CHUNK_SIZE = 10000
+CACHED_ORDERS = 4  # multi-key orders kept for repeated clicks
+_IDNUM_RE = re.compile(r"\d{4}-\d{4}")
+_REMOVE_HYPHEN = operator.methodcaller("replace", "-", "")
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+STORE_ROWS_SQL = f"SELECT rowid, {', '.join(STUDENT_COLUMNS)} FROM Students WHERE idnum IN (SELECT value FROM json_each(?))"
+
+
+def _sql_order(value, nocase):
+    """Sorts values the way SQLite does: NULL, then numbers, then text (NOCASE folds ASCII only)."""
+    if value is None: return (0, 0)
+    if isinstance(value, str): return (2, value.translate(_ASCII_LOWER) if nocase else value)
+    return (1, value)
+
+
+class _InternedColumn:
+    """Each distinct value stored once; rows hold its index in the narrowest array that fits."""
+
+    def __init__(self):
+        self.values = []
+        self._codes_by_value = {}
+        self.codes = array("B")
+
+    def _intern(self, values):
+        codes_by_value = self._codes_by_value
+        for value in dict.fromkeys(values):
+            if value not in codes_by_value: codes_by_value[value] = len(self.values); self.values.append(value)
+        while len(self.values) > 1 << (8 * self.codes.itemsize):
+            self.codes = array("H" if self.codes.typecode == "B" else "I", self.codes)
+
+    def extend(self, values):
+        self._intern(values)
+        self.codes.extend(map(self._codes_by_value.__getitem__, values))
+
+    def __getitem__(self, index):
+        return self.values[self.codes[index]]
+
+    def __setitem__(self, index, value):
+        self._intern((value,))
+        self.codes[index] = self._codes_by_value[value]
+
+    def ranks(self, nocase):
+        """Per-row rank of the value in sort order; equal values share a rank."""
+        distinct = sorted({_sql_order(value, nocase) for value in self.values})
+        rank_of = {key: rank for rank, key in enumerate(distinct)}
+        code_ranks = [rank_of[_sql_order(value, nocase)] for value in self.values]
+        return array("I", map(code_ranks.__getitem__, self.codes))
+
+    def nbytes(self):
+        return (self.codes.itemsize * len(self.codes) + sys.getsizeof(self.values) + sys.getsizeof(self._codes_by_value)
+                + sum(sys.getsizeof(value) for value in self.values))
+
+
+class _IdColumn:
+    """idnums packed as YYYYNNNN integers, which sort like the text."""
+
+    def __init__(self):
+        self.codes = array("I")
+
+    def __getitem__(self, index):
+        code = self.codes[index]
+        return f"{code // 10000:04d}-{code % 10000:04d}"
+
+    def extend(self, values):
+        if not all(isinstance(value, str) and _IDNUM_RE.fullmatch(value) for value in values): raise ValueError(values)
+        self.codes.extend(map(int, map(_REMOVE_HYPHEN, values)))
+
+    def __setitem__(self, index, value):
+        if not (isinstance(value, str) and _IDNUM_RE.fullmatch(value)): raise ValueError(value)
+        self.codes[index] = int(_REMOVE_HYPHEN(value))
+
+    def ranks(self, nocase):
+        return self.codes
+
+    def nbytes(self):
+        return self.codes.itemsize * len(self.codes)
+
+
+class StudentStore:
+    """Every student, column by column, for sorting the whole list in memory.
+
+    Strings repeated across students (names, codes, college names, the year
+    level) are interned, so a row costs a few bytes per column. A sort
+    permutation per column is built at load; sorting by one column, either way,
+    is then a lookup, and extra keys are stable re-sorts of it. The store is a
+    snapshot: generation is whatever the caller uses to tell whether the
+    database has been written since (see SearchCache). A student written
+    since can be put back in with put or remove, which move only that row in
+    each sort permutation; a removed row's columns stay, unreferenced.
+    """
+
+    def __init__(self, generation=None):
+        self.generation = generation
+        self.rowids = array("q")
+        self.columns = {column: _IdColumn() if column == "idnum" else _InternedColumn() for column in STUDENT_COLUMNS}
+        self._permutations = {}
+        self._orders = OrderedDict()
+        self.removed = set()  # indexes of rows no longer in any order
+
+    @classmethod
+    def load(cls, conn, generation=None, cancelled=None):
+        store = cls(generation)
+        cursor = conn.execute(f"SELECT rowid, {', '.join(STUDENT_COLUMNS)} FROM Students ORDER BY rowid")
+        while True:
+            rows = cursor.fetchmany(LOAD_CHUNK_SIZE)
+            if not rows: break
+            store._extend(rows)
+            if cancelled and cancelled(): return None
+        for column in STUDENT_COLUMNS:
+            # The rowid order the rows were loaded in breaks ties, as it does in SQL.
+            store._permutations[column] = array("I", sorted(range(len(store.rowids)), key=store._ranks(column).__getitem__))
+            if cancelled and cancelled(): return None
+        return store
+
+    def _extend(self, rows):
+        rowids, *columns = zip(*rows)
+        self.rowids.extend(rowids)
+        for column, values in zip(STUDENT_COLUMNS, columns):
+            try: self.columns[column].extend(values)
+            except ValueError: self._unpack(column).extend(values)
+
+    def _unpack(self, column):
+        """An idnum that doesn't pack: keep the column as plain interned strings."""
+        ids, self.columns[column] = self.columns[column], _InternedColumn()
+        self.columns[column].extend([ids[index] for index in range(len(ids.codes))])
+        return self.columns[column]
+
+    def __len__(self):
+        return len(self.rowids) - len(self.removed)
+
+    def sort_key(self, column, index):
+        return _sql_order(self.columns[column][index], column in NOCASE_COLUMNS)
+
+    def _permutation_position(self, column, index):
+        # Permutations are sorted by value, ties in row order.
+        return bisect_left(self._permutations[column], (self.sort_key(column, index), index),
+                           key=lambda other: (self.sort_key(column, other), other))
+
+    def find(self, idnum):
+        """Returns the row index of a student in the store, or None."""
+        order = self._permutations["idnum"]
+        position = bisect_left(order, _sql_order(idnum, False), key=lambda index: self.sort_key("idnum", index))
+        return order[position] if position < len(order) and self.columns["idnum"][order[position]] == idnum else None
+
+    def put(self, row):
+        """Stores a (rowid, *Students columns) row read after a write, over the student's old row
+        or as a new one, and moves it in each sort permutation; returns its row index."""
+        index = self.find(row[1])
+        if index is None:
+            self._extend([row]); index = len(self.rowids) - 1
+            for column in STUDENT_COLUMNS: self._permutations[column].insert(self._permutation_position(column, index), index)
+        else:
+            for column, value in zip(STUDENT_COLUMNS, row[1:]):
+                if value == self.columns[column][index]: continue
+                del self._permutations[column][self._permutation_position(column, index)]
+                try: self.columns[column][index] = value
+                except ValueError: self._unpack(column)[index] = value
+                self._permutations[column].insert(self._permutation_position(column, index), index)
+        self._orders.clear()
+        return index
+
+    def remove(self, index):
+        for column in STUDENT_COLUMNS: del self._permutations[column][self._permutation_position(column, index)]
+        self.removed.add(index)
+        self._orders.clear()
+
+    def _ranks(self, column):
+        return self.columns[column].ranks(column in NOCASE_COLUMNS)
+
+    def order(self, sort_keys):
+        """Returns row indexes sorted by [(column, descending), ...], the first key most significant."""
+        sort_keys = tuple(sort_keys)
+        if sort_keys and sort_keys[0][0] == "idnum": sort_keys = sort_keys[:1]  # unique, nothing left to break
+        if not sort_keys: return array("I", (index for index in range(len(self.rowids)) if index not in self.removed))
+        if sort_keys in self._orders: self._orders.move_to_end(sort_keys); return self._orders[sort_keys]
+        column, descending = sort_keys[-1]
+        order = self._permutations[column]
+        if descending: order = order[::-1]
+        for column, descending in reversed(sort_keys[:-1]):
+            order = array("I", sorted(order, key=self._ranks(column).__getitem__, reverse=descending))
+        if len(sort_keys) > 1:
+            self._orders[sort_keys] = order
+            while len(self._orders) > CACHED_ORDERS: self._orders.popitem(last=False)
+        return order
+
+    def row(self, index):
+        return tuple(self.columns[column][index] for column in STUDENT_COLUMNS)
+
+    def memory(self):
+        """Approximate bytes held: {"columns": ..., "permutations": ...}."""
+        columns = self.rowids.itemsize * len(self.rowids) + sum(column.nbytes() for column in self.columns.values())
+        permutations = sum(p.itemsize * len(p) for p in self._permutations.values())
+        permutations += sum(o.itemsize * len(o) for o in self._orders.values())
+        return {"columns": columns, "permutations": permutations}
+
+
+class StoreView:
+    """The whole student list sorted in a StudentStore, paged into the grid like a StudentListView.
+
+    sort_keys are [(grid column heading, descending), ...]. A write is patched
+    in by putting the students concerned back in the store and moving only
+    them in this view's order (see apply_rows).
+    """
+
+    patchable = True
+    search_query = None
+    use_fts = False
+
+    def __init__(self, store, sort_keys, page_size=PAGE_SIZE):
+        self.store = store
+        self.sort_keys = list(sort_keys)
+        self.sort_col_name, self.descending = self.sort_keys[0] if self.sort_keys else (None, False)
+        self.page_size = page_size
+        self._columns = [(DB_COLUMN_MAP[heading], descending) for heading, descending in self.sort_keys]
+        if self._columns and self._columns[0][0] == "idnum": self._columns = self._columns[:1]
+        self.order = array("I", store.order(self._columns))  # a copy: apply_rows edits it
+        self.total = len(store)
+        self.loaded = 0
+        self.loading = False
+
+    @property
+    def exhausted(self):
+        return self.loaded >= self.total
+
+    def wants_more(self):
+        return not (self.exhausted or self.loading)
+
+    def next_page(self):
+        return [self.store.row(index) for index in self.order[self.loaded:self.loaded + self.page_size]]
+
+    def accept_page(self, rows):
+        self.loading = False
+        self.loaded += len(rows)
+        return rows
+
+    def rows_query(self, idnums):
+        return STORE_ROWS_SQL, [json.dumps(list(idnums))]
+
+    def _key(self, index):
+        """A row's place in this order: its sort keys, then (as the stable sorts leave ties) its
+        row index, in the direction of the last key."""
+        key = [DescendingKey(self.store.sort_key(column, index)) if descending else self.store.sort_key(column, index)
+               for column, descending in self._columns]
+        key.append(DescendingKey(index) if self._columns and self._columns[-1][1] else index)
+        return key
+
+    def _position(self, index):
+        return bisect_left(self.order, self._key(index), key=self._key)
+
+    def apply_rows(self, idnums, rows):
+        """Puts freshly read rows (see rows_query) for the given students into the store and moves them
+        in this order. Returns grid operations as StudentListView.apply_rows does."""
+        fresh = {row[1]: row for row in rows}
+        ops = []
+        for idnum in dict.fromkeys(idnums):
+            index, row = self.store.find(idnum), fresh.get(idnum)
+            if index is None:
+                if row is None: continue
+                index = self.store.put(row)
+            else:
+                old_key, position = self._key(index), self._position(index)
+                if row is None: self.store.remove(index)
+                elif self._key(self.store.put(row)) == old_key:
+                    if position < self.loaded: ops.append(("update", idnum, self.store.row(index)))
+                    continue
+                del self.order[position]; self.total -= 1
+                if position < self.loaded: self.loaded -= 1; ops.append(("delete", idnum))
+                if row is None: continue
+            exhausted, position = self.exhausted, self._position(index)
+            self.order.insert(position, index); self.total += 1
+            if position < self.loaded or exhausted: self.loaded += 1; ops.append(("insert", position, self.store.row(index)))
+        return ops
+
+    def status_text(self):
+        shown = f"{self.total:,} student(s)" if self.exhausted else f"Showing {self.loaded:,} of {self.total:,} student(s)"
+        return f"{shown}, sorted in memory"
@@ -0,0 +1,152 @@
+from bisect import bisect_left
+
+from search import PAGE_SIZE, build_student_page_query, build_student_count_query, build_student_rows_query
+
+# SQLite's NOCASE collation only folds ASCII letters.
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+class DescendingKey:
+    """A sort key compared the other way round, so bisect can search a descending list."""
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+
+class StudentListView:
+    """Paging state for the student grid: what is shown, how far it is loaded and the total.
+
+    The grid only ever holds the pages loaded so far; the next page is read
+    with a keyset query continuing after the last loaded row's key. The view
+    also remembers each loaded student's key (in grid order) so a write can be
+    patched in at the right position instead of reloading the grid.
+    """
+
+    def __init__(self, search_query=None, sort_col_name=None, use_fts=False, descending=False, page_size=PAGE_SIZE):
+        self.search_query = search_query
+        self.sort_col_name = sort_col_name
+        self.use_fts = use_fts
+        self.descending = descending
+        self.page_size = page_size
+        self.last_key = None
+        self.exhausted = False
+        self.loading = False
+        self.total = None
+        self.ids = []        # idnums in grid order
+        self.sort_keys = []  # comparable form of each row's key, parallel to ids
+        self.positions = {}  # {idnum: index in ids}
+        self.key_width = 0
+        self.ranked = False
+        self._key_nocase = ()
+        self.cache_generation = None  # write generation its rows were read at (see SearchCache)
+
+    @property
+    def loaded(self):
+        return len(self.ids)
+
+    def _page_query(self, after, limit=None):
+        query, params, keys = build_student_page_query(self.search_query, self.sort_col_name, self.use_fts,
+                                                       self.descending, after, limit or self.page_size)
+        self.key_width = len(keys)
+        self.ranked = keys[0] == "StudentsFTS.rank"
+        self._key_nocase = tuple(key.endswith("COLLATE NOCASE") for key in keys)
+        return query, params
+
+    def first_page_query(self, limit=None):
+        """limit reads ahead of the first page (see SearchCache); only page_size rows go to accept_page."""
+        return self._page_query(None, limit)
+
+    def next_page_query(self):
+        return self._page_query(self.last_key)
+
+    def count_query(self):
+        return build_student_count_query(self.search_query, self.use_fts)
+
+    def rows_query(self, idnums):
+        return build_student_rows_query(self.search_query, self.sort_col_name, self.use_fts, idnums)
+
+    def wants_more(self):
+        return not (self.exhausted or self.loading)
+
+    def _split(self, row):
+        width = len(row) - self.key_width
+        return tuple(row[:width]), tuple(row[width:])
+
+    def _sortable(self, key):
+        """Mirrors SQLite's ordering of a key in Python: NULLs first, NOCASE folding."""
+        return tuple((0, "") if value is None else (1, value.translate(_ASCII_LOWER) if nocase and isinstance(value, str) else value)
+                     for value, nocase in zip(key, self._key_nocase))
+
+    def order_rows(self, rows):
+        """Sorts rows carrying this view's key columns into the order its page query returns them."""
+        return sorted(rows, key=lambda row: self._sortable(self._split(row)[1]), reverse=self.descending)
+
+    def accept_page(self, rows):
+        """Records a fetched page and returns its rows without the trailing key columns."""
+        self.loading = False
+        if len(rows) < self.page_size: self.exhausted = True
+        display_rows = []
+        for row in rows:
+            values, key = self._split(tuple(row))
+            self.positions[values[0]] = len(self.ids)
+            self.ids.append(values[0]); self.sort_keys.append(self._sortable(key))
+            display_rows.append(values)
+        if rows: self.last_key = self._split(tuple(rows[-1]))[1]
+        if self.exhausted and self.total is None: self.total = self.loaded
+        return display_rows
+
+    def _position(self, sort_key):
+        if self.descending: return bisect_left(self.sort_keys, DescendingKey(sort_key), key=DescendingKey)
+        return bisect_left(self.sort_keys, sort_key)
+
+    @property
+    def patchable(self):
+        # bm25 ranks shift for every row when the index changes, so a ranked
+        # search can't be patched in place (or continued from a stale key).
+        return not self.ranked
+
+    def apply_rows(self, idnums, rows):
+        """Folds freshly read rows for the given students into the view.
+
+        rows is the result of rows_query(idnums). Returns grid operations:
+        ("delete", idnum), ("insert", index, values) and ("update", idnum, values).
+        A student whose new position is past the loaded pages is left for a
+        later page to bring in.
+        """
+        fresh = {}
+        for row in rows:
+            values, key = self._split(tuple(row))
+            fresh[values[0]] = (values, self._sortable(key))
+        # Positions are looked up before anything moves; the rows that leave or move are
+        # taken out first (deletes go out first too), then each one is bisected back in.
+        ops, moved, removed = [], [], []
+        for idnum in dict.fromkeys(idnums):
+            old_index = self.positions.get(idnum)
+            if idnum not in fresh:
+                if old_index is not None: removed.append(old_index); ops.append(("delete", idnum))
+                continue
+            values, sort_key = fresh[idnum]
+            if old_index is not None and self.sort_keys[old_index] == sort_key:
+                ops.append(("update", idnum, values)); continue
+            if old_index is not None: removed.append(old_index); ops.append(("delete", idnum))
+            moved.append((idnum, values, sort_key))
+        for index in sorted(removed, reverse=True): del self.ids[index]; del self.sort_keys[index]
+        for idnum, values, sort_key in moved:
+            index = self._position(sort_key)
+            if index == len(self.ids) and not self.exhausted: continue
+            self.ids.insert(index, idnum); self.sort_keys.insert(index, sort_key)
+            ops.append(("insert", index, values))
+        if removed or moved: self.positions = {idnum: i for i, idnum in enumerate(self.ids)}
+        return ops
+
+    def status_text(self):
+        if self.total is None: return f"Showing {self.loaded:,} student(s), counting..."
+        if self.loaded >= self.total: return f"{self.total:,} student(s)"
+        return f"Showing {self.loaded:,} of {self.total:,} student(s)"
@@ -0,0 +1,68 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datagen import IDS_PER_YEAR, generate_students, load_catalog, populate
+from db import ConnectionManager, NAME_KEY_SQL, enrollment_stats_differences
+
+STUDENTS = 400
+
+
+@pytest.fixture(scope="session")
+def generated_db(tmp_path_factory):
+    """A migrated database with the default catalog and STUDENTS generated students, copied per test."""
+    path = str(tmp_path_factory.mktemp("generated") / "students.db")
+    populate(path, STUDENTS, seed=7)
+    return path
+
+
+@pytest.fixture
+def db_path(generated_db, tmp_path):
+    path = str(tmp_path / "students.db")
+    with open(generated_db, "rb") as src, open(path, "wb") as dst: dst.write(src.read())
+    return path
+
+
+@pytest.fixture
+def connections(db_path):
+    manager = ConnectionManager(db_path)
+    yield manager
+    manager.close_all()
+
+
+def new_students(conn, count, seed=1):
+    """count generated students with IDs from year 9000 on, which the generated ones never reach."""
+    rows = generate_students(count, load_catalog(conn), seed)
+    return [(f"{9000 + i // IDS_PER_YEAR}-{i % IDS_PER_YEAR:04d}",) + tuple(row[1:]) for i, row in enumerate(rows)]
+
+
+def recount_differences(conn):
+    """What the trigger-maintained tables disagree with a full recount of Students on; empty when consistent."""
+    problems = [f"EnrollmentStats {group}: {kept} kept, {counted} counted" for group, kept, counted in enrollment_stats_differences(conn)]
+    opened = not conn.in_transaction
+    try: conn.execute("INSERT INTO StudentsFTS(StudentsFTS, rank) VALUES ('integrity-check', 1)")
+    except Exception as e: problems.append(f"StudentsFTS: {e}")
+    finally:
+        if opened and conn.in_transaction: conn.rollback()  # the check writes nothing, but its INSERT began a transaction
+    names = """SELECT name, COUNT(*) FROM (SELECT fname AS name FROM Students UNION ALL SELECT lname FROM Students)
+               WHERE name IS NOT NULL GROUP BY name"""
+    for label, one, other in (("StudentNames not counted", "SELECT name, students FROM StudentNames", names),
+                              ("counted not in StudentNames", names, "SELECT name, students FROM StudentNames")):
+        rows = conn.execute(f"{one} EXCEPT {other}").fetchall()
+        if rows: problems.append(f"{label}: {[tuple(row) for row in rows[:5]]}")
+    grams = f"""SELECT DISTINCT substr(k, n, 3), name FROM (SELECT name, {NAME_KEY_SQL.format('name')} AS k FROM StudentNames)
+                JOIN Numbers ON n <= length(k) - 2"""
+    for label, one, other in (("NameTrigrams not from StudentNames", "SELECT gram, name FROM NameTrigrams", grams),
+                              ("trigrams missing from NameTrigrams", grams, "SELECT gram, name FROM NameTrigrams")):
+        rows = conn.execute(f"{one} EXCEPT {other}").fetchall()
+        if rows: problems.append(f"{label}: {[tuple(row) for row in rows[:5]]}")
+    return problems
+
+
+def change_log(conn, since=0):
+    """{(tbl, pk): op} of each key's newest ChangeLog entry after seq since."""
+    rows = conn.execute("SELECT tbl, pk, op FROM ChangeLog WHERE seq > ? ORDER BY seq", (since,)).fetchall()
+    return {(tbl, pk): op for tbl, pk, op in rows}
@@ -0,0 +1,71 @@
+import os
+import sqlite3
+
+from backup import backup_database, check_database, compact_database, snapshot_due, snapshot_paths, take_snapshot
+
+DUMP = "SELECT idnum, fname, lname, sex, pcode, yrlvl, cname, ccode FROM Students ORDER BY idnum"
+
+
+def dump(path):
+    conn = sqlite3.connect(path)
+    try: return conn.execute(DUMP).fetchall()
+    finally: conn.close()
+
+
+def test_backup_in_steps(connections, db_path, tmp_path):
+    path = str(tmp_path / "copy.db")
+    fractions = []
+    result = backup_database(connections.get(), path, pages_per_step=4, sleep=0, progress=lambda r, f: fractions.append(f))
+    assert result.steps > 1 and not result.problems and fractions[-1] == 1.0
+    assert dump(path) == dump(db_path) and result.bytes == os.path.getsize(path)
+    assert not os.path.exists(path + ".part")
+
+
+def test_backup_restarted_by_other_writers_still_copies_a_consistent_state(connections, db_path, tmp_path):
+    other = sqlite3.connect(db_path)
+
+    def write(result, fraction):  # another station saving between every step
+        other.execute("UPDATE Students SET yrlvl = 6 - yrlvl WHERE idnum = (SELECT MIN(idnum) FROM Students)"); other.commit()
+    path = str(tmp_path / "copy.db")
+    result = backup_database(connections.get(), path, pages_per_step=4, sleep=0, progress=write)
+    other.close()
+    assert result.restarts >= 1 and not result.problems
+    assert dump(path) == dump(db_path)
+
+
+def test_cancelled_backup_and_compaction_leave_nothing(connections, tmp_path):
+    for run in (lambda path: backup_database(connections.get(), path, pages_per_step=4, sleep=0, cancelled=lambda: True),
+                lambda path: compact_database(connections.get(), path, cancelled=lambda: True)):
+        result = run(str(tmp_path / "copy.db"))
+        assert result.cancelled and "nothing was written" in result.summary()
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("copy.db")]
+
+
+def test_compacted_copy(connections, db_path, tmp_path):
+    conn = connections.get()
+    conn.execute("DELETE FROM Students WHERE yrlvl > 2"); conn.commit()
+    path = str(tmp_path / "compact.db")
+    result = compact_database(conn, path)
+    assert not result.problems and dump(path) == dump(db_path)
+    assert sqlite3.connect(path).execute("PRAGMA freelist_count").fetchone()[0] == 0
+
+
+def test_check_finds_a_drifted_search_index(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("DROP TRIGGER Students_fts_update")
+    conn.execute("UPDATE Students SET lname = 'Drifted' WHERE idnum = (SELECT MIN(idnum) FROM Students)"); conn.commit()
+    conn.close()
+    assert [problem for problem in check_database(db_path) if problem.startswith("search index")]
+
+
+def test_snapshots_are_kept_to_the_newest(connections, db_path, tmp_path):
+    directory = str(tmp_path / "snapshots")
+    os.makedirs(directory)
+    for stamp in ("20200101-000000", "20200102-000000", "20200103-000000"):
+        open(os.path.join(directory, f"students-{stamp}.db"), "wb").close()
+    assert snapshot_due(db_path, directory, interval=0)
+    result = take_snapshot(connections.get(), db_path, directory, keep=2)
+    assert not result.problems and len(result.pruned) == 2
+    assert snapshot_paths(db_path, directory) == [os.path.join(directory, "students-20200103-000000.db"), result.path]
+    assert dump(result.path) == dump(db_path)
+    assert not snapshot_due(db_path, directory)
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+import cli
+from bulk import FINAL_YEAR, promote_students, transfer_students, delete_students
+from conftest import recount_differences
+from db import open_tuned_connection
+
+
+def student_count(db_path):
+    conn = open_tuned_connection(db_path)
+    try: return conn.execute("SELECT COUNT(*) FROM Students").fetchone()[0]
+    finally: conn.close()
+
+
+@pytest.mark.parametrize("operation", ["delete", "promote", "transfer"])
+@pytest.mark.parametrize("selection", [[], ["--search", ""], ["--search", "   "]])
+def test_cli_bulk_refuses_an_implicit_everyone(db_path, operation, selection, capsys):
+    before = student_count(db_path)
+    college = ["--college", "CCS"] if operation == "transfer" else []
+    assert cli.main(["--database", db_path, "bulk", operation, *selection, *college]) == 1
+    assert "--all" in capsys.readouterr().err
+    assert student_count(db_path) == before
+
+
+def test_cli_bulk_acts_on_a_selection_or_everyone_when_asked(db_path):
+    before = student_count(db_path)
+    assert cli.main(["--database", db_path, "bulk", "delete", "--search", "yr:1"]) == 0
+    after = student_count(db_path)
+    assert 0 < after < before
+    assert cli.main(["--database", db_path, "bulk", "delete", "--all"]) == 0
+    assert student_count(db_path) == 0
+
+
+def test_cli_bulk_all_excludes_a_selection(db_path):
+    with pytest.raises(SystemExit):
+        cli.main(["--database", db_path, "bulk", "promote", "--all", "--search", "yr:1"])
+
+
+def stored(conn, idnums):
+    return {row[0]: tuple(row[1:]) for row in conn.execute(
+        "SELECT idnum, yrlvl, graduated, ccode, cname, pcode FROM Students WHERE idnum IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(idnums)),))}
+
+
+def test_bulk_operations_match_recount(connections):
+    conn = connections.get()
+    idnums = [row[0] for row in conn.execute("SELECT idnum FROM Students ORDER BY rowid LIMIT 150")]
+
+    before = stored(conn, idnums[:50])
+    result = promote_students(conn, idnums=idnums[:50], chunk_size=7)
+    after = stored(conn, idnums[:50])
+    assert result.matched == 50 and sorted(result.idnums) == sorted(idnums[:50])
+    assert all(after[idnum][:2] == ((year + 1, 0) if year < FINAL_YEAR else (FINAL_YEAR, 1)) for idnum, (year, *_) in before.items())
+    assert result.graduated == sum(year == FINAL_YEAR for year, *_ in before.values())
+    assert recount_differences(conn) == []
+    graduated = [idnum for idnum, (_, flag, *_) in after.items() if flag]
+    assert promote_students(conn, idnums=graduated).changed == 0  # graduated students are left alone
+
+    moving = sum(ccode != "CCS" or pcode is not None for _, _, ccode, _, pcode in stored(conn, idnums[50:100]).values())
+    result = transfer_students(conn, "CCS", idnums=idnums[50:100], chunk_size=7)
+    assert moving and result.changed == moving
+    assert {row[2:] for row in stored(conn, idnums[50:100]).values()} == {("CCS", "College of Computer Studies", None)}
+    assert recount_differences(conn) == []
+
+    result = delete_students(conn, idnums=idnums[100:], chunk_size=7)
+    assert result.changed == 50 and stored(conn, idnums[100:]) == {}
+    assert recount_differences(conn) == []
+
+    result = delete_students(conn, idnums=idnums[:100], chunk_size=7, cancelled=lambda: True)
+    assert result.cancelled and result.changed == 0
+    assert len(stored(conn, idnums[:100])) == 100
+    assert recount_differences(conn) == []
+
+
+def test_bulk_selection_by_search_and_bad_targets(connections):
+    conn = connections.get()
+    first_years = [row[0] for row in conn.execute("SELECT idnum FROM Students WHERE yrlvl = 1")]
+    result = promote_students(conn, "yr:1")
+    assert first_years and sorted(result.idnums) == sorted(first_years)
+    assert {row[:2] for row in stored(conn, first_years).values()} == {(2, 0)}
+    with pytest.raises(ValueError, match="unknown college"): transfer_students(conn, "NOPE", search_query="yr:2")
+    with pytest.raises(ValueError, match="not offered"): transfer_students(conn, "CCS", "BSCE", search_query="yr:2")
@@ -0,0 +1,40 @@
+import sqlite3
+
+from catalog import CatalogCache
+from importer import load_catalog
+from repository import CollegeRepository
+
+
+def test_poll_reloads_only_after_another_connection_commits(connections, db_path):
+    colleges = CollegeRepository(connections)
+    cache = CatalogCache(colleges)
+    assert cache.poll() and cache.college_code("College of Computer Studies") == "CCS"
+    generation = dict(cache.generation)
+    assert cache.poll() == set()
+
+    other = sqlite3.connect(db_path)
+    other.execute("INSERT INTO Colleges (CollegeName, CollegeCode) VALUES ('College of Law', 'LAW')"); other.commit()
+    assert cache.poll() == {"LAW"}
+    assert cache.generation == {"Colleges": generation["Colleges"] + 1, "Programs": generation["Programs"]}
+    other.execute("UPDATE Colleges SET CollegeName = CollegeName"); other.commit()  # a commit changing nothing
+    assert cache.poll() == set() and cache.generation["Colleges"] == generation["Colleges"] + 1
+    other.close()
+
+
+def test_local_writes_reload_the_tables_they_touched(connections):
+    colleges = CollegeRepository(connections)
+    cache = CatalogCache(colleges); cache.reload()
+    code = colleges.add_programs("CCS", ["BS in Data Science"])[0]
+    assert cache.reload(("Programs",)) == {"CCS"}
+    assert cache.program_code("CCS", "BS in Data Science") == code and cache.program_names[code] == "BS in Data Science"
+    assert cache.program_list("CCS")[-1] == "BS in Data Science"
+    assert cache.poll() == set()  # our own commit is not someone else's
+
+
+def test_validation_catalog_matches_the_importers(connections):
+    cache = CatalogCache(CollegeRepository(connections)); cache.reload()
+    catalog = cache.validation_catalog()
+    assert catalog == load_catalog(connections.get())
+    assert cache.validation_catalog() is catalog
+    cache.colleges.add_programs("CCS", ["BS in Data Science"]); cache.reload()
+    assert cache.validation_catalog() is not catalog and cache.validation_catalog() == load_catalog(connections.get())
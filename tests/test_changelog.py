@@ -0,0 +1,150 @@
+import json
+
+import pytest
+
+from bulk import promote_students, transfer_students, delete_students
+from conftest import recount_differences, change_log, new_students
+from db import change_consumers, change_log_head, compact_change_log
+from exporter import export_changes
+from repository import BULK_WRITE_MIN_ROWS, StudentRepository, CollegeRepository
+
+
+def versions(conn, idnums):
+    return {idnum: version for idnum, version in conn.execute(
+        "SELECT idnum, version FROM Students WHERE idnum IN (SELECT value FROM json_each(?))", (json.dumps(list(idnums)),))}
+
+
+def college_students(conn, code):
+    return [row[0] for row in conn.execute("SELECT idnum FROM Students WHERE ccode = ? ORDER BY idnum", (code,))]
+
+
+@pytest.fixture
+def repos(connections):
+    return StudentRepository(connections), CollegeRepository(connections), connections.get()
+
+
+@pytest.mark.parametrize("count", [3, BULK_WRITE_MIN_ROWS])  # the per-row triggers, then write_students_bulk
+def test_student_writes_are_logged(repos, count):
+    students, _, conn = repos
+    rows = new_students(conn, count)
+    head = change_log_head(conn)
+    students.add_many(rows)
+    assert change_log(conn, head) == {("Students", row[0]): "I" for row in rows}
+
+    head = change_log_head(conn)
+    edited = [(row[0], "Renamed", row[2] + "son") + row[3:] for row in rows[:count // 2 + 1]]
+    students.update_many(edited)
+    assert change_log(conn, head) == {("Students", row[0]): "U" for row in edited}
+
+    head = change_log_head(conn)
+    gone = [row[0] for row in rows[::2]]
+    students.delete_many(gone + ["0000-0000"])
+    assert change_log(conn, head) == {("Students", idnum): "D" for idnum in gone}
+
+
+def test_unchanged_update_is_not_logged(repos):
+    students, _, conn = repos
+    row = tuple(conn.execute("SELECT idnum, fname, lname, sex, pcode, yrlvl, cname, ccode FROM Students LIMIT 1").fetchone())
+    head = change_log_head(conn)
+    students.update_many([row])
+    assert change_log(conn, head) == {}
+
+
+def test_bulk_operations_are_logged(repos):
+    _, _, conn = repos
+    idnums = [row[0] for row in conn.execute("SELECT idnum FROM Students ORDER BY rowid LIMIT 150")]
+    for run, op in ((lambda: promote_students(conn, idnums=idnums[:50], chunk_size=7), "U"),
+                    (lambda: transfer_students(conn, "CCS", idnums=idnums[50:100], chunk_size=7), "U"),
+                    (lambda: delete_students(conn, idnums=idnums[100:], chunk_size=7), "D")):
+        head = change_log_head(conn)
+        result = run()
+        assert result.idnums and change_log(conn, head) == {("Students", idnum): op for idnum in result.idnums}
+
+    head = change_log_head(conn)
+    assert delete_students(conn, idnums=idnums[:100], cancelled=lambda: True).cancelled
+    assert change_log_head(conn) == head
+
+
+def test_college_recode_and_delete_match_recount(repos):
+    _, colleges, conn = repos
+    code = conn.execute("SELECT ccode FROM Students GROUP BY ccode ORDER BY COUNT(*) DESC LIMIT 1").fetchone()[0]
+    enrolled = college_students(conn, code)
+    before = versions(conn, enrolled)
+
+    head = change_log_head(conn)
+    assert colleges.update(code, "Renamed College", "NEW") == 1
+    assert college_students(conn, "NEW") == enrolled
+    assert recount_differences(conn) == []
+    assert change_log(conn, head) == {("Colleges", code): "D", ("Colleges", "NEW"): "U",
+                                      **{("Students", idnum): "U" for idnum in enrolled}}
+    assert versions(conn, enrolled) == {idnum: version + 1 for idnum, version in before.items()}  # once, cascade or not
+
+    head = change_log_head(conn)
+    assert colleges.update("NEW", "Renamed Again", "NEW") == 1  # a rename alone leaves the students alone
+    assert change_log(conn, head) == {("Colleges", "NEW"): "U"}
+
+    head = change_log_head(conn)
+    assert colleges.delete("NEW") == 1
+    assert conn.execute("SELECT COUNT(*) FROM Students WHERE idnum IN (SELECT value FROM json_each(?))"
+                        " AND ccode IS NULL AND cname IS NULL AND pcode IS NULL", (json.dumps(enrolled),)).fetchone()[0] == len(enrolled)
+    assert recount_differences(conn) == []
+    assert change_log(conn, head) == {("Colleges", "NEW"): "D", **{("Students", idnum): "U" for idnum in enrolled}}
+    assert versions(conn, enrolled) == {idnum: version + 2 for idnum, version in before.items()}
+
+
+def test_college_and_bulk_updates_leave_the_schema_alone(repos):
+    _, colleges, conn = repos
+    schema = conn.execute("PRAGMA schema_version").fetchone()[0]
+    promote_students(conn, idnums=[row[0] for row in conn.execute("SELECT idnum FROM Students LIMIT 20")])
+    colleges.update("CCS", "Computer Studies", "CS")
+    colleges.delete("CS")
+    assert conn.execute("PRAGMA schema_version").fetchone()[0] == schema
+    assert conn.execute("SELECT COUNT(*) FROM TriggerGates").fetchone()[0] == 0
+    assert recount_differences(conn) == []
+
+
+def read_changes(path):
+    with open(path) as f: return [json.loads(line) for line in f]
+
+
+def test_delta_export_since_a_consumers_watermark(repos, tmp_path):
+    students, colleges, conn = repos
+    path = str(tmp_path / "changes.jsonl")
+    result = export_changes(conn, path, consumer="billing")
+    assert result.full and result.upserts == len(read_changes(path)) == students.count() + len(colleges.mapping())
+    assert change_consumers(conn) == [("billing", change_log_head(conn))]
+    mark = change_log_head(conn)
+
+    first, second = students.search(limit=2)
+    students.update_many([(first[0], "Renamed", *first[2:])])
+    students.update_many([(first[0], "Renamed Again", *first[2:])])
+    students.delete_many([second[0]])
+    colleges.add("College of Law", "LAW")
+    result = export_changes(conn, path, consumer="billing")
+    lines = read_changes(path)
+    assert not result.full and (result.upserts, result.deletes) == (2, 1)
+    assert [(line["table"], line["op"], line["key"]) for line in lines] == [
+        ("students", "upsert", first[0]), ("students", "delete", second[0]), ("colleges", "upsert", "LAW")]
+    assert lines[0]["row"]["fname"] == "Renamed Again" and lines[1]["row"] is None
+    assert [line["seq"] for line in lines] == sorted(line["seq"] for line in lines)
+
+    assert export_changes(conn, path, consumer="billing").rows == 0
+    assert export_changes(conn, path, since=mark).rows == 3  # an explicit watermark moves no consumer's
+    assert change_consumers(conn) == [("billing", change_log_head(conn))]
+
+
+def test_compaction_keeps_the_newest_entry_per_key(repos):
+    students, _, conn = repos
+    compact_change_log(conn)  # the generated students' inserts: one entry each already
+    row = students.search(limit=1)[0]
+    head = change_log_head(conn)
+    for name in ("One", "Two", "Three"): students.update_many([(row[0], name, *row[2:])])
+    assert compact_change_log(conn) == 3  # the insert, One and Two
+    assert [tuple(entry) for entry in conn.execute("SELECT seq, op FROM ChangeLog WHERE pk = ?", (row[0],))] == [(head + 3, "U")]
+
+    conn.execute("INSERT INTO ChangeConsumers (name, seq) VALUES ('billing', ?)", (head + 3,)); conn.commit()
+    students.update_many([(row[0], "Four", *row[2:])])
+    entries = conn.execute("SELECT COUNT(*) FROM ChangeLog").fetchone()[0]
+    assert compact_change_log(conn, prune_consumed=True) == entries - 1  # all but Four, which billing hasn't taken
+    assert [entry[0] for entry in conn.execute("SELECT seq FROM ChangeLog")] == [head + 4]
+    assert change_log_head(conn) == head + 4  # seq is never reused
@@ -0,0 +1,46 @@
+import csv
+import io
+
+import cli
+from repository import StudentRepository
+from search import STUDENT_COLUMNS
+
+
+def run(db_path, capsys, *argv):
+    """Runs the CLI on db_path; returns (exit status, stdout)."""
+    status = cli.main(["--database", db_path, *argv])
+    return status, capsys.readouterr().out
+
+
+def test_search_and_count(connections, db_path, capsys):
+    expected = StudentRepository(connections).search("ccode:CCS yr:3", "Last Name")
+    status, out = run(db_path, capsys, "search", "ccode:CCS yr:3", "--sort", "lname")
+    rows = list(csv.reader(io.StringIO(out)))
+    assert status == 0 and rows[0] == list(STUDENT_COLUMNS)
+    assert rows[1:] == [["" if value is None else str(value) for value in row] for row in expected]
+    assert run(db_path, capsys, "search", "--limit", "5")[1].count("\n") == 6
+    assert run(db_path, capsys, "count", "ccode:CCS yr:3") == (0, f"{len(expected)}\n")
+
+
+def test_delete(connections, db_path, capsys, tmp_path):
+    idnums = [row[0] for row in StudentRepository(connections).search(limit=3)]
+    listed = tmp_path / "ids.txt"
+    listed.write_text(f"{idnums[2]}\n\n0000-0000\n")
+    status, out = run(db_path, capsys, "delete", idnums[0], idnums[1], "--from", str(listed))
+    assert (status, out) == (0, "3 of 4 student(s) deleted\n")
+    assert StudentRepository(connections).get_many(idnums) == []
+
+
+def test_export_then_import_round_trips(db_path, capsys, tmp_path):
+    path = str(tmp_path / "students.jsonl")
+    count = int(run(db_path, capsys, "count")[1])
+    assert run(db_path, capsys, "export", path)[0] == 0
+    assert run(db_path, capsys, "bulk", "delete", "--all")[0] == 0
+    status, out = run(db_path, capsys, "import", path)
+    assert status == 0 and f"{count:,} inserted" in out
+    assert int(run(db_path, capsys, "count")[1]) == count
+
+
+def test_colleges(db_path, capsys):
+    status, out = run(db_path, capsys, "colleges")
+    assert status == 0 and "CCS\t" in out and "\n  BSCS\t" in out
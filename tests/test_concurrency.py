@@ -0,0 +1,111 @@
+import csv
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import importer
+import repository
+from db import BUSY_TIMEOUT_MS, ConnectionManager
+from repository import StudentRepository
+from search import STUDENT_COLUMNS
+
+
+@pytest.fixture
+def student(connections):
+    """A valid new student: a generated one's details under an ID no generated student has."""
+    row = connections.get().execute("SELECT fname, lname, sex, pcode, yrlvl, cname, ccode FROM Students LIMIT 1").fetchone()
+    return ("9000-0001",) + tuple(row)
+
+
+@pytest.fixture
+def locked(db_path, connections, monkeypatch):
+    """Another station's connection holding the write lock; returns a function releasing it after some seconds.
+
+    The repository's own connection gives up on the lock at once, so every
+    attempt that finds it held is a retry.
+    """
+    monkeypatch.setattr(repository, "retry_backoff", lambda attempt: 0.02)
+    monkeypatch.setattr(importer, "retry_backoff", lambda attempt: 0.02)
+    connections.get().execute("PRAGMA busy_timeout = 0")
+    other = sqlite3.connect(db_path, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    timers = []
+
+    def release_after(seconds):
+        timers.append(threading.Timer(seconds, other.rollback)); timers[-1].start()
+    yield release_after
+    for timer in timers: timer.join()
+    if other.in_transaction: other.rollback()
+    other.close()
+
+
+def test_write_retried_until_the_lock_is_released(connections, locked, student):
+    students = StudentRepository(connections)
+    students.write_retries = 50
+    generation = connections.write_generation
+    locked(0.15)
+    assert students.add(student) == 1
+    assert connections.busy_retries > 0
+    assert connections.write_generation == generation + 1
+    assert students.get_many([student[0]]) == [student]
+
+
+def test_write_gives_up_after_its_retries(connections, locked, student):
+    students = StudentRepository(connections)
+    students.write_retries = 2
+    generation = connections.write_generation
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        students.add(student)
+    assert connections.busy_retries == 2
+    assert connections.write_generation == generation
+    assert not connections.get().in_transaction
+    assert students.get_many([student[0]]) == []
+
+
+def test_import_batch_retried_until_the_lock_is_released(connections, locked, student, tmp_path, monkeypatch):
+    monkeypatch.setattr(importer, "WRITE_RETRIES", 50)
+    path = tmp_path / "students.csv"
+    with open(path, "w", newline="") as f: csv.writer(f).writerows([STUDENT_COLUMNS, student])
+    locked(0.15)
+    result = importer.import_students(connections.get(), str(path))
+    assert result.inserted == 1 and not result.rejected
+    assert StudentRepository(connections).get_many([student[0]]) == [student]
+
+
+def test_short_busy_timeout_fails_fast(connections, locked, student):
+    connections.get().execute("PRAGMA busy_timeout = 5000")  # the connection's own, as CONNECTION_PRAGMAS set it
+    students = StudentRepository(connections, busy_timeout_ms=50, write_retries=1)
+    start = time.perf_counter()
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        students.add(student)
+    assert time.perf_counter() - start < 1
+    assert connections.get().execute("PRAGMA busy_timeout").fetchone()[0] == BUSY_TIMEOUT_MS
+
+
+def test_every_write_bumps_the_row_version(connections, student):
+    students = StudentRepository(connections)
+    students.add(student)
+    _, version = students.get_versioned(student[0])
+    students.update_many([(*student[:5], 5 - student[5], *student[6:])])
+    assert students.get_versioned(student[0])[1] == version + 1
+    assert students.get_versioned("0000-0000") is None
+
+
+def test_update_if_unchanged_refuses_a_stale_version(connections, db_path, student):
+    students = StudentRepository(connections)
+    students.add(student)
+    read, version = students.get_versioned(student[0])
+    other = StudentRepository(ConnectionManager(db_path))  # another station saving first
+    assert other.update_if_unchanged((*read[:1], "Theirs", *read[2:]), version)
+    other.connections.close_all()
+    assert not students.update_if_unchanged((*read[:1], "Mine", *read[2:]), version)
+    assert students.get_versioned(student[0]) == ((*read[:1], "Theirs", *read[2:]), version + 1)
+
+
+def test_gui_reports_a_locked_database_as_busy():
+    import main
+    assert main.db_error_text(sqlite3.OperationalError("database is locked")).startswith("another station is saving")
+    assert main.db_error_text(sqlite3.IntegrityError("UNIQUE constraint failed: Students.idnum")) == "UNIQUE constraint failed: Students.idnum"
+    assert main.UI_BUSY_TIMEOUT_MS < BUSY_TIMEOUT_MS
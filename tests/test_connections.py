@@ -0,0 +1,39 @@
+import threading
+
+from db import BUSY_TIMEOUT_MS, ConnectionManager
+from workers import BackgroundTask
+
+
+def test_one_tuned_connection_per_thread(db_path):
+    connections = ConnectionManager(db_path)
+    conn = connections.get()
+    assert connections.get() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == BUSY_TIMEOUT_MS
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(connections.get())); thread.start(); thread.join()
+    assert other[0] is not conn
+    connections.close_all()
+
+
+def test_release_rolls_back_an_unfinished_transaction(db_path):
+    connections = ConnectionManager(db_path)
+    conn = connections.get()
+    conn.execute("DELETE FROM Students")
+    connections.release(conn)
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM Students").fetchone()[0] > 0
+    connections.close_all()
+
+
+def test_background_task_closes_its_threads_connection(db_path):
+    connections = ConnectionManager(db_path)
+    main_conn = connections.get()
+    task = BackgroundTask(lambda progress, cancelled: connections.get().execute("SELECT COUNT(*) FROM Students").fetchone()[0],
+                          connections=connections).start()
+    task._thread.join()
+    assert [event[0] for event in task.drain()] == ["done"]
+    assert connections._connections == [main_conn]  # the task's connection is gone, the caller's kept
+    connections.close_all()
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+import benchmark
+from datagen import generate_students, load_catalog, populate
+from db import open_tuned_connection
+from importer import load_catalog as import_catalog, validate_record
+from search import STUDENT_COLUMNS
+
+
+def test_same_seed_same_students(connections):
+    catalog = load_catalog(connections.get())
+    assert list(generate_students(500, catalog, seed=3)) == list(generate_students(500, catalog, seed=3))
+    assert list(generate_students(500, catalog, seed=3)) != list(generate_students(500, catalog, seed=4))
+
+
+def test_generated_students_are_valid_with_ordered_unique_ids(connections):
+    conn = connections.get()
+    rows = list(generate_students(25000, load_catalog(conn), seed=5))
+    ids = [row[0] for row in rows]
+    assert ids == sorted(set(ids)) and ids[0].startswith("2023-") and ids[-1] == "2025-4999"
+    catalog = import_catalog(conn)
+    assert all(validate_record(dict(zip(STUDENT_COLUMNS, row)), catalog) == (row, None) for row in rows[::50])
+
+
+def test_populate_refuses_a_database_with_students(db_path):
+    with pytest.raises(ValueError, match="already has students"): populate(db_path, 10)
+
+
+def test_populate_is_reproducible(generated_db, tmp_path):
+    path = str(tmp_path / "again.db")
+    populate(path, 400, seed=7)
+    dump = "SELECT idnum, fname, lname, sex, pcode, yrlvl, cname, ccode FROM Students ORDER BY idnum"
+    first, again = open_tuned_connection(generated_db), open_tuned_connection(path)
+    assert again.execute(dump).fetchall() == first.execute(dump).fetchall()
+    first.close(); again.close()
+
+
+def test_benchmark_suite_runs_and_compares(tmp_path, capsys):
+    output = str(tmp_path / "suite.json")
+    assert benchmark.main(["suite", "--students", "300", "--repeat", "1", "--bulk", "50", "--output", output]) == 0
+    with open(output) as f: results = json.load(f)["results"]
+    assert {"startup", "refresh search", "insert bulk", "import upsert", "delete college"} <= set(results)
+    assert benchmark.main(["suite", "--students", "300", "--repeat", "1", "--bulk", "50", "--baseline", output,
+                           "--tolerance", "1000"]) == 0
+    assert "REGRESSION" not in capsys.readouterr().out
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from exporter import export_students
+from importer import read_records
+from repository import StudentRepository
+from search import STUDENT_COLUMNS
+
+
+def read_back(path):
+    """The exported rows, as strings, the way an import reads them."""
+    return [tuple("" if record[column] is None else str(record[column]) for column in STUDENT_COLUMNS)
+            for _, record in read_records(path)]
+
+
+def as_text(rows):
+    return [tuple("" if value is None else str(value) for value in row) for row in rows]
+
+
+@pytest.mark.parametrize("name", ["students.csv", "students.csv.gz", "students.jsonl", "students.jsonl.gz"])
+def test_export_writes_the_view_in_order(connections, tmp_path, name):
+    path = str(tmp_path / name)
+    fractions = []
+    result = export_students(connections.get(), path, search_query="yr:2..3", sort_col_name="Last Name", chunk_size=17,
+                             progress=lambda result, fraction: fractions.append(fraction))
+    expected = StudentRepository(connections).search("yr:2..3", "Last Name")
+    assert result.rows == len(expected) > 17
+    assert read_back(path) == as_text(expected)
+    assert fractions == sorted(fractions) and fractions[-1] == 1.0
+    assert not os.path.exists(path + ".part")
+
+
+def test_parquet_export(connections, tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "students.parquet")
+    assert export_students(connections.get(), path).rows == len(StudentRepository(connections).search())
+    assert parquet.read_table(path).column_names[:len(STUDENT_COLUMNS)] == list(STUDENT_COLUMNS)
+
+
+def test_cancelled_export_leaves_nothing(connections, tmp_path):
+    path = str(tmp_path / "students.csv")
+    result = export_students(connections.get(), path, chunk_size=10, cancelled=lambda: True)
+    assert result.cancelled and "cancelled" in result.summary()
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("students.csv")]
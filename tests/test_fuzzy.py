@@ -0,0 +1,51 @@
+import pytest
+
+from conftest import new_students, recount_differences
+from fuzzy import edit_distance, find_duplicates, name_similarity
+from repository import StudentRepository
+
+
+@pytest.fixture
+def students(connections):
+    return StudentRepository(connections)
+
+
+def renamed(connections, count, names):
+    """count new students, given the (fname, lname) names in turn, all of one sex."""
+    rows = new_students(connections.get(), count)
+    return [(row[0], *names[i % len(names)], "F", *row[4:]) for i, row in enumerate(rows)]
+
+
+def test_similarity():
+    assert edit_distance("kitten", "sitting") == 3 and edit_distance("", "abc") == 3
+    assert name_similarity("Dela Cruz", "delacruz") == 1.0
+    assert name_similarity("Santos", "Santso") == pytest.approx(1 - 2 / 6)
+    assert name_similarity(None, "Santos") == 0.0
+
+
+def test_typos_find_the_student_best_match_first(connections, students):
+    students.add_many(renamed(connections, 3, [("Xiomara", "Quixotte"), ("Xiomara", "Quixote"), ("Ximena", "Zabala")]))
+    rows = students.fuzzy_search("~quixote xiomara")
+    assert [row[0] for row in rows[:2]] == ["9000-0001", "9000-0000"] and rows[0][-1] == 1.0 > rows[1][-1]
+    assert "9000-0002" not in [row[0] for row in rows]
+    assert [row[0] for row in students.fuzzy_search("~zaballa")] == ["9000-0002"]
+    assert students.fuzzy_search("~") == []
+
+
+def test_trigram_index_follows_writes(connections, students):
+    students.add_many(renamed(connections, 2, [("Xiomara", "Quixotte")]))
+    assert len(students.fuzzy_search("~quixote")) == 2
+    students.update_many([(row[0], "Ximena", "Zabala", *row[3:]) for row in students.get_many(["9000-0000"])])
+    assert [row[0] for row in students.fuzzy_search("~quixote")] == ["9000-0001"]
+    students.delete_many(["9000-0001"])
+    assert students.fuzzy_search("~quixote") == []
+    assert recount_differences(connections.get()) == []
+
+
+def test_duplicates_with_differing_spellings_come_first(connections, students):
+    students.add_many(renamed(connections, 4, [("Xiomara", "Quixotte"), ("Xiomara", "Quixote"), ("Ximena", "Zabala"), ("Ximena", "Zabala")]))
+    report = find_duplicates(connections.get())
+    assert [[member[0] for member in group] for group in report.groups[:1]] == [["9000-0000", "9000-0001"]]
+    assert ["9000-0002", "9000-0003"] in [[member[0] for member in group] for group in report.groups]
+    assert report.group_count == len(report.groups) and "group(s)" in report.summary()
+    assert find_duplicates(connections.get(), cancelled=lambda: True).cancelled
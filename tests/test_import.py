@@ -0,0 +1,73 @@
+import csv
+import gzip
+import json
+
+from conftest import change_log, new_students, recount_differences
+from db import change_log_head
+from importer import import_students
+from search import STUDENT_COLUMNS
+
+
+def stored(conn, idnums):
+    return {row[0]: tuple(row) for row in conn.execute(
+        "SELECT idnum, fname, lname, sex, pcode, yrlvl, cname, ccode FROM Students WHERE idnum IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(idnums)),))}
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f: csv.writer(f).writerows([STUDENT_COLUMNS] + rows)
+    return str(path)
+
+
+def test_skip_mode_inserts_new_students_and_reports_the_rest(connections, tmp_path):
+    conn = connections.get()
+    rows = new_students(conn, 25)
+    taken = tuple(conn.execute("SELECT idnum, fname, lname, sex, pcode, yrlvl, cname, ccode FROM Students LIMIT 1").fetchone())
+    bad = [("12-34", *rows[0][1:]), (rows[1][0], *rows[1][1:3], "X", *rows[1][4:]), (*rows[2][:5], 9, *rows[2][6:]),
+           (*rows[3][:4], "NOPE", *rows[3][5:]), (*rows[4][:7], "ZZZ")]
+    path = write_csv(tmp_path / "students.csv", rows[5:] + [taken, rows[5]] + bad)
+    reject_path = str(tmp_path / "rejects.csv")
+    result = import_students(conn, path, batch_size=7, reject_path=reject_path)
+
+    assert (result.read, result.inserted, result.skipped, result.rejected) == (27, 20, 1, 6)
+    assert stored(conn, [row[0] for row in rows[5:]]) == {row[0]: row for row in rows[5:]}
+    with open(reject_path, newline="") as f: reasons = [line[1] for line in list(csv.reader(f))[1:]]
+    assert sorted(reasons) == sorted(["idnum already exists", "idnum repeated in file", "bad idnum '12-34' (expected YYYY-NNNN)",
+                                      "bad sex 'X'", "year level 9 out of range", f"program 'NOPE' is not offered by {rows[3][7]}",
+                                      "unknown college 'ZZZ'"])
+    assert "20 inserted" in result.summary()
+
+
+def test_jsonl_and_gzip(connections, tmp_path):
+    conn = connections.get()
+    rows = new_students(conn, 10)
+    path = tmp_path / "students.jsonl.gz"
+    with gzip.open(path, "wt") as f:
+        for row in rows: f.write(json.dumps(dict(zip(STUDENT_COLUMNS, row))) + "\n")
+        f.write("[1, 2]\n{oops\n\n")
+    result = import_students(conn, str(path))
+    assert (result.inserted, result.rejected) == (10, 2)
+    assert stored(conn, [row[0] for row in rows]) == {row[0]: row for row in rows}
+
+
+def test_cancelled_import_keeps_committed_batches(connections, tmp_path):
+    conn = connections.get()
+    rows = new_students(conn, 30)
+    result = import_students(conn, write_csv(tmp_path / "students.csv", rows), batch_size=10, cancelled=lambda: True)
+    assert result.cancelled and result.inserted == 10
+    assert len(stored(conn, [row[0] for row in rows])) == 10
+
+
+def test_import_upsert_matches_recount(connections, tmp_path):
+    conn = connections.get()
+    rows = new_students(conn, 30)
+    existing = [tuple(row) for row in conn.execute("SELECT idnum, fname, lname, sex, pcode, yrlvl, cname, ccode FROM Students LIMIT 20")]
+    changed = [(row[0], row[1] + "x") + row[2:] for row in existing[:10]]
+    path = write_csv(tmp_path / "students.csv", rows + changed + existing[10:])
+
+    head = change_log_head(conn)
+    result = import_students(conn, path, "upsert", batch_size=16)
+    assert (result.inserted, result.updated, result.unchanged) == (30, 10, 10)
+    assert stored(conn, [row[0] for row in changed]) == {row[0]: row for row in changed}
+    assert recount_differences(conn) == []
+    assert change_log(conn, head) == {**{("Students", row[0]): "I" for row in rows}, **{("Students", row[0]): "U" for row in changed}}
@@ -0,0 +1,55 @@
+import json
+
+from db import open_tuned_connection
+from instrumentation import BUCKET_BASE_MS, Histogram, Metrics, statement_key
+
+
+def test_histogram_buckets_and_percentiles():
+    histogram = Histogram()
+    for ms in (0.01, 0.05, 0.1, 0.3, 100.0): histogram.add(ms)
+    assert histogram.buckets[:4] == [2, 1, 0, 1] and sum(histogram.buckets) == 5
+    assert histogram.percentile(0.5) == BUCKET_BASE_MS * 2
+    assert histogram.percentile(1.0) == histogram.max_ms == 100.0
+    assert histogram.summary()["count"] == 5 and Histogram().percentile(0.5) == 0.0
+
+
+def test_statements_are_timed_through_their_fetches(db_path):
+    metrics = Metrics(slow_query_ms=10 ** 6)
+    conn = open_tuned_connection(db_path, metrics)
+    conn.execute("SELECT   idnum\n FROM Students").fetchall()
+    cursor = conn.execute("SELECT idnum FROM Students WHERE yrlvl = ?", (3,))
+    while cursor.fetchmany(7): pass
+    conn.execute("UPDATE Students SET yrlvl = yrlvl WHERE idnum = '0000-0000'")
+    conn.close()
+    assert {key: h.count for key, h in metrics.statements.items()}.items() >= {
+        "SELECT idnum FROM Students": 1, "SELECT idnum FROM Students WHERE yrlvl = ?": 1,
+        "UPDATE Students SET yrlvl = yrlvl WHERE idnum = '0000-0000'": 1}.items()
+    assert metrics.slow_queries() == []
+
+
+def test_slow_queries_are_logged_with_their_plan(db_path, tmp_path):
+    metrics = Metrics(slow_query_ms=0)
+    conn = open_tuned_connection(db_path, metrics)
+    conn.execute("SELECT COUNT(*) FROM Students WHERE ccode = ? AND yrlvl = ?", ("CCS", 2)).fetchall()
+    conn.close()
+    entry = next(entry for entry in metrics.slow_queries() if entry["sql"].startswith("SELECT COUNT(*)"))
+    assert "idx_students_ccode_yrlvl" in entry["plan"]
+    path = tmp_path / "metrics.json"
+    metrics.dump(str(path))
+    assert json.loads(path.read_text())["slow_queries"]
+
+
+def test_actions_count_the_statements_they_ran(db_path):
+    metrics = Metrics()
+    conn = open_tuned_connection(db_path, metrics)
+    with metrics.action("save"):
+        conn.execute("UPDATE Students SET yrlvl = 5 - yrlvl WHERE idnum = (SELECT MIN(idnum) FROM Students)")
+        conn.rollback()
+    conn.close()
+    action = metrics.snapshot()["actions"]["save"]
+    assert action["count"] == 1 and action["statements_per_call"] > 1  # the triggers' statements too
+
+
+def test_statement_key():
+    assert statement_key("  SELECT 1\n\t FROM t ") == "SELECT 1 FROM t"
+    assert len(statement_key("SELECT " + "x, " * 200)) == 240
@@ -0,0 +1,61 @@
+import os
+import shutil
+import subprocess
+import sys
+
+from conftest import recount_differences
+from db import SCHEMA_VERSION, DATABASE_NAME, initialize_database, open_tuned_connection, schema_version
+
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), DATABASE_NAME)
+
+
+def test_migrates_version_0_database_to_current(tmp_path):
+    path = str(tmp_path / "v0.db")
+    shutil.copy(SHIPPED_DB, path)
+    conn = open_tuned_connection(path)
+    assert schema_version(conn) == 0
+    students = {row[0]: (row[1], row[2]) for row in conn.execute("SELECT idnum, fname, lname FROM Students")}
+
+    assert initialize_database(conn) == list(range(1, SCHEMA_VERSION + 1))
+    assert schema_version(conn) == SCHEMA_VERSION == 7
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"Programs", "StudentsFTS", "EnrollmentStats", "StudentNames", "NameTrigrams", "ChangeLog", "TriggerGates"} <= tables
+    assert "CollegeProgramLists" not in tables
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(Students)")}
+    assert {"graduated", "version"} <= columns
+    assert {row[0]: (row[1], row[2]) for row in conn.execute("SELECT idnum, fname, lname FROM Students")} == students
+    assert conn.execute("SELECT COUNT(*) FROM Students WHERE pcode IS NOT NULL AND pcode NOT IN (SELECT ProgramCode FROM Programs)").fetchone()[0] == 0
+    assert recount_differences(conn) == []
+    assert conn.execute("SELECT COUNT(*) FROM ChangeLog").fetchone()[0] == 0  # the log starts empty
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+    conn.close()
+
+
+def test_current_database_runs_no_migrations(tmp_path):
+    path = str(tmp_path / "v0.db")
+    shutil.copy(SHIPPED_DB, path)
+    conn = open_tuned_connection(path)
+    initialize_database(conn)
+    schema = conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall()
+    assert initialize_database(conn) == []
+    assert conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall() == schema
+    conn.close()
+
+
+def test_importing_the_gui_touches_no_database(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", "import main"], cwd=tmp_path, check=True, env={**os.environ, "PYTHONPATH": root})
+    assert not os.path.exists(tmp_path / DATABASE_NAME)  # opened, and migrated, only once the window starts
+
+
+def test_migrations_resume_from_the_version_reached(tmp_path):
+    path = str(tmp_path / "v0.db")
+    shutil.copy(SHIPPED_DB, path)
+    conn = open_tuned_connection(path)
+    initialize_database(conn)
+    conn.execute("DROP TABLE TriggerGates")
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION - 1}")
+    assert initialize_database(conn) == [SCHEMA_VERSION]
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'TriggerGates'").fetchone()
+    assert recount_differences(conn) == []
+    conn.close()
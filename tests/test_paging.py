@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from repository import StudentRepository
+from search import DB_COLUMN_MAP, build_student_page_query
+from student_view import StudentListView
+
+PAGE = 37
+
+
+@pytest.fixture
+def conn(connections):
+    """The generated students, with a few of every nullable column blanked so pages cross NULL keys."""
+    conn = connections.get()
+    idnums = [row[0] for row in conn.execute("SELECT idnum FROM Students ORDER BY idnum")]
+    rng = random.Random(3)
+    for column in ("fname", "lname", "sex", "pcode", "yrlvl", "cname", "ccode"):
+        conn.executemany(f"UPDATE Students SET {column} = NULL WHERE idnum = ?", [(idnum,) for idnum in rng.sample(idnums, 40)])
+    conn.commit()
+    return conn
+
+
+def read_pages(conn, search_query, sort_col_name, descending):
+    """Every idnum, one keyset page at a time."""
+    idnums, after = [], None
+    while True:
+        query, params, keys = build_student_page_query(search_query, sort_col_name, False, descending, after, PAGE)
+        rows = conn.execute(query, params).fetchall()
+        idnums += [row[0] for row in rows]
+        if len(rows) < PAGE: return idnums
+        after = tuple(rows[-1])[-len(keys):]
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("sort_col_name", [None, *DB_COLUMN_MAP])
+def test_keyset_pages_cover_every_student_once(conn, sort_col_name, descending):
+    query, params, _ = build_student_page_query(None, sort_col_name, False, descending, None, 10 ** 9)
+    everyone = [row[0] for row in conn.execute(query, params)]
+    assert len(everyone) == conn.execute("SELECT COUNT(*) FROM Students").fetchone()[0]
+    assert read_pages(conn, None, sort_col_name, descending) == everyone
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("sort_col_name", ["Last Name", "Year Level"])
+def test_keyset_pages_of_a_search(conn, sort_col_name, descending):
+    query, params, _ = build_student_page_query("sex:F", sort_col_name, False, descending, None, 10 ** 9)
+    matching = [row[0] for row in conn.execute(query, params)]
+    assert matching and read_pages(conn, "sex:F", sort_col_name, descending) == matching
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_list_view_loads_every_page_in_order(connections, descending):
+    students = StudentRepository(connections)
+    view = StudentListView(None, "Last Name", descending=descending, page_size=PAGE)
+    shown = view.accept_page(students.first_page(view))
+    while view.wants_more(): shown += view.accept_page(students.next_page(view))
+    query, params, _ = build_student_page_query(None, "Last Name", False, descending, None, 10 ** 9)
+    assert shown == [tuple(row[:8]) for row in connections.get().execute(query, params)]
+    assert view.ids == [row[0] for row in shown] and view.total == len(shown)
+    assert view.status_text() == f"{len(shown):,} student(s)"
@@ -0,0 +1,40 @@
+import shutil
+
+from db import initialize_database, make_program_code, open_tuned_connection, split_program_names
+from repository import CollegeRepository
+from test_migrations import SHIPPED_DB
+
+
+def test_program_codes():
+    assert make_program_code("BS in Computer Science", ()) == "BSCS"
+    assert make_program_code("BS in Computer Science", {"BSCS", "BSCS2"}) == "BSCS3"
+    assert make_program_code("---", ()) == "PROG"
+    assert split_program_names(" BSCS, ,BSIT,BSCS ") == ["BSCS", "BSIT"]
+    assert split_program_names(None) == []
+
+
+def test_add_and_remove_programs(connections):
+    colleges = CollegeRepository(connections)
+    conn = connections.get()
+    code = colleges.add_programs("CCS", ["BS in Quantum Basketweaving"])[0]
+    assert colleges.add_programs("CCS", ["BS in Quantum Basketweaving"]) == [code]  # already listed
+    assert colleges.programs()["CCS"]["BS in Quantum Basketweaving"] == code
+
+    taken = conn.execute("SELECT pcode FROM Students WHERE pcode IS NOT NULL LIMIT 1").fetchone()[0]
+    enrolled = conn.execute("SELECT COUNT(*) FROM Students WHERE pcode = ?", (taken,)).fetchone()[0]
+    blank = conn.execute("SELECT COUNT(*) FROM Students WHERE pcode IS NULL").fetchone()[0]
+    assert colleges.remove_programs([code, taken]) == 2
+    assert code not in colleges.programs()["CCS"].values()
+    assert conn.execute("SELECT COUNT(*) FROM Students WHERE pcode IS NULL").fetchone()[0] == blank + enrolled
+
+
+def test_program_names_migrate_to_codes(tmp_path):
+    path = str(tmp_path / "v0.db")
+    shutil.copy(SHIPPED_DB, path)
+    conn = open_tuned_connection(path)
+    before = dict(conn.execute("SELECT idnum, pcode FROM Students").fetchall())
+    initialize_database(conn)
+    names = dict(conn.execute("SELECT s.idnum, p.ProgramName FROM Students s LEFT JOIN Programs p ON p.ProgramCode = s.pcode").fetchall())
+    assert names == before
+    assert [row[2] for row in conn.execute("PRAGMA foreign_key_list(Students)")].count("Programs") == 1
+    conn.close()
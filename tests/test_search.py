@@ -0,0 +1,77 @@
+import pytest
+
+from conftest import recount_differences
+from repository import StudentRepository
+from search import FTS_TOKEN_RE, build_fts_query, parse_search
+
+
+@pytest.fixture
+def students(connections):
+    return StudentRepository(connections)
+
+
+def everyone(students):
+    return students.search()
+
+
+def has_phrase_prefix(value, text):
+    """Whether value has text's tokens in a row, the last one as a prefix, as an FTS5 "text"* phrase matches."""
+    tokens, terms = FTS_TOKEN_RE.findall(value.lower()), FTS_TOKEN_RE.findall(text.lower())
+    return any(tokens[i:i + len(terms) - 1] == terms[:-1] and tokens[i + len(terms) - 1].startswith(terms[-1])
+               for i in range(len(tokens) - len(terms) + 1))
+
+
+def test_build_fts_query():
+    assert build_fts_query("2023-03") == '"2023 03"*'
+    assert build_fts_query("dela cr") == '"dela"* "cr"*'
+    assert build_fts_query(" - ") is None
+
+
+@pytest.mark.parametrize("text", ["ma", "san", "ccs", "bs", "2025-01"])
+def test_fts_search_matches_a_token_prefix_in_any_searched_column(students, text):
+    assert students.use_fts
+    expected = {row[0] for row in everyone(students)
+                if any(value is not None and has_phrase_prefix(value, text) for i, value in enumerate(row) if i != 5)}
+    found = {row[0] for row in students.search(text)}
+    assert expected and found == expected
+    assert students.count(text) == len(found)
+
+
+def test_text_without_tokens_falls_back_to_like(students):
+    expected = {row[0] for row in everyone(students) if any(value is not None and "-" in value for i, value in enumerate(row) if i != 5)}
+    assert expected and {row[0] for row in students.search("-")} == expected
+
+
+def test_fts_index_follows_writes(students):
+    row = everyone(students)[0]
+    students.update_many([(row[0], "Zyxwvut", *row[2:])])
+    assert [found[0] for found in students.search("zyxw")] == [row[0]]
+    students.delete_many([row[0]])
+    assert students.search("zyxw") == []
+    assert recount_differences(students.connections.get()) == []
+
+
+@pytest.mark.parametrize("text, keep", [
+    ("yr:3", lambda row: row[5] == 3),
+    ("yr:2..3", lambda row: row[5] in (2, 3)),
+    ("year:>=4", lambda row: row[5] is not None and row[5] >= 4),
+    ("sex:f", lambda row: row[3] == "F"),
+    ("ccode:ccs yr:1", lambda row: row[7] == "CCS" and row[5] == 1),
+    ("lname:s*", lambda row: row[2] is not None and row[2].lower().startswith("s")),
+    ("id:2025-01*", lambda row: row[0].startswith("2025-01")),
+])
+def test_field_filters_select_what_they_say(students, text, keep):
+    expected = [row for row in everyone(students) if keep(row)]
+    assert expected and sorted(students.search(text)) == sorted(expected)
+    assert students.count(text) == len(expected)
+
+
+def test_program_filter_matches_program_names(students):
+    conn = students.connections.get()
+    code, name = conn.execute("SELECT ProgramCode, ProgramName FROM Programs WHERE ProgramCode IN (SELECT pcode FROM Students)").fetchone()
+    assert {row[4] for row in students.search(f'program:"{name.lower()}"')} == {code}
+
+
+def test_unknown_fields_and_bad_values_are_free_text(students):
+    assert parse_search("yr:abc nosuchfield:x yr:3 san") == ([("s.yrlvl = ?", [3])], "yr:abc nosuchfield:x san")
+    assert students.count("nosuchfield:x") == 0
@@ -0,0 +1,62 @@
+import pytest
+
+from repository import StudentRepository
+from search_cache import PREFETCH_ROWS, SearchCache
+from student_view import StudentListView
+
+PAGE = 20
+
+
+@pytest.fixture
+def students(connections):
+    return StudentRepository(connections)
+
+
+@pytest.fixture
+def cache(connections):
+    return SearchCache(lambda: connections.write_generation)
+
+
+def shown(cache, students, search_query, sort_col_name=None):
+    """The first page as the grid gets it: from the cache, else read ahead from SQLite and stored."""
+    view = StudentListView(search_query, sort_col_name, use_fts=students.use_fts, page_size=PAGE)
+    rows = cache.first_page(view)
+    if rows is None:
+        rows = students.first_page(view, PREFETCH_ROWS)
+        cache.store(view, 0, rows, PREFETCH_ROWS)
+    return view.accept_page(rows[:PAGE])
+
+
+def from_database(students, search_query, sort_col_name=None):
+    view = StudentListView(search_query, sort_col_name, use_fts=students.use_fts, page_size=PAGE)
+    return view.accept_page(students.first_page(view))
+
+
+@pytest.mark.parametrize("sort_col_name", ["Last Name", "ID Number"])
+@pytest.mark.parametrize("typed", [["m", "ma", "mar"], ["s", "sa san"], ["yr:2 b", "yr:2 bs"]])
+def test_narrower_searches_are_filtered_from_the_cache(cache, students, typed, sort_col_name):
+    for text in typed: assert shown(cache, students, text, sort_col_name) == from_database(students, text, sort_col_name)
+    assert cache.misses == 1 and cache.refined == len(typed) - 1
+
+
+def test_complete_results_are_resorted(cache, students):
+    shown(cache, students, "yr:3", "Last Name")
+    for sort_col_name in ("ID Number", "Sex", "Year Level"):
+        assert shown(cache, students, "yr:3", sort_col_name) == from_database(students, "yr:3", sort_col_name)
+    assert (cache.misses, cache.resorted) == (1, 3)
+    assert shown(cache, students, "yr:3", "Sex") and cache.hits == 1
+
+
+def test_a_write_empties_the_cache(cache, students):
+    first = shown(cache, students, "yr:3", "Last Name")
+    students.update_many([(first[0][0], first[0][1], "Aaaaa", *first[0][3:])])
+    assert shown(cache, students, "yr:3", "Last Name") == from_database(students, "yr:3", "Last Name") != first
+    assert cache.misses == 2 and cache.stats()["entries"] == 1
+
+
+def test_lru_bounds(cache, students):
+    cache.max_entries = 3
+    for text in ("yr:1", "yr:2", "yr:3", "yr:4"): shown(cache, students, text)
+    assert cache.stats()["entries"] == 3
+    shown(cache, students, "yr:1")
+    assert cache.misses == 5
@@ -0,0 +1,74 @@
+import sqlite3
+
+import pytest
+
+from conftest import new_students
+from importer import load_catalog
+from repository import StudentRepository
+from search import STUDENT_COLUMNS
+from staging import IdIndex, StagingQueue
+
+
+@pytest.fixture
+def students(connections):
+    return StudentRepository(connections)
+
+
+def record(row):
+    return dict(zip(STUDENT_COLUMNS, row))
+
+
+def test_id_index(students):
+    index = IdIndex.load(students)
+    assert len(index) == students.count()
+    assert students.search(limit=1)[0][0] in index and "9000-0001" not in index
+    index.update(["9000-0001", "odd-id"]); index.discard("9000-0002")
+    assert "9000-0001" in index and "odd-id" in index and "9000-0002" not in index
+    index.discard("9000-0001")
+    assert "9000-0001" not in index and len(index) == students.count() + 1
+    assert IdIndex.load(students, cancelled=lambda: True) is None
+
+
+def test_entries_are_checked_without_the_database(connections, students):
+    conn = connections.get()
+    catalog = load_catalog(conn)
+    queue = StagingQueue(IdIndex.load(students), flush_rows=3)
+    rows = new_students(conn, 3)
+    assert queue.stage(record(rows[0]), catalog) == (rows[0], None)
+    assert queue.stage(record(rows[0]), catalog) == (None, f"{rows[0][0]} is already staged")
+    taken = students.search(limit=1)[0]
+    assert queue.stage(record(taken), catalog) == (None, f"{taken[0]} is already registered")
+    assert queue.stage(record((*rows[1][:3], "X", *rows[1][4:])), catalog) == (None, "bad sex 'X'")
+    assert not queue.due()
+    queue.stage(record(rows[1]), catalog); queue.stage(record(rows[2]), catalog)
+    assert queue.due() and len(queue) == 3
+    assert queue.unstage([rows[2][0], "0000-0000"]) == [rows[2]] and len(queue) == 2
+
+
+def test_flush_saves_in_one_transaction_and_reports_taken_ids(connections, students, db_path):
+    conn = connections.get()
+    catalog = load_catalog(conn)
+    queue = StagingQueue(IdIndex.load(students))
+    rows = new_students(conn, 5)
+    for row in rows: queue.stage(record(row), catalog)
+    other = sqlite3.connect(db_path)  # another station registers one of the IDs first
+    other.execute("INSERT INTO Students (idnum, fname, lname, sex, pcode, yrlvl, cname, ccode) VALUES (?, 'Other', 'Station', ?, ?, ?, ?, ?)",
+                  (rows[2][0], *rows[2][3:])); other.commit(); other.close()
+
+    generation = connections.write_generation
+    result = queue.flush(students)
+    assert result.added == rows[:2] + rows[3:] and result.taken == [rows[2]]
+    assert connections.write_generation == generation + 1
+    assert len(queue) == 0 and all(row[0] in queue.ids for row in rows)
+    assert students.get_many([row[0] for row in rows]) == sorted(result.added + [(rows[2][0], "Other", "Station", *rows[2][3:])])
+    assert "ID already registered: " + rows[2][0] in result.summary()
+
+
+def test_taken_by_now_unstages_ids_the_index_learned_later(connections, students):
+    conn = connections.get()
+    rows = new_students(conn, 2)
+    queue = StagingQueue()  # staged while the index loads
+    for row in rows: queue.stage(record(row), load_catalog(conn))
+    students.add(rows[0])
+    queue.ids = IdIndex.load(students)
+    assert queue.taken_by_now() == [rows[0]] and list(queue.rows) == [rows[1][0]]
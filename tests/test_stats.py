@@ -0,0 +1,57 @@
+import pytest
+
+from conftest import new_students, recount_differences
+from repository import BULK_WRITE_MIN_ROWS, EnrollmentStatsRepository, StudentRepository
+
+
+@pytest.fixture
+def students(connections):
+    return StudentRepository(connections)
+
+
+@pytest.mark.parametrize("count", [3, BULK_WRITE_MIN_ROWS])  # the per-row triggers, then write_students_bulk
+def test_insert_update_delete_match_recount(students, count):
+    conn = students.connections.get()
+    rows = new_students(conn, count)
+    assert students.add_many(rows) == count
+    assert recount_differences(conn) == []
+
+    edited = [(row[0], "Renamed", row[2] + "son", "M" if row[3] == "F" else "F", None, 5 - row[5], *row[6:])
+              for row in rows[:count // 2 + 1]]
+    assert students.update_many(edited) == len(edited)
+    assert recount_differences(conn) == []
+
+    gone = [row[0] for row in rows[::2]]
+    assert students.delete_many(gone + ["0000-0000"]) == len(gone)
+    assert recount_differences(conn) == []
+
+
+def test_bulk_writes_leave_the_schema_alone(students):
+    conn = students.connections.get()
+    schema = conn.execute("PRAGMA schema_version").fetchone()[0]
+    rows = new_students(conn, BULK_WRITE_MIN_ROWS)
+    students.add_many(rows)
+    students.delete_many([row[0] for row in rows])
+    assert conn.execute("PRAGMA schema_version").fetchone()[0] == schema  # no DDL, so no other station re-prepares
+    assert conn.execute("SELECT COUNT(*) FROM TriggerGates").fetchone()[0] == 0
+    assert recount_differences(conn) == []
+
+
+def test_totals(connections):
+    stats = EnrollmentStatsRepository(connections)
+    conn = connections.get()
+    assert stats.totals(()) == [(conn.execute("SELECT COUNT(*) FROM Students").fetchone()[0],)]
+    assert stats.totals(["yrlvl", "ccode"]) == [tuple(row) for row in conn.execute(
+        "SELECT ccode, yrlvl, COUNT(*) FROM Students GROUP BY ccode, yrlvl ORDER BY ccode, yrlvl")]
+
+
+def test_verify_finds_drift_and_rebuild_repairs_it(connections):
+    stats = EnrollmentStatsRepository(connections)
+    conn = connections.get()
+    assert stats.verify() == []
+    group = tuple(conn.execute("SELECT ccode, pcode, yrlvl, sex, students FROM EnrollmentStats LIMIT 1").fetchone())
+    conn.execute("UPDATE EnrollmentStats SET students = students + 2 WHERE ccode = ? AND pcode = ? AND yrlvl = ? AND sex = ?", group[:4])
+    conn.commit()
+    assert stats.verify() == [(group[:4], group[4] + 2, group[4])]
+    stats.rebuild()
+    assert stats.verify() == []
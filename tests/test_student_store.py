@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from search import DB_COLUMN_MAP, NOCASE_COLUMNS, STUDENT_COLUMNS
+from student_store import STORE_ROWS_SQL, StoreView, StudentStore
+
+PAGE = 37
+
+
+@pytest.fixture
+def conn(connections):
+    """The generated students, with a few of every nullable column blanked and some names in lower case."""
+    conn = connections.get()
+    idnums = [row[0] for row in conn.execute("SELECT idnum FROM Students ORDER BY idnum")]
+    rng = random.Random(5)
+    for column in ("fname", "lname", "sex", "pcode", "yrlvl", "cname", "ccode"):
+        conn.executemany(f"UPDATE Students SET {column} = NULL WHERE idnum = ?", [(idnum,) for idnum in rng.sample(idnums, 30)])
+    conn.executemany("UPDATE Students SET lname = lower(lname) WHERE idnum = ?", [(idnum,) for idnum in rng.sample(idnums, 30)])
+    conn.commit()
+    return conn
+
+
+def sql_order(conn, columns):
+    """idnums as SQLite orders them by [(column, descending)], ties in rowid order in the last key's direction."""
+    terms = [f"{column}{' COLLATE NOCASE' if column in NOCASE_COLUMNS else ''} {'DESC' if descending else 'ASC'}"
+             for column, descending in columns]
+    terms.append(f"rowid {'DESC' if columns and columns[-1][1] else 'ASC'}")
+    return [row[0] for row in conn.execute(f"SELECT idnum FROM Students ORDER BY {', '.join(terms)}")]
+
+
+@pytest.mark.parametrize("columns", [[("lname", False)], [("fname", True)], [("yrlvl", True), ("lname", False)],
+                                     [("ccode", False), ("yrlvl", True), ("fname", False)], [("sex", True), ("cname", True)],
+                                     [("pcode", False)], [("idnum", True)]])
+def test_store_sorts_as_sqlite_does(conn, columns):
+    store = StudentStore.load(conn)
+    assert len(store) == conn.execute("SELECT COUNT(*) FROM Students").fetchone()[0]
+    assert [store.row(index)[0] for index in store.order(columns)] == sql_order(conn, columns)
+    assert {store.row(index) for index in store.order(columns)} == {tuple(row) for row in conn.execute(f"SELECT {', '.join(STUDENT_COLUMNS)} FROM Students")}
+
+
+def test_store_view_patches_writes_like_a_reload(conn):
+    store = StudentStore.load(conn)
+    sort_keys = [("Year Level", True), ("Last Name", False)]
+    view = StoreView(store, sort_keys, page_size=PAGE)
+    grid = view.accept_page(view.next_page()) + view.accept_page(view.next_page())
+
+    moved, kept, deleted = grid[3], grid[10], grid[20]
+    conn.execute("UPDATE Students SET yrlvl = 1, lname = 'Aaa' WHERE idnum = ?", (moved[0],))
+    conn.execute("UPDATE Students SET pcode = pcode WHERE idnum = ?", (kept[0],))
+    conn.execute("DELETE FROM Students WHERE idnum = ?", (deleted[0],))
+    conn.execute("INSERT INTO Students (idnum, fname, lname, sex, pcode, yrlvl, cname, ccode) VALUES ('9000-0001', 'New', 'Aab', ?, ?, 5, ?, ?)",
+                 (moved[3], moved[4], moved[6], moved[7]))
+    conn.commit()
+    written = [moved[0], kept[0], deleted[0], "9000-0001"]
+    ops = view.apply_rows(written, conn.execute(*view.rows_query(written)).fetchall())
+    for op in ops:
+        if op[0] == "delete": grid = [row for row in grid if row[0] != op[1]]
+        elif op[0] == "insert": grid.insert(op[1], op[2])
+        else: grid[[row[0] for row in grid].index(op[1])] = op[2]
+
+    expected = sql_order(conn, [(DB_COLUMN_MAP[heading], descending) for heading, descending in sort_keys])
+    assert [row[0] for row in grid] == expected[:len(grid)] and view.loaded == len(grid)
+    assert grid[0][0] == "9000-0001" and view.total == len(expected)
+    assert [store.row(index)[0] for index in view.order] == expected
+    assert store.find(deleted[0]) is None and len(store) == len(expected)
+    assert STORE_ROWS_SQL == view.rows_query(written)[0]
@@ -0,0 +1,47 @@
+import pytest
+
+from repository import StudentRepository
+from search import build_student_page_query
+from student_view import StudentListView
+
+PAGE = 37
+
+
+def apply_ops(grid, ops):
+    """Plays apply_rows' grid operations on a list of rows, as the Treeview would."""
+    for op in ops:
+        if op[0] == "delete": grid[:] = [row for row in grid if row[0] != op[1]]
+        elif op[0] == "insert": grid.insert(op[1], op[2])
+        else: grid[[row[0] for row in grid].index(op[1])] = op[2]
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_patched_grid_matches_a_reload(connections, descending):
+    students = StudentRepository(connections)
+    view = StudentListView(None, "Last Name", descending=descending, page_size=PAGE)
+    grid = view.accept_page(students.first_page(view))
+    grid += view.accept_page(students.next_page(view))
+    first, last = ("Aaa", "Zzzz") if not descending else ("Zzzz", "Aaa")
+
+    moved, regraded, deleted = grid[5], grid[10], grid[20]
+    students.update_many([(moved[0], moved[1], first, *moved[3:]), (*regraded[:5], 5 - regraded[5], *regraded[6:])])
+    students.delete_many([deleted[0]])
+    students.add_many([("9000-0001", "New", first + "b", *moved[3:]), ("9000-0002", "New", last, *moved[3:])])
+
+    written = [moved[0], regraded[0], deleted[0], "9000-0001", "9000-0002"]
+    ops = view.apply_rows(written, students.view_rows(view, written))
+    assert ("update", regraded[0], (*regraded[:5], 5 - regraded[5], *regraded[6:])) in ops  # the sort key kept
+    apply_ops(grid, ops)
+
+    query, params, _ = build_student_page_query(None, "Last Name", False, descending, None, 10 ** 9)
+    reloaded = [tuple(row[:8]) for row in connections.get().execute(query, params)]
+    assert grid == reloaded[:len(grid)]
+    assert "9000-0001" in view.ids and "9000-0002" not in view.ids  # past the loaded pages: left for a later page
+    assert view.ids == [row[0] for row in grid]
+    assert view.positions == {idnum: i for i, idnum in enumerate(view.ids)}
+
+
+def test_ranked_search_is_not_patchable(connections):
+    view = StudentListView("san", use_fts=True, page_size=PAGE)
+    StudentRepository(connections).first_page(view)
+    assert view.ranked and not view.patchable
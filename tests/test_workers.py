@@ -0,0 +1,54 @@
+import sqlite3
+import time
+
+from workers import BackgroundTask, SearchWorker
+
+SLOW_QUERY = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM (SELECT i FROM n LIMIT 1000000000)"
+
+
+def wait_for(drain, timeout=10):
+    """Drains until something arrives, returning everything drained then."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        events = list(drain())
+        if events: return events
+        time.sleep(0.01)
+    raise AssertionError("nothing arrived")
+
+
+def test_newer_search_cancels_the_running_one(connections):
+    worker = SearchWorker(connections)
+    slow = worker.submit(SLOW_QUERY, [], tag="slow")
+    time.sleep(0.05)  # let the slow query start
+    quick = worker.submit("SELECT COUNT(*) FROM Students", [], tag="quick")
+    assert worker.is_stale(slow) and not worker.is_stale(quick)
+    ((generation, tag, rows, error, _),) = wait_for(worker.drain)
+    assert (generation, tag, error) == (quick, "quick", None)
+    assert rows[0][0] > 0
+
+
+def test_search_errors_are_reported(connections):
+    worker = SearchWorker(connections)
+    generation = worker.submit("SELECT nosuchcolumn FROM Students", [])
+    ((done, _, rows, error, _),) = wait_for(worker.drain)
+    assert done == generation and rows is None and isinstance(error, sqlite3.OperationalError)
+
+
+def test_background_task_reports_progress_then_its_result():
+    def job(n, progress, cancelled):
+        for i in range(n): progress(i)
+        return "finished"
+    task = BackgroundTask(job, 3).start()
+    task._thread.join()
+    assert list(task.drain()) == [("progress", (0,)), ("progress", (1,)), ("progress", (2,)), ("done", "finished")]
+    assert task.finished
+
+
+def test_background_task_can_be_cancelled_and_reports_errors():
+    def job(progress, cancelled):
+        while not cancelled(): time.sleep(0.01)
+        raise RuntimeError("cancelled")
+    task = BackgroundTask(job).start()
+    task.cancel(); task._thread.join()
+    ((kind, error),) = task.drain()
+    assert kind == "error" and str(error) == "cancelled"
@@ -0,0 +1,111 @@
+import queue
+import sqlite3 as sql
+import threading
+import time
+
+
+class SearchWorker:
+    """Runs student list queries on a background thread.
+
+    Only the newest submitted query matters: submitting again makes the running
+    one stale, and a progress handler aborts it inside SQLite. Results are put on
+    a queue for the Tk thread to pick up with root.after polling.
+    """
+
+    PROGRESS_STEPS = 1000  # SQLite VM instructions between staleness checks
+
+    def __init__(self, connection_manager):
+        self._manager = connection_manager
+        self._cond = threading.Condition()
+        self._pending = None
+        self._generation = 0
+        self.results = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="search-worker", daemon=True)
+        self._thread.start()
+
+    @property
+    def latest_generation(self):
+        return self._generation
+
+    def submit(self, query, params, tag=None):
+        with self._cond:
+            self._generation += 1
+            self._pending = (self._generation, tag, query, params)
+            self._cond.notify()
+            return self._generation
+
+    def is_stale(self, generation):
+        return generation != self._generation
+
+    def drain(self):
+        """Yields (generation, tag, rows, error, elapsed_ms) for finished queries."""
+        while True:
+            try: yield self.results.get_nowait()
+            except queue.Empty: return
+
+    def _run(self):
+        conn = None  # opened on the first query, not at startup
+        while True:
+            with self._cond:
+                while self._pending is None: self._cond.wait()
+                generation, tag, query, params = self._pending
+                self._pending = None
+            if conn is None: conn = self._manager.get()
+            conn.set_progress_handler(lambda: self.is_stale(generation), self.PROGRESS_STEPS)
+            start = time.perf_counter()
+            try:
+                rows = [tuple(row) for row in conn.execute(query, params).fetchall()]
+            except sql.OperationalError as e:
+                if self.is_stale(generation): continue  # cancelled by newer input
+                self.results.put((generation, tag, None, e, 0.0)); continue
+            except sql.Error as e:
+                self.results.put((generation, tag, None, e, 0.0)); continue
+            finally:
+                conn.set_progress_handler(None, 0)
+            if not self.is_stale(generation):
+                self.results.put((generation, tag, rows, None, (time.perf_counter() - start) * 1000))
+
+
+class BackgroundTask:
+    """Runs one long job (an import, an export...) on its own thread.
+
+    fn is called as fn(*args, progress=..., cancelled=...): progress(*values)
+    reports back to the Tk thread and cancelled() turns true once cancel() is
+    called. drain() yields ("progress", values), then ("done", result) or
+    ("error", exception) for the Tk thread to pick up with root.after polling.
+    With connections (a ConnectionManager), the connection the job opened on
+    its thread is closed when it ends, rather than left open for good.
+    """
+
+    def __init__(self, fn, *args, name="background-task", connections=None):
+        self._fn, self._args = fn, args
+        self._connections = connections
+        self._cancel = threading.Event()
+        self.events = queue.Queue()
+        self.finished = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def drain(self):
+        while True:
+            try: event = self.events.get_nowait()
+            except queue.Empty: return
+            if event[0] != "progress": self.finished = True
+            yield event
+
+    def _run(self):
+        try:
+            result = self._fn(*self._args, progress=lambda *values: self.events.put(("progress", values)),
+                              cancelled=self._cancel.is_set)
+        except Exception as e:
+            self.events.put(("error", e))
+        else:
+            self.events.put(("done", result))
+        finally:
+            if self._connections is not None: self._connections.close_current()